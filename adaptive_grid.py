@@ -0,0 +1,103 @@
+"""Adaptive frequency grid for the noise budget.
+
+Starting from a coarse log-spaced grid, every interval is bisected (in
+log frequency) where the curves at the midpoint deviate from linear
+interpolation of log-magnitude or phase by more than a tolerance. All
+midpoints of a pass are evaluated in one vectorized call.
+
+Example:
+    nb = noise_budget.NoiseBudget()
+    f = budget_grid(nb, tol=0.01)
+    res = nb.evaluate(f)
+"""
+
+import numpy as np
+
+
+# curves of the noise budget that steer the refinement by default
+BUDGET_KEYS = ('Atotal_closed', 'Atotal_closed_det', 'en_total_input', 'en_total_output')
+
+
+def _wrap(phi):
+    return (phi + np.pi) % (2*np.pi) - np.pi
+
+
+def _deviation(ya, ym, yb, phase_tol, tol):
+    """Deviation of ym from the log-log interpolation of ya, yb in units of the tolerances."""
+    la, lm, lb = (np.log(np.maximum(np.abs(y), 1e-300)) for y in (ya, ym, yb))
+    err = np.abs(lm - 0.5*(la + lb))/tol
+    if np.iscomplexobj(ym):
+        pa, pm, pb = np.angle(ya), np.angle(ym), np.angle(yb)
+        pred = pa + 0.5*_wrap(pb - pa)
+        err = np.maximum(err, np.abs(_wrap(pm - pred))/phase_tol)
+    return err
+
+
+def adaptive_grid(func, fmin=1.0, fmax=1e6, num=61, tol=0.01, phase_tol=0.02,
+                  max_points=5000, min_ratio=1e-6):
+    """Non-uniform frequency grid resolving the curves returned by func.
+
+    Arguments:
+    func: func(f) returns an array or dict of arrays of len(f), real or complex
+    fmin, fmax, num: initial log-spaced grid
+    tol: tolerance on log-magnitude (relative deviation)
+    phase_tol: tolerance on phase in rad for complex curves
+    max_points: stop refining at this number of points
+    min_ratio: do not bisect intervals with log(f2/f1) below this
+
+    Returns (f, values) with values a dict (or array) of the curves at f.
+    """
+    def call(f):
+        v = func(f)
+        return v if isinstance(v, dict) else {None: v}
+
+    f = np.logspace(np.log10(fmin), np.log10(fmax), num=num)
+    vals = {k: np.asarray(v) for k, v in call(f).items()}
+    active = np.ones(len(f) - 1, dtype=bool)
+
+    while np.any(active) and len(f) < max_points:
+        i = np.nonzero(active)[0]
+        i = i[np.log(f[i+1]/f[i]) > min_ratio]
+        if len(i) == 0:
+            break
+        i = i[:max_points - len(f)]
+        fm = np.sqrt(f[i]*f[i+1])
+        vm = call(fm)
+        err = np.zeros(len(i))
+        for k, v in vm.items():
+            err = np.maximum(err, _deviation(vals[k][i], np.asarray(v), vals[k][i+1], phase_tol, tol))
+        refine = err > 1
+        if not np.any(refine):
+            break
+
+        # insert the refined midpoints, both halves of their interval stay active
+        pos = i[refine] + 1
+        f = np.insert(f, pos, fm[refine])
+        for k in vals:
+            vals[k] = np.insert(vals[k], pos, np.asarray(vm[k])[refine])
+        active = np.zeros(len(f) - 1, dtype=bool)
+        new = pos + np.arange(len(pos))
+        active[new - 1] = True
+        active[new] = True
+
+    return f, (vals[None] if list(vals) == [None] else vals)
+
+
+def budget_grid(budget, fmin=1.0, fmax=1e6, keys=BUDGET_KEYS, sources=True, **kwargs):
+    """Adaptive grid resolving gains and noise of a noise_budget.NoiseBudget.
+
+    Arguments:
+    keys: gains and totals to resolve
+    sources: also resolve every noise source
+    kwargs: see adaptive_grid
+    """
+    def curves(f):
+        res = budget.evaluate(f)
+        out = {}
+        for k in keys:
+            out[k] = getattr(res, k) if hasattr(res, k) else res.gains[k]
+        if sources:
+            out.update(res.noise_sources)
+        return out
+    f, vals = adaptive_grid(curves, fmin, fmax, **kwargs)
+    return f
@@ -0,0 +1,355 @@
+"""Benchmarks of the impedance and noise pipeline with regression budgets.
+
+Every benchmark is timed (fastest of --repeat runs) and checked against
+values of the original per-element implementation (the baseline
+impedance.py and noise_model.py), stored in benchmark_reference.npz:
+
+  Z_tot.<circuit>      vectorized Z_tot vs the stored per-frequency values
+  to_np_array.<circuit> Z_tot looped over the frequencies as the original
+                       to_np_array did, timed to give the vectorization speedup
+  opamp.Aopen[_gary]   open loop gain, same comparison
+  budget.<num>         end-to-end noise budget at num = 20, 1e4, 1e6 points
+  budget.incremental   re-evaluation at 1e4 points after changing Z2.Rfb
+  scrn.parse/cached    loading the SCRN captures without / with the sidecar cache
+  residual             model/data comparison of the captures
+  import               import time of the compute modules (see import_budget.py)
+
+Budgets in ms are read from benchmark_budgets.json; a benchmark fails if
+it is slower than budget*slack (plus ABS_SLACK) or if it disagrees with the
+reference. The import budget is relative to the numpy import time measured
+with it ('import.numpy'), so a slower interpreter start scales it. --update
+writes the measured times as the new budgets.
+
+The reference is made once from a checkout of the original implementation
+with --make-reference (runs its noise_model.main at every budget num):
+
+    git worktree add /tmp/baseline <baseline commit>
+    python benchmarks.py --make-reference /tmp/baseline
+
+Usage: python benchmarks.py [--only name ...] [--repeat n] [--slack 1.5] [--update]
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import numpy as np
+import impedance as Q
+import noise_budget
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+BUDGET_FILE = os.path.join(HERE, 'benchmark_budgets.json')
+
+REFERENCE_FILE = os.path.join(HERE, 'benchmark_reference.npz')
+
+BUDGET_NUMS = (20, 10000, 1000000)
+
+# number of frequencies of the circuit benchmarks, and of the stored points per budget
+CIRCUIT_NUM = 1000
+N_CHECK = 200
+
+# relative tolerance of the vectorized results against the reference
+RTOL = 1e-12
+
+# absolute slack in ms added to every budget, covers timer noise of the fast benchmarks
+ABS_SLACK = 0.05
+
+
+def get_args():
+    parser = argparse.ArgumentParser('Benchmarks of the noise pipeline.')
+    parser.add_argument('--only', nargs='+', default=None, help='Run only these benchmarks or groups (e.g. Z_tot, budget.20).')
+    parser.add_argument('--repeat', default=5, type=int, help='Number of runs per benchmark, the fastest counts.')
+    parser.add_argument('--slack', default=1.5, type=float, help='Allowed slowdown factor relative to the budget.')
+    parser.add_argument('--budgets', default=BUDGET_FILE, type=str, help='JSON file of budgets in ms.')
+    parser.add_argument('--update', action='store_true', help='Write the measured times as the new budgets.')
+    parser.add_argument('--data', nargs='+', default=None, help='SCRN captures (default noise_data/SCRN*.TXT).')
+    parser.add_argument('--make-reference', default=None, type=str, help='Write the reference values from this checkout of the original implementation.')
+    a = parser.parse_args()
+    print(a)
+    return a
+
+
+class Benchmark(object):
+
+    """A timed function and its reference check.
+
+    func: callable timed without arguments, returns the result
+    check: callable(result) returning the max relative error against the
+           scalar reference, or None if there is nothing to compare
+    """
+
+    def __init__(self, name, func, check=None, repeat=None):
+        self.name = name
+        self.func = func
+        self.check = check
+        self.repeat = repeat
+        # other quantities measured with the benchmark, saved with --update
+        self.measured = {}
+
+    def budget_scale(self, budgets):
+        """Factor applied to the budget of this benchmark."""
+        return 1.0
+
+    def run(self, repeat=5):
+        """Return (fastest time in ms, max relative error or None)."""
+        best = None
+        for i in range(self.repeat or repeat):
+            t0 = time.perf_counter()
+            out = self.func()
+            t = (time.perf_counter() - t0)*1e3
+            best = t if best is None else min(best, t)
+        err = self.check(out) if self.check is not None else None
+        return best, err
+
+
+def rel_error(a, b):
+    a = np.asarray(a)
+    b = np.asarray(b)
+    scale = np.maximum(np.abs(b), np.finfo(float).tiny)
+    return float(np.max(np.abs(a - b)/scale))
+
+
+def scalar(func, f):
+    """Per-point evaluation, as the original to_np_array did."""
+    return np.array([func(x) for x in f])
+
+
+def budget_points(num, n_check=N_CHECK):
+    """Indices of the points of the budget.<num> grid kept in the reference."""
+    return np.unique(np.linspace(0, num - 1, min(num, n_check)).astype(int))
+
+
+_REFERENCE_SNIPPET = """
+import sys, builtins, argparse
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+builtins.input = lambda *a: ''
+import impedance as Q
+import noise_model
+
+out = {{}}
+f = np.logspace(0, 6, {circuit_num:d})
+circuits = {{'Z1_MC': Q.Z1_MC('Z1_MC', Cdet=200e-12, Rbias=100e6, Rbleed=100e6, Cc=10e-9),
+            'Z1_g': Q.Z1_g('Z1_g', Ccg=10e-9), 'Z2': Q.Z2('Z2', Cfb=0.25e-12, Rfb=400e6),
+            'Z3': Q.Z3('Z3'), 'Z5': Q.Z5('Z5'), 'Z6': Q.Z6('Z6'), 'bjt': Q.BJT('bjt'),
+            'hemt': Q.HEMT('HEMT', Rg=1e12, Cgs=100e-12, gm=35)}}
+for name, c in circuits.items():
+    out['Z_tot.' + name] = Q.to_np_array(c.Z_tot, f)
+# Z4 of the original misses its constructor (__init___), its Z_tot is that of Rmirror
+out['Z_tot.Z4'] = Q.to_np_array(Q.Resistor(1e2, 'Rmirror').Z, f)
+opamp = Q.LT1677('opamp', flat=135.0, poles=(0.5, 80e3))
+out['opamp.Aopen'] = Q.to_np_array(opamp.Aopen, f)
+out['opamp.Aopen_gary'] = Q.to_np_array(opamp.Aopen_gary, f)
+
+for num in {nums!r}:
+    noise_model.args = argparse.Namespace(num=num, savename='budget.npz', makeplots=False, show=False,
+                                          debug=False, logy=False, drainI=0.001, T_4K=4.0, T_300K=300.0)
+    noise_model.main()
+    res = np.load('budget.npz', allow_pickle=True)['arr_0'].item()
+    idx = np.unique(np.linspace(0, num - 1, min(num, {n_check:d})).astype(int))
+    for k, v in res.items():
+        out['budget.{{0:d}}.{{1:s}}'.format(num, k)] = np.broadcast_to(v, res['f_arr'].shape)[idx]
+np.savez_compressed(sys.argv[1], **out)
+"""
+
+
+def make_reference(baseline_dir, path=REFERENCE_FILE):
+    """Write the reference values computed by the original implementation in baseline_dir.
+
+    The original noise_model.main is run unmodified in a subprocess (its
+    plots go to the Agg backend, its prompt is answered).
+    """
+    import subprocess
+    import tempfile
+    code = _REFERENCE_SNIPPET.format(circuit_num=CIRCUIT_NUM, nums=tuple(BUDGET_NUMS), n_check=N_CHECK)
+    work = tempfile.mkdtemp()
+    subprocess.check_call([sys.executable, '-c', code, os.path.abspath(path)],
+                          cwd=work, env=dict(os.environ, PYTHONPATH=os.path.abspath(baseline_dir)))
+    print('reference written to ' + path)
+
+
+def load_reference(path=REFERENCE_FILE):
+    with np.load(path, allow_pickle=False) as z:
+        return dict((k, z[k]) for k in z.files)
+
+
+def circuit_benchmarks(f, reference):
+    circuits = noise_budget.make_circuits()
+    bench = []
+    for name, c in sorted(circuits.items()):
+        if not isinstance(c, Q.OpAmp):
+            ref = reference['Z_tot.' + name]
+            bench.append(Benchmark('Z_tot.' + name, lambda c=c: c.Z_tot(f),
+                                   lambda out, ref=ref: rel_error(np.broadcast_to(out, f.shape), ref)))
+            bench.append(Benchmark('to_np_array.' + name, lambda c=c: scalar(c.Z_tot, f),
+                                   lambda out, ref=ref: rel_error(out, ref)))
+    opamp = circuits['opamp']
+    bench.append(Benchmark('opamp.Aopen', lambda: opamp.Aopen(f),
+                           lambda out: rel_error(out, reference['opamp.Aopen'])))
+    bench.append(Benchmark('opamp.Aopen_gary', lambda: opamp.Aopen_gary(f),
+                           lambda out: rel_error(out, reference['opamp.Aopen_gary'])))
+    return bench
+
+
+def budget_benchmarks(reference, nums=BUDGET_NUMS):
+    """End-to-end evaluation; checked against the original implementation at budget_points."""
+    budget = noise_budget.NoiseBudget(cache=False)
+    bench = []
+    for num in nums:
+        f = np.logspace(0, 6, num)
+        idx = budget_points(num)
+        prefix = 'budget.{0:d}.'.format(num)
+        ref = dict((k[len(prefix):], v) for k, v in reference.items() if k.startswith(prefix))
+
+        def check(res, idx=idx, ref=ref):
+            err = rel_error(res.f_arr[idx], ref['f_arr'])
+            for k, v in res.to_dict().items():
+                err = max(err, rel_error(np.broadcast_to(v, res.f_arr.shape)[idx], ref[k]))
+            return err
+
+        bench.append(Benchmark('budget.{0:d}'.format(num), lambda f=f: budget.evaluate(f), check,
+                               repeat=1 if num >= 1000000 else None))
+    return bench
+
+
+def incremental_benchmark(num=10000):
+    """Re-evaluation after changing Z2.Rfb, checked against a full evaluation."""
+    f = np.logspace(0, 6, num)
+    budget = noise_budget.NoiseBudget()
+    budget.evaluate(f)
+    values = iter(np.linspace(300e6, 500e6, 1000))
+
+    def run():
+        budget.set('Z2.Rfb', next(values))
+        return budget.evaluate(f)
+
+    def check(res):
+        full = noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(f_arr=f, circuits=budget.circuits),
+                                        cache=False).evaluate()
+        return max(rel_error(res.en_total_input, full.en_total_input),
+                   rel_error(res.en_total_output, full.en_total_output))
+
+    return Benchmark('budget.incremental', run, check)
+
+
+def data_benchmarks(files):
+    import tempfile
+    import spectrum_data
+    import model_comparison
+
+    cache_dir = tempfile.mkdtemp()
+    reference = [np.loadtxt(p) for p in files]
+
+    def check(spectra):
+        return max(rel_error(a, b) for a, b in zip(spectra, reference))
+
+    # fill the cache once so scrn.cached measures the memmapped reload
+    for p in files:
+        spectrum_data.load_spectrum(p, cache_dir=cache_dir)
+
+    freq, data = spectrum_data.load_spectra(files, unique=True, cache_dir=cache_dir)
+    f_model = np.logspace(0, 6, 10000)
+    model = noise_budget.NoiseBudget().evaluate(f_model).en_total_output
+    log_f, log_m = np.log(f_model), np.log(model)
+    m = np.array([np.exp(np.interp(np.log(x), log_f, log_m)) for x in freq])
+    relative = (data - m)/m
+
+    return [
+        Benchmark('scrn.parse', lambda: [spectrum_data.load_spectrum(p, cache=False) for p in files], check),
+        Benchmark('scrn.cached', lambda: [spectrum_data.load_spectrum(p, cache_dir=cache_dir) for p in files], check),
+        Benchmark('residual', lambda: model_comparison.compare(freq, data, freq_model=f_model, model=model),
+                  lambda cmp: rel_error(cmp.relative, relative)),
+    ]
+
+
+class ImportBenchmark(Benchmark):
+
+    """Import time of the compute modules, timed in fresh interpreters by import_budget."""
+
+    def __init__(self):
+        Benchmark.__init__(self, 'import', None)
+
+    def run(self, repeat=5):
+        import import_budget
+        t_np, t_mod, mpl = import_budget.measure(repeat=repeat)
+        if mpl:
+            raise RuntimeError('matplotlib is imported by the compute path')
+        self.measured['import.numpy'] = t_np
+        return t_mod, None
+
+    def budget_scale(self, budgets):
+        """Numpy import time now relative to when the budget was set (not below 1)."""
+        t_np = self.measured.get('import.numpy')
+        if t_np is None or 'import.numpy' not in budgets:
+            return 1.0
+        return max(1.0, t_np/budgets['import.numpy'])
+
+
+def all_benchmarks(files):
+    reference = load_reference()
+    f = np.logspace(0, 6, CIRCUIT_NUM)
+    bench = circuit_benchmarks(f, reference) + budget_benchmarks(reference) + [incremental_benchmark()]
+    if files:
+        bench += data_benchmarks(files)
+    bench.append(ImportBenchmark())
+    return bench
+
+
+def main(args):
+    if args.make_reference:
+        make_reference(args.make_reference)
+        return 0
+
+    files = args.data if args.data else sorted(glob.glob(os.path.join(HERE, 'noise_data', 'SCRN*.TXT')))
+    budgets = {}
+    if os.path.exists(args.budgets):
+        with open(args.budgets) as fp:
+            budgets = json.load(fp)
+
+    measured = {}
+    ok = True
+    print('{0:20s} {1:>10s} {2:>10s} {3:>10s}'.format('benchmark', 'ms', 'budget', 'rel err'))
+    for b in all_benchmarks(files):
+        if args.only and not any(b.name == o or b.name.startswith(o + '.') for o in args.only):
+            continue
+        t, err = b.run(args.repeat)
+        measured[b.name] = t
+        measured.update(b.measured)
+        budget = budgets.get(b.name)
+        if budget is not None:
+            budget = budget*b.budget_scale(budgets)
+        status = ''
+        if err is not None and not err <= RTOL:
+            status += ' FAIL: differs from reference'
+            ok = False
+        if budget is not None and t > budget*args.slack + ABS_SLACK and not args.update:
+            status += ' FAIL: over budget'
+            ok = False
+        print('{0:20s} {1:10.3f} {2:>10s} {3:>10s}{4:s}'.format(
+            b.name, t, '-' if budget is None else '{0:.3f}'.format(budget),
+            '-' if err is None else '{0:.1e}'.format(err), status))
+
+    # vectorized Z_tot against the per-element loop
+    speedups = ['{0:s} {1:.0f}x'.format(k[len('Z_tot.'):], measured['to_np_array.' + k[len('Z_tot.'):]]/max(v, 1e-6))
+                for k, v in sorted(measured.items())
+                if k.startswith('Z_tot.') and 'to_np_array.' + k[len('Z_tot.'):] in measured]
+    if speedups:
+        print('Z_tot speedup over to_np_array: ' + ', '.join(speedups))
+
+    if args.update:
+        budgets.update((k, round(v, 3)) for k, v in measured.items())
+        with open(args.budgets, 'w') as fp:
+            json.dump(budgets, fp, indent=2, sort_keys=True)
+            fp.write('\n')
+        print('budgets written to ' + args.budgets)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+
+    sys.exit(main(get_args()))
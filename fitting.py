@@ -0,0 +1,208 @@
+"""Fit parameters of the readout chain to measured noise spectra.
+
+Residuals are taken in log space, log(model) - log(data), and the
+parameters are fitted as log(value) within bounds with a projected
+Levenberg-Marquardt. The Jacobian is computed in a single broadcast
+evaluation of the noise budget: all forward-difference perturbations
+are set as one (P+1, 1) array per parameter. Several starts can run
+on a process pool.
+
+Example:
+    res = fit(freq, data, {'hemt.fc': 1.2e3, 'hemt.vflat': 0.24e-9, 'hemt.gm': 35e-3})
+    res.params
+"""
+
+import sys
+import argparse
+import multiprocessing
+import numpy as np
+import noise_budget
+
+
+class FitResult(object):
+
+    """Result of a fit.
+
+    params: dict of fitted values, cost: 0.5*sum(residual**2),
+    residual: log residuals at the best fit, n_iter: iterations of the
+    best start, costs: final cost of every start.
+    """
+
+    def __init__(self, params, cost, residual, n_iter, success, costs):
+        self.params = params
+        self.cost = cost
+        self.residual = residual
+        self.n_iter = n_iter
+        self.success = success
+        self.costs = costs
+
+    @property
+    def rms(self):
+        """RMS of the log residuals."""
+        return float(np.sqrt(np.mean(np.square(self.residual))))
+
+    def __str__(self):
+        s = ['cost {0:.6g} rms(log) {1:.4g} iterations {2:d} starts {3:d}'.format(
+            self.cost, self.rms, self.n_iter, len(self.costs))]
+        for p, v in self.params.items():
+            s.append('  {0:s} = {1:.6g}'.format(p, v))
+        return '\n'.join(s)
+
+
+class _Problem(object):
+
+    """Log residuals of the noise budget as a function of log parameters."""
+
+    def __init__(self, config, paths, freq, data, key, sigma):
+        self.budget = noise_budget.NoiseBudget(config)
+        self.paths = paths
+        self.freq = freq
+        self.log_data = np.log(data)
+        self.key = key
+        self.sigma = 1.0 if sigma is None else sigma
+
+    def residuals(self, u):
+        """Residuals for log parameters u of shape (P,) or (K, P), returns (N,) or (K, N)."""
+        u = np.asarray(u)
+        for i, p in enumerate(self.paths):
+            v = np.exp(u[..., i])
+            self.budget.set(p, v[:, np.newaxis] if v.ndim else float(v))
+        res = self.budget.evaluate(self.freq)
+        m = getattr(res, self.key) if hasattr(res, self.key) else res.noise_sources[self.key]
+        r = (np.log(np.abs(m)) - self.log_data)/self.sigma
+        return np.broadcast_to(r, u.shape[:-1] + (len(self.freq),))
+
+    def jacobian(self, u, h=1e-6):
+        """Residuals and forward-difference Jacobian from one broadcast evaluation."""
+        P = len(u)
+        U = np.repeat(u[np.newaxis, :], P + 1, axis=0)
+        U[1:] += h*np.eye(P)
+        R = self.residuals(U)
+        return R[0], ((R[1:] - R[0])/h).T
+
+
+def _lm(problem, u, lo, hi, max_iter=100, tol=1e-10):
+    """Projected Levenberg-Marquardt on the box lo <= u <= hi."""
+    u = np.clip(u, lo, hi)
+    r, J = problem.jacobian(u)
+    cost = 0.5*np.dot(r, r)
+    lam = 1e-3
+    it = 0
+    success = False
+    for it in range(1, max_iter + 1):
+        A = np.dot(J.T, J)
+        g = np.dot(J.T, r)
+        D = np.diag(np.diag(A)) + 1e-12*np.eye(len(u))
+        step = np.linalg.solve(A + lam*D, -g)
+        u_new = np.clip(u + step, lo, hi)
+        r_new = np.asarray(problem.residuals(u_new))
+        cost_new = 0.5*np.dot(r_new, r_new)
+        if cost_new < cost:
+            converged = (cost - cost_new) <= tol*max(cost, 1e-300) or np.max(np.abs(u_new - u)) < 1e-9
+            u, cost = u_new, cost_new
+            lam = max(lam/3.0, 1e-12)
+            r, J = problem.jacobian(u)
+            if converged:
+                success = True
+                break
+        else:
+            lam *= 4.0
+            if lam > 1e12:
+                success = True
+                break
+    return u, cost, r, it, success
+
+
+def _run_start(task):
+    config, paths, freq, data, key, sigma, u0, lo, hi, max_iter = task
+    problem = _Problem(config, paths, freq, data, key, sigma)
+    return _lm(problem, u0, lo, hi, max_iter)
+
+
+def fit(freq, data, params, bounds=None, config=None, key='en_total_output', sigma=None,
+        n_starts=1, processes=None, seed=None, max_iter=100):
+    """Fit parameters of the readout chain to measured noise.
+
+    Arguments:
+    freq, data: measured frequencies and noise (V/sqHz)
+    params: dict of parameter ('hemt.fc', 'hemt.vflat', 'hemt.gm', 'hemt.Cgs',
+            'opamp.vflat', 'Z2.Rfb', ...) to initial value, all positive
+    bounds: dict of parameter to (low, high), default a decade around the initial value
+    config: noise_budget.NoiseBudgetConfig of the other values
+    key: output to fit, a total or a noise source
+    sigma: uncertainty of log(data), scalar or per point
+    n_starts: number of starts, the first at the initial values, the
+              others log-uniform within the bounds
+    processes: process pool size for the starts (default cpu count, 1 runs serially)
+    """
+    if config is None:
+        config = noise_budget.NoiseBudgetConfig()
+    freq = np.asarray(freq, dtype=float)
+    data = np.asarray(data, dtype=float)
+    sel = (freq > 0) & (data > 0)
+    freq, data = freq[sel], data[sel]
+    if sigma is not None and np.ndim(sigma) > 0:
+        sigma = np.asarray(sigma)[sel]
+
+    paths = list(params)
+    bounds = bounds or {}
+    u0 = np.log([float(params[p]) for p in paths])
+    lo = np.array([np.log(bounds[p][0]) if p in bounds else u0[i] - np.log(10) for i, p in enumerate(paths)])
+    hi = np.array([np.log(bounds[p][1]) if p in bounds else u0[i] + np.log(10) for i, p in enumerate(paths)])
+
+    rng = np.random.default_rng(seed)
+    starts = [u0] + [rng.uniform(lo, hi) for i in range(n_starts - 1)]
+    tasks = [(config, paths, freq, data, key, sigma, u, lo, hi, max_iter) for u in starts]
+
+    if processes == 1 or len(tasks) == 1:
+        results = list(map(_run_start, tasks))
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_run_start, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+    costs = [r[1] for r in results]
+    u, cost, r, it, success = results[int(np.argmin(costs))]
+    best = {p: float(np.exp(v)) for p, v in zip(paths, u)}
+    return FitResult(best, float(cost), r, it, success, costs)
+
+
+
+def get_args():
+    parser = argparse.ArgumentParser('Fit the noise model to measured spectra.')
+    parser.add_argument('--data', '-d', nargs='+', required=True, help='Data files.')
+    parser.add_argument('--param', '-p', nargs='+', default=['hemt.fc=1.2e3', 'hemt.vflat=0.24e-9'],
+                        help='Parameters to fit with initial values, e.g. hemt.gm=35e-3.')
+    parser.add_argument('--fmin', default=None, type=float, help='Lowest frequency to fit.')
+    parser.add_argument('--fmax', default=None, type=float, help='Highest frequency to fit.')
+    parser.add_argument('--starts', default=1, type=int, help='Number of starts.')
+    parser.add_argument('--processes', default=None, type=int, help='Process pool size.')
+    parser.add_argument('--seed', default=None, type=int, help='Seed for the starts.')
+    a = parser.parse_args()
+    print(a)
+    return a
+
+
+def main(args):
+    import spectrum_data
+    freq, data = spectrum_data.load_spectra(args.data, unique=True)
+    sel = np.ones(len(freq), dtype=bool)
+    if args.fmin is not None:
+        sel &= freq >= args.fmin
+    if args.fmax is not None:
+        sel &= freq <= args.fmax
+    params = {}
+    for p in args.param:
+        name, val = p.split('=')
+        params[name] = float(val)
+    res = fit(freq[sel], data[sel], params, n_starts=args.starts, processes=args.processes, seed=args.seed)
+    print(res)
+    return res
+
+
+if __name__ == '__main__':
+
+    main(get_args())
@@ -1,5 +1,4 @@
 from math import pi as pi
-from math import sqrt
 import numpy as np
 
 
@@ -17,7 +16,25 @@ def parallel(Z1,Z2):
 def series(Z1,Z2):
     return Z1 + Z2
 
+def freq_array(f):
+    """Return frequencies as a float array (0-d for scalars), float32 is kept for reduced precision."""
+    f = np.asarray(f)
+    return f if f.dtype == np.float32 else np.asarray(f, dtype=float)
+
 def to_np_array(func, arr):
+    """Evaluate func over arr.
+
+    Compatibility shim: components and circuits accept frequency arrays
+    directly, so func is called once on the whole array. Callables that
+    only take scalars (e.g. cmath.phase) fall back to a per-element loop.
+    """
+    arr = np.asarray(arr)
+    try:
+        out = np.asarray(func(arr))
+        if out.shape == arr.shape:
+            return out
+    except (TypeError, ValueError):
+        pass
     return np.array([func(a) for a in arr])
 
 
@@ -32,16 +49,18 @@ class Capacitor(Component):
     def __init__(self, value, name=''):
         Component.__init__(self,value, name)
     def Z(self,f):
-        return complex(0,-1.0/(2*pi*f*self.value))
+        return -1j/(2*pi*freq_array(f)*self.value)
 
 class Resistor(Component):
-    def __init__(self, value, name=''):
+    def __init__(self, value, name='', T=None):
         Component.__init__(self,value, name)
+        # temperature of the stage the resistor sits on (K)
+        self.T = T
     def Z(self,f):
-        return complex(self.value,0)
-    def voltage_noise(self,T):
-        """Return voltage noise in V/sqHz"""
-        return sqrt(4*kB*T*self.value)
+        return self.value + 0j*freq_array(f)
+    def voltage_noise(self,T=None):
+        """Return voltage noise in V/sqHz (at the resistor temperature if T is None)"""
+        return np.sqrt(4*kB*(self.T if T is None else T)*self.value)
 
 
 class Circuit(object):
@@ -55,30 +74,86 @@ class Circuit(object):
     def Z_tot(self):
         """Should override this function"""
 
+    def resistors(self):
+        """Attribute names of the resistors of the circuit, sorted."""
+        return [attr for attr, v in sorted(vars(self).items()) if isinstance(v, Resistor)]
+
+    def set_temperature(self, T):
+        """Put all resistors of the circuit at temperature T (K, may be an array)."""
+        for attr in self.resistors():
+            getattr(self, attr).T = T
+
+    def thermal_noise(self, freq, T=None, resistor=None):
+        """Thermal voltage noise in V/sqHz of each resistor at the terminals (Thevenin).
+
+        A resistor R at temperature T contributes 4kT R |dZ/dR|: in a
+        reciprocal network dZ/dR is the square of the transfer from the
+        resistor to the terminals. Z is bilinear in R, so dZ/dR follows
+        exactly from Z_tot at R, 2R and R/2. The sum over all resistors at
+        one temperature is 4kT Re(Z).
+
+        T: temperature for all resistors, None for their own (Resistor.T)
+        resistor: attribute name of one resistor to return its noise only
+        Returns dict of attribute name: noise, or the noise of resistor.
+        """
+        f = freq_array(freq)
+        # the differences of Z need double precision, the result is given in the precision of freq
+        single = f.dtype == np.float32
+        f = np.asarray(f, dtype=float)
+        out = {}
+        for attr in self.resistors() if resistor is None else [resistor]:
+            r = getattr(self, attr)
+            T_r = r.T if T is None else T
+            if T_r is None:
+                raise ValueError('no temperature for ' + self.name + '.' + attr)
+            R = r.value
+            try:
+                Z1 = self.Z_tot(f)
+                r.value = 2*R
+                Z2 = self.Z_tot(f)
+                r.value = 0.5*R
+                Z3 = self.Z_tot(f)
+            finally:
+                r.value = R
+            # R |dZ/dR| from the three points of the bilinear Z(R)
+            RdZ = 3*np.abs((Z1 - Z2)*(Z1 - Z3)/(Z2 - Z3))
+            out[attr] = np.sqrt(4*kB*T_r*RdZ)
+            if single:
+                out[attr] = np.asarray(out[attr], dtype=np.float32)
+        return out if resistor is None else out[resistor]
+
 
 class HEMT(Circuit):
-    def __init__(self,name, Rg=1e12, Cgs=100e-12, gm=35):
+    def __init__(self,name, Rg=1e12, Cgs=100e-12, gm=35, fc=1.2e3, vflat=0.254e-9):
         """ Arguments:
         Rg: input resistance on the gate
         Cgs: gate-source capacitance
         gm: transconductance in mS
+        fc: voltage noise knee frequency in Hz
+        vflat: voltage noise white level in V/sqHz
         """
         Circuit.__init__(self,name)
         self.Rg = Resistor(Rg,'Rg')
         self.Cgs = Capacitor(Cgs,'Cgs)')
         self.gm = gm*1e-3 #S
+        self.fc = fc
+        self.vflat = vflat
 
     def Z_tot(self, freq):
         # gate to source resistance and gate to source capacitance in parallel
         Zt = parallel(self.Rg.Z(freq), self.Cgs.Z(freq))
         return Zt
 
-    def voltageNoise(self,f, fc=1.2e3, vflat=0.254-9):
+    def voltageNoise(self,f, fc=None, vflat=None):
         """Voltage noise in V/sqHz.
 
-        fc = knee frequencey in Hz
-        vflat = white noise level.
+        fc = knee frequencey in Hz (default self.fc)
+        vflat = white noise level (default self.vflat)
         """
+        if fc is None:
+            fc = self.fc
+        if vflat is None:
+            vflat = self.vflat
         return (fc/f + 1)*vflat
     
 
@@ -99,39 +174,44 @@ class OpAmp(Circuit):
     
 class LT1677(OpAmp):
     """Specific Opamp"""
-    def __init__(self, name, flat=135.0, poles=(0.5, 80e3)):
+    def __init__(self, name, flat=135.0, poles=(0.5, 80e3), fc=13.0, vflat=3.2e-9):
         OpAmp.__init__(self,name)
         self._pole1 = poles[0] #Hz
         self._pole2 = poles[1] # Hz
         self._Aflat = flat #Db
         self._phase_slope = -30 #deg/decade in Freq
+        self.fc = fc # voltage noise knee in Hz
+        self.vflat = vflat # voltage noise white level in V/sqHz
         
     def Aopen_phase(self, freq):
-        if freq <1e5:
-            return math.pi/2
-        elif freq >=1e5 and freq < 1e6:            
-            return 240 - self._phase_slope*np.log10(freq)
-        else:
-            return 60.0*math.pi/180
+        freq = freq_array(freq)
+        return np.select([freq < 1e5, freq < 1e6],
+                         [pi/2, 240 - self._phase_slope*np.log10(freq)],
+                         60.0*pi/180)
 
     def Aopen(self,freq):
         #return np.power(10,self._Aflat/20.0)/((1+freq/self._pole1)*(1+freq/self._pole2))
+        freq = freq_array(freq)
         w = np.power(10,self._Aflat/20.0)
-        w1 = complex(1,freq/self._pole1)
-        w2 = complex(1,freq/self._pole2)
+        w1 = 1 + 1j*freq/self._pole1
+        w2 = 1 + 1j*freq/self._pole2
         return w/(w1*w2)
     
     def Aopen_gary(self,freq,flat=2e7, pole1=10, pole2=1e6):
-        w = 2*np.pi*freq
-        w0 = complex(1,w/(2*np.pi*pole1))
-        w1 = complex(1, w/(2*np.pi*pole2))
+        w = 2*np.pi*freq_array(freq)
+        w0 = 1 + 1j*w/(2*np.pi*pole1)
+        w1 = 1 + 1j*w/(2*np.pi*pole2)
         return 2e7/( w0*w1 )
 
-    def voltage_noise(self, freq, fc=13.0, vflat=3.2e-9):
+    def voltage_noise(self, freq, fc=None, vflat=None):
         """Input voltage noise.
-        fc = knee frequencey in Hz
-        vflat = white noise level.
+        fc = knee frequencey in Hz (default self.fc)
+        vflat = white noise level (default self.vflat)
         """
+        if fc is None:
+            fc = self.fc
+        if vflat is None:
+            vflat = self.vflat
         return (fc/freq + 1)*vflat
 
     def voltage_noise_gary(self, freq):
@@ -148,11 +228,11 @@ class BJT(Circuit):
         Circuit.__init__(self,name)
 
     def Z_tot(self, freq):
-        return 0
+        return np.zeros_like(freq_array(freq), dtype=complex)
 
     def shotNoise(self,I):
         """Shot noise in A/sqHz."""
-        return sqrt(2*qE*I)
+        return np.sqrt(2*qE*I)
 
     def currentNoise(self,I):
         """Total current noise in A/sqHz."""
@@ -220,6 +300,25 @@ class Z1_MC(Circuit):
 
         return Z3
 
+    def voltageNoise(self, freq, T, resistor=None):
+        """Thermal voltage noise in V/sqHz at the terminals (Thevenin).
+
+        resistor: 'Rbias' or 'Rbleed' for the contribution of one resistor,
+                  None for both (sqrt(4kT Re Z))
+        """
+        if resistor is None:
+            return np.sqrt(4*kB*T*self.Z_tot(freq).real)
+        Rbleed = self.Rbleed.Z(freq)
+        if resistor == 'Rbleed':
+            # Norton current of Rbleed across the whole network
+            return np.sqrt(4*kB*T/self.Rbleed.value)*np.abs(self.Z_tot(freq))
+        if resistor == 'Rbias':
+            # Norton current of Rbias across Rbias||Cdet, divided by Cc and Rbleed
+            Z1 = parallel(self.Rbias.Z(freq), self.Cdet.Z(freq))
+            Z2 = series(Z1, self.Cc.Z(freq))
+            return np.sqrt(4*kB*T/self.Rbias.value)*np.abs(Z1*Rbleed/(Z2 + Rbleed))
+        raise ValueError('unknown resistor ' + str(resistor))
+
 
 
 class Z5(Circuit):
@@ -242,7 +341,7 @@ class Z5(Circuit):
 
 class Z4(Circuit):
     """"""
-    def __init___(self,name, Rmirror=1e2):
+    def __init__(self,name, Rmirror=1e2):
         """"""
         Circuit.__init__(self,name)
         self.Rmirror = Resistor(Rmirror,'Rmirror')
@@ -264,38 +363,403 @@ class Z2(Circuit):
         Z = parallel(self.Cfb.Z(freq), self.Rfb.Z(freq))
         return Z
 
-    def voltageNoise(self, T):
-        return self.Rfb.voltageNoise(T)
+    def voltageNoise(self, freq, T=None):
+        """Thermal voltage noise of Rfb in V/sqHz at the terminals, shunted by Cfb."""
+        return self.thermal_noise(freq, T, 'Rfb')
     
 
+class Node(object):
+
+    """Node in a charge circuit graph.
+
+    Nodes are combined with Series, Parallel, Divider, Feedback, ... into
+    a DAG that ChargeCircuit compiles into a single evaluation plan.
+    """
+
+    commutative = False
+
+    def __init__(self, *inputs):
+        self.inputs = inputs
+
+    def params(self):
+        """Hashable parameters identifying this node apart from its inputs."""
+        return ()
+
+    def dependencies(self):
+        """(obj, attr) pairs the node reads at evaluation, attr None for any attribute of obj."""
+        return ()
+
+    def evaluate(self, freq, *values):
+        """Should override this function"""
+
+    def evaluate_into(self, out, freq, *values):
+        """Evaluate into the preallocated array out (cast to its dtype), override to work in place."""
+        np.copyto(out, self.evaluate(freq, *values), casting='same_kind')
+        return out
+
+    def __mul__(self, other):
+        return Product(self, other)
+
+    def __truediv__(self, other):
+        return Quotient(self, other)
+
+    def __neg__(self):
+        return Negate(self)
+
+
+class Impedance(Node):
+    """Impedance of a Circuit (Z_tot) or Component (Z)."""
+    def __init__(self, circuit):
+        Node.__init__(self)
+        self.circuit = circuit
+
+    def params(self):
+        return (id(self.circuit),)
+
+    def dependencies(self):
+        if isinstance(self.circuit, Component):
+            return ((self.circuit, 'value'),)
+        # the value of a component is set either as circuit.attr or on the component itself
+        deps = []
+        for a, v in vars(self.circuit).items():
+            if isinstance(v, Component):
+                deps += [(self.circuit, a), (v, 'value')]
+        return tuple(deps)
+
+    def evaluate(self, freq):
+        if isinstance(self.circuit, Component):
+            return self.circuit.Z(freq)
+        return self.circuit.Z_tot(freq)
+
+
+class Response(Node):
+    """Frequency response func(freq, **kwargs), e.g. an opamp gain."""
+    def __init__(self, func, **kwargs):
+        Node.__init__(self)
+        self.func = func
+        self.kwargs = kwargs
+
+    def params(self):
+        func = (id(getattr(self.func, '__self__', None)), getattr(self.func, '__func__', self.func))
+        return func + tuple(sorted(self.kwargs.items()))
+
+    def dependencies(self):
+        owner = getattr(self.func, '__self__', None)
+        return () if owner is None else ((owner, None),)
+
+    def evaluate(self, freq):
+        return self.func(freq, **self.kwargs)
+
+
+class Value(Node):
+    """Attribute of an object read at evaluation time, e.g. HEMT gm."""
+    def __init__(self, obj, attr):
+        Node.__init__(self)
+        self.obj = obj
+        self.attr = attr
+
+    def params(self):
+        return (id(self.obj), self.attr)
+
+    def dependencies(self):
+        return ((self.obj, self.attr),)
+
+    def evaluate(self, freq):
+        return getattr(self.obj, self.attr)
+
+
+class Constant(Node):
+    def __init__(self, value):
+        Node.__init__(self)
+        self.value = value
+
+    def params(self):
+        return (self.value,)
+
+    def evaluate(self, freq):
+        return self.value
+
+
+class Series(Node):
+    commutative = True
+    def evaluate(self, freq, Z1, Z2):
+        return series(Z1, Z2)
+    def evaluate_into(self, out, freq, Z1, Z2):
+        return np.add(Z1, Z2, out=out, casting='same_kind')
+
+
+class Parallel(Node):
+    commutative = True
+    def evaluate(self, freq, Z1, Z2):
+        return parallel(Z1, Z2)
+    def evaluate_into(self, out, freq, Z1, Z2):
+        np.divide(1.0, Z1, out=out, casting='same_kind')
+        np.add(out, np.divide(1.0, Z2), out=out, casting='same_kind')
+        return np.divide(1.0, out, out=out)
+
+
+class Divider(Node):
+    """Voltage divider fraction Z1/(Z1+Z2)."""
+    def evaluate(self, freq, Z1, Z2):
+        return Z1/(Z1 + Z2)
+    def evaluate_into(self, out, freq, Z1, Z2):
+        np.add(Z1, Z2, out=out, casting='same_kind')
+        return np.divide(Z1, out, out=out, casting='same_kind')
+
+
+class Feedback(Node):
+    """Closed loop gain A/(1+A*B)."""
+    def evaluate(self, freq, A, B):
+        return A/(1 + A*B)
+    def evaluate_into(self, out, freq, A, B):
+        np.multiply(A, B, out=out, casting='same_kind')
+        np.add(out, 1, out=out)
+        return np.divide(A, out, out=out, casting='same_kind')
+
+
+class Product(Node):
+    commutative = True
+    def evaluate(self, freq, a, b):
+        return a*b
+    def evaluate_into(self, out, freq, a, b):
+        return np.multiply(a, b, out=out, casting='same_kind')
+
+
+class Quotient(Node):
+    def evaluate(self, freq, a, b):
+        return a/b
+    def evaluate_into(self, out, freq, a, b):
+        return np.divide(a, b, out=out, casting='same_kind')
+
+
+class Negate(Node):
+    def evaluate(self, freq, a):
+        return -1*a
+    def evaluate_into(self, out, freq, a):
+        return np.negative(a, out=out, casting='same_kind')
+
+
+class BufferPool(object):
+
+    """Arrays released by finished plan steps, reused as out= buffers.
+
+    allocated, peak: bytes of the arrays handed out now and at most.
+    """
+
+    def __init__(self):
+        self._free = {}
+        self.allocated = 0
+        self.peak = 0
+
+    def get(self, shape, dtype):
+        """An array of shape and dtype (uninitialized), reused if one was released."""
+        key = (tuple(shape), np.dtype(dtype))
+        free = self._free.get(key)
+        a = free.pop() if free else np.empty(shape, dtype)
+        self.allocated += a.nbytes
+        self.peak = max(self.peak, self.allocated)
+        return a
+
+    def release(self, a):
+        self._free.setdefault((a.shape, a.dtype), []).append(a)
+        self.allocated -= a.nbytes
+
+    def clear(self):
+        self._free = {}
+
+
+class CircuitPlan(object):
+
+    """Compiled evaluation plan of a charge circuit graph.
+
+    Every distinct subexpression is one step and is computed once per
+    frequency grid, however many outputs share it.
+    """
+
+    def __init__(self, outputs, stages=None):
+        """ Arguments:
+        outputs: dict of name to Node
+        stages: dict of output name to stage label for profiling (default the name);
+                a step is labelled by the first output that needs it
+        """
+        self.steps = []
+        self.labels = []
+        self.outputs = {}
+        seen = {}
+        memo = {}
+        for name, node in outputs.items():
+            label = (stages or {}).get(name, name)
+            self.outputs[name] = self._add(node, seen, memo, label)
+
+    def _add(self, node, seen, memo, label):
+        if id(node) in memo:
+            return memo[id(node)]
+        idx = tuple(self._add(n, seen, memo, label) for n in node.inputs)
+        key = (type(node), node.params(), tuple(sorted(idx)) if node.commutative else idx)
+        if key not in seen:
+            seen[key] = len(self.steps)
+            self.steps.append((node, idx))
+            self.labels.append(label)
+        memo[id(node)] = seen[key]
+        return seen[key]
+
+    def __len__(self):
+        return len(self.steps)
+
+    def evaluate(self, freq, stage=None):
+        """Return dict of output name to value at freq, stage as in evaluate_steps."""
+        if stage is not None:
+            return self.output_values(self.evaluate_steps(freq, stage=stage)[0])
+        values = []
+        for node, idx in self.steps:
+            values.append(node.evaluate(freq, *[values[i] for i in idx]))
+        return self.output_values(values)
+
+    def evaluate_lean(self, freq, keep=None, dtype=np.complex64, pool=None):
+        """Outputs keep (default all) at freq with little memory.
+
+        Every array is stored as dtype (its real counterpart for real
+        values), freq too. A step is evaluated into a buffer of pool and the
+        buffer goes back to the pool after the last step reading it, unless
+        it is an output in keep. Peak memory is the kept outputs plus the
+        few intermediates alive at once instead of all steps.
+        """
+        if pool is None:
+            pool = BufferPool()
+        keep = set(self.outputs) if keep is None else set(keep)
+        dtype = np.dtype(dtype)
+        real = np.empty(0, dtype).real.dtype
+        freq = np.asarray(freq, dtype=real)
+        kept = set(self.outputs[name] for name in keep)
+        last_use = {}
+        for i, (node, idx) in enumerate(self.steps):
+            for j in idx:
+                last_use[j] = i
+
+        values = [None]*len(self.steps)
+        for i, (node, idx) in enumerate(self.steps):
+            inputs = [values[j] for j in idx]
+            if idx:
+                shape = np.broadcast_shapes(*[np.shape(v) for v in inputs])
+                is_complex = any(np.iscomplexobj(v) for v in inputs)
+                if shape:
+                    values[i] = node.evaluate_into(pool.get(shape, dtype if is_complex else real), freq, *inputs)
+                else:
+                    values[i] = node.evaluate(freq, *inputs)
+            else:
+                value = node.evaluate(freq)
+                if np.ndim(value):
+                    buf = pool.get(np.shape(value), dtype if np.iscomplexobj(value) else real)
+                    np.copyto(buf, value, casting='same_kind')
+                    value = buf
+                values[i] = value
+            for j in set(idx):
+                if last_use[j] == i and j not in kept and np.ndim(values[j]):
+                    pool.release(values[j])
+                    values[j] = None
+        return {name: values[self.outputs[name]] for name in keep}
+
+    def output_values(self, values):
+        """Dict of output name to value from the values of all steps."""
+        return {name: values[i] for name, i in self.outputs.items()}
+
+    def depending_on(self, obj, attr):
+        """Indices of the steps reading attribute attr of obj (see Node.dependencies)."""
+        return [i for i, (node, idx) in enumerate(self.steps)
+                if any(o is obj and (a is None or a == attr) for o, a in node.dependencies())]
+
+    def evaluate_steps(self, freq, values=None, dirty=(), stage=None):
+        """Values of all steps at freq.
+
+        Given the values of a previous call, only the dirty steps and the
+        steps depending on them are recomputed. stage(label) returns a
+        context manager entered around each run of consecutive recomputed
+        steps with the same label, e.g. a profiling stage.
+
+        Returns (values, indices of the recomputed steps).
+        """
+        if values is None:
+            values = [None]*len(self.steps)
+            recompute = set(range(len(self.steps)))
+        else:
+            values = list(values)
+            recompute = set(dirty)
+        changed = []
+        current = None
+        for i, (node, idx) in enumerate(self.steps):
+            if i not in recompute and not any(j in recompute for j in idx):
+                continue
+            recompute.add(i)
+            if stage is not None and (current is None or current[0] != self.labels[i]):
+                if current is not None:
+                    current[1].__exit__(None, None, None)
+                current = (self.labels[i], stage(self.labels[i]))
+                current[1].__enter__()
+            values[i] = node.evaluate(freq, *[values[j] for j in idx])
+            changed.append(i)
+        if current is not None:
+            current[1].__exit__(None, None, None)
+        return values, changed
+
+
 class ChargeCircuit(Circuit):
 
-    """Description of charge circuit for ionization readout for SCDMS."""
+    """Description of charge circuit for ionization readout for SCDMS.
+
+    Holds the circuits of the readout chain and a graph of named
+    quantities (impedances, feedback fractions, gains) built from Nodes.
+    """
 
     def __init__(self, name):
         """init class"""
         Circuit.__init__(self,name)
         self._components = []
+        self._outputs = {}
+        self._stages = {}
+        self._stage = None
 
     def addCircuit(self,c):
-        if self.get(c.name) != None:
+        if self.getCircuit(c.name) != None:
             raise ValueError('this circuit is already present')
         else:
-            self._components.append(circ)
+            self._components.append(c)
+        return c
     
     def getCircuit(self, name):
         for c in self._components:
             if c.name == name:
                 return c
         return None
+
+    def begin_stage(self, label):
+        """Label the quantities defined from now on as one stage (for profiling)."""
+        self._stage = label
+
+    def define(self, name, node):
+        """Add a named quantity to the graph and return its node."""
+        if name in self._outputs:
+            raise ValueError('quantity ' + name + ' is already defined')
+        self._outputs[name] = node
+        if self._stage is not None:
+            self._stages[name] = self._stage
+        return node
+
+    def node(self, name):
+        return self._outputs[name]
+
+    def names(self):
+        return list(self._outputs)
+
+    def compile(self, names=None):
+        """Compile the named quantities (default all) into a CircuitPlan."""
+        if names is None:
+            names = self.names()
+        return CircuitPlan({n: self._outputs[n] for n in names}, self._stages)
+
+    def evaluate(self, freq, names=None):
+        return self.compile(names).evaluate(freq)
     
     def setGain(self,A,f):
         """Set total gain vs frequency"""
         self._gain = A
         self._f = f
-
-        
-    
-    
-
-    
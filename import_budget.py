@@ -0,0 +1,66 @@
+"""Check the import time of the compute path.
+
+The compute modules (impedance, noise_budget, noise_model, ...) must not
+import matplotlib and must import within a time budget.
+
+Usage: python import_budget.py [--budget ms] [--repeat n]
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+
+
+COMPUTE_MODULES = ('impedance', 'noise_budget', 'noise_model', 'sweep', 'montecarlo')
+
+_SNIPPET = """
+import sys, time
+t0 = time.perf_counter()
+import numpy
+t1 = time.perf_counter()
+import {modules}
+t2 = time.perf_counter()
+print(t1 - t0, t2 - t1, int('matplotlib' in sys.modules))
+"""
+
+
+def get_args():
+    parser = argparse.ArgumentParser('Import time budget of the compute path.')
+    parser.add_argument('--budget', default=150.0, type=float, help='Budget in ms for importing the compute modules (numpy excluded).')
+    parser.add_argument('--repeat', default=5, type=int, help='Number of fresh interpreters, the fastest counts.')
+    a = parser.parse_args()
+    return a
+
+
+def measure(modules=COMPUTE_MODULES, repeat=5):
+    """Return (numpy ms, modules ms, matplotlib imported) for the fastest of repeat fresh interpreters."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    code = _SNIPPET.format(modules=', '.join(modules))
+    best = None
+    for i in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', code], cwd=here)
+        t_np, t_mod, mpl = out.split()
+        res = (float(t_np)*1e3, float(t_mod)*1e3, bool(int(mpl)))
+        if best is None or res[1] < best[1]:
+            best = res
+    return best
+
+
+def main(args):
+    t_np, t_mod, mpl = measure(repeat=args.repeat)
+    print('import numpy: {0:.1f} ms'.format(t_np))
+    print('import {0}: {1:.1f} ms (budget {2:.1f} ms)'.format(', '.join(COMPUTE_MODULES), t_mod, args.budget))
+    ok = True
+    if mpl:
+        print('FAIL: matplotlib is imported by the compute path')
+        ok = False
+    if t_mod > args.budget:
+        print('FAIL: import time over budget')
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+
+    sys.exit(main(get_args()))
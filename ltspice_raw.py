@@ -0,0 +1,126 @@
+"""Reader for LTspice binary .raw files.
+
+The ASCII (LTspice IV) or UTF-16 (LTspice XVII) header is parsed and the
+binary block is memory-mapped. Each variable is returned as a NumPy view
+of the memmap without copying.
+
+Layouts of the binary block:
+    real:       first variable (time/frequency) float64, the others float32
+    real double: all variables float64
+    complex:    all variables complex128
+    fastaccess: variables stored one after the other instead of point by point
+
+Example:
+    raw = RawFile('LTspice/hemt-noise-4K.raw')
+    f = raw['frequency']
+    en = raw['V(inoise)']
+"""
+
+import numpy as np
+
+
+class RawFile(object):
+
+    """LTspice binary .raw file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.header = {}
+        self.variables = []
+        self._read_header()
+        self._map()
+
+    def _read_header(self):
+        with open(self.path, 'rb') as f:
+            head = f.read(2)
+            f.seek(0)
+            # LTspice XVII writes the header in UTF-16 LE
+            if len(head) == 2 and head[1:] == b'\x00':
+                enc, marker = 'utf-16-le', 'Binary:\n'.encode('utf-16-le')
+            else:
+                enc, marker = 'latin-1', b'Binary:\n'
+            data = b''
+            while marker not in data:
+                chunk = f.read(4096)
+                if not chunk:
+                    raise ValueError(self.path + ' is not a binary LTspice raw file')
+                data += chunk
+        end = data.index(marker) + len(marker)
+        self.data_offset = end
+        text = data[:end].decode(enc)
+
+        in_vars = False
+        for line in text.splitlines():
+            if in_vars and line.startswith(('\t', ' ')):
+                fields = line.split()
+                self.variables.append((fields[1], fields[2]))
+                continue
+            in_vars = False
+            if ':' not in line:
+                continue
+            key, val = line.split(':', 1)
+            key = key.strip()
+            if key == 'Variables':
+                in_vars = True
+            elif key != 'Binary':
+                self.header[key] = val.strip()
+
+        self.flags = set(self.header.get('Flags', '').split())
+        self.n_points = int(self.header['No. Points'])
+        if len(self.variables) != int(self.header['No. Variables']):
+            raise ValueError(self.path + ': number of variables does not match the header')
+
+    def dtypes(self):
+        """NumPy dtype of each variable in the binary block."""
+        if 'complex' in self.flags:
+            return ['<c16']*len(self.variables)
+        if 'double' in self.flags:
+            return ['<f8']*len(self.variables)
+        return ['<f8'] + ['<f4']*(len(self.variables) - 1)
+
+    def _map(self):
+        names = self.names()
+        dtypes = self.dtypes()
+        self._views = {}
+        if 'fastaccess' in self.flags:
+            offset = self.data_offset
+            for name, dt in zip(names, dtypes):
+                self._views[name] = np.memmap(self.path, dtype=dt, mode='r',
+                                              offset=offset, shape=(self.n_points,))
+                offset += np.dtype(dt).itemsize*self.n_points
+        else:
+            rec = np.dtype(list(zip(names, dtypes)))
+            self._data = np.memmap(self.path, dtype=rec, mode='r',
+                                   offset=self.data_offset, shape=(self.n_points,))
+            for name in names:
+                self._views[name] = self._data[name]
+
+    def names(self):
+        return [v[0] for v in self.variables]
+
+    def __contains__(self, name):
+        return name in self._views
+
+    def __getitem__(self, name):
+        """View of a variable. The time axis of transient runs is returned as abs value."""
+        v = self._views[name]
+        if name == 'time':
+            # LTspice IV marks compressed points with the sign of the time value
+            return np.abs(v)
+        return v
+
+    @property
+    def axis(self):
+        """The independent variable (time or frequency)."""
+        return self[self.names()[0]]
+
+    def steps(self):
+        """Slices of the points of each run of a stepped simulation."""
+        x = np.asarray(self.axis).real
+        starts = np.concatenate(([0], np.nonzero(np.diff(x) < 0)[0] + 1, [len(x)]))
+        return [slice(a, b) for a, b in zip(starts[:-1], starts[1:])]
+
+
+def read_raw(path):
+    """Open an LTspice binary .raw file, see RawFile."""
+    return RawFile(path)
@@ -0,0 +1,701 @@
+"""Modified nodal analysis of SPICE netlists: operating point, AC and noise.
+
+Reads LTspice/SPICE netlists (e.g. LTspice/hemt-noise-4K.net) with the
+elements
+
+    R C L      resistor (noiseless, temp=), capacitor, inductor
+    V I        independent sources, [DC] value [AC mag [phase]]
+    E G        voltage controlled voltage / current source
+    F H        current controlled current / voltage source (by V source)
+    J          JFET/HEMT with an NJF/PJF .model (as in LTspice/Mylib.lib)
+
+and the .model, .lib/.include, .temp, .ac and .noise cards. The operating
+point is found by Newton iteration (Shichman-Hodges JFET with gate
+junctions). The small-signal circuit is stamped into conductance and
+capacitance matrices from (row, col, value) triplets, so
+
+    Y(f) = G + j 2 pi f C
+
+is a batched (F, n, n) stack solved at all frequencies at once.
+
+Noise uses the adjoint method: one solve of Y^T z = e_out per frequency
+gives the transfer from every node (and source branch) to the output,
+so each noise current between nodes a, b reaches the output as
+|z_b - z_a|. As in LTspice the results are output referred densities
+V(<element>[.<source>]) in V/sqHz, V(onoise), the gain from the input
+source and V(inoise) = V(onoise)/gain.
+
+Matrices are dense: the netlists are small and numpy has no sparse solver.
+
+Example:
+    net = read_netlist('LTspice/hemt-noise-4K.net')
+    res = MNA(net).noise()          # from the .noise card
+    res['V(inoise)'], res['V(j2.sid)']
+
+Usage: python mna.py LTspice/hemt-noise-4K.net [--raw LTspice/hemt-noise-4K.raw] [--op-raw LTspice/hemt-noise-4K.op.raw]
+"""
+
+import os
+import re
+import argparse
+import numpy as np
+import impedance as Q
+
+
+# nominal temperature of the models and default circuit temperature (C)
+TNOM = 27.0
+
+# conductance across pn junctions, as SPICE
+GMIN = 1e-12
+
+# reference temperature of the SPICE junction potential scaling (K)
+REFTEMP = 300.15
+
+_SUFFIXES = (('meg', 1e6), ('mil', 25.4e-6), ('t', 1e12), ('g', 1e9), ('k', 1e3), ('m', 1e-3),
+             ('u', 1e-6), ('n', 1e-9), ('p', 1e-12), ('f', 1e-15))
+
+_NUMBER = re.compile(r'^([+-]?(?:\d+\.?\d*|\.\d+)(?:e[+-]?\d+)?)([a-z]*)$')
+
+_PARAM = re.compile(r'([a-z_]\w*)\s*=\s*([^\s()=,]+)')
+
+JFET_DEFAULTS = {'vto': -2.0, 'beta': 1e-4, 'lambda': 0.0, 'rd': 0.0, 'rs': 0.0, 'cgs': 0.0, 'cgd': 0.0,
+                 'pb': 1.0, 'is': 1e-14, 'n': 1.0, 'm': 0.5, 'fc': 0.5, 'kf': 0.0, 'af': 1.0,
+                 'betatce': 0.0, 'vtotc': 0.0, 'xti': 3.0, 'eg': 1.11}
+
+
+def parse_value(s):
+    """SPICE number with scale suffix ('-190m', '1Meg', '92pF') as float."""
+    m = _NUMBER.match(s.strip().lower())
+    if m is None:
+        raise ValueError('cannot parse SPICE value ' + s)
+    num, suffix = float(m.group(1)), m.group(2)
+    for k, scale in _SUFFIXES:
+        if suffix.startswith(k):
+            return num*scale
+    return num
+
+
+def sweep_frequencies(kind, num, fstart, fstop):
+    """Frequencies of an .ac/.noise sweep (dec, oct or lin)."""
+    kind = kind.lower()
+    num, fstart, fstop = int(parse_value(num)), parse_value(fstart), parse_value(fstop)
+    if kind == 'lin':
+        return np.linspace(fstart, fstop, num)
+    base = {'dec': 10.0, 'oct': 2.0}[kind]
+    n = int(np.floor(np.log(fstop/fstart)/np.log(base)*num + 1e-9))
+    return fstart*np.power(base, np.arange(n + 1)/float(num))
+
+
+class Element(object):
+
+    """A netlist element.
+
+    name: as in the netlist (e.g. 'J2'), the kind is its first letter
+    nodes: node names, lower case, '0' is ground
+    value: value, gain, DC value of sources (None for J)
+    params: instance parameters, e.g. temp, ac, model, control
+    """
+
+    def __init__(self, name, nodes, value=None, params=None):
+        self.name = name
+        self.kind = name[0].upper()
+        self.nodes = nodes
+        self.value = value
+        self.params = {} if params is None else params
+
+
+class Netlist(object):
+
+    """Elements, models and analysis cards of a parsed netlist.
+
+    models: {name: (type, {param: value})}, names lower case
+    noise: (output node, reference node, input source, frequencies) of the .noise card
+    ac: frequencies of the .ac card
+    temp: circuit temperature in C
+    missing: .lib/.include files that were not found
+    """
+
+    def __init__(self, title=''):
+        self.title = title
+        self.elements = []
+        self.models = {}
+        self.noise = None
+        self.ac = None
+        self.temp = TNOM
+        self.missing = []
+
+    def element(self, name):
+        for e in self.elements:
+            if e.name.lower() == name.lower():
+                return e
+        raise KeyError(name)
+
+    def parse(self, text, directory='.', title=True):
+        """Add the cards of text, first line is the title if title."""
+        lines = text.splitlines()
+        if title and lines:
+            self.title = lines[0]
+            lines = lines[1:]
+        cards = []
+        for line in lines:
+            line = line.split(';')[0].strip()
+            if not line or line[0] in '*#':
+                continue
+            if line[0] == '+' and cards:
+                cards[-1] += ' ' + line[1:]
+            else:
+                cards.append(line)
+        for card in cards:
+            if card[0] == '.':
+                self._control(card, directory)
+            else:
+                self._element(card)
+        return self
+
+    def _control(self, card, directory):
+        fields = card.split()
+        cmd = fields[0].lower()
+        if cmd == '.model':
+            m = re.match(r'\S+\s+(\S+)\s+([a-z]+)\s*\(?(.*?)\)?\s*$', card, re.I)
+            # non-numeric parameters (mfg=...) are kept as text
+            params = dict((k, parse_value(v) if _NUMBER.match(v) else v) for k, v in _PARAM.findall(m.group(3).lower()))
+            self.models[m.group(1).lower()] = (m.group(2).upper(), params)
+        elif cmd in ('.lib', '.include', '.inc'):
+            self.include(card.split(None, 1)[1].strip().strip('"'), directory)
+        elif cmd == '.temp':
+            self.temp = parse_value(fields[1])
+        elif cmd == '.ac':
+            self.ac = sweep_frequencies(*fields[1:5])
+        elif cmd == '.noise':
+            out = re.match(r'v\(\s*([^,)\s]+)\s*(?:,\s*([^)\s]+)\s*)?\)', fields[1], re.I)
+            self.noise = (out.group(1).lower(), (out.group(2) or '0').lower(), fields[2],
+                          sweep_frequencies(*fields[3:7]))
+        # .op, .backanno, .end etc. need nothing
+
+    def include(self, path, directory='.'):
+        """Read a library; absolute paths of another machine are looked up by name in directory."""
+        for p in (path, os.path.join(directory, path), os.path.join(directory, os.path.basename(path))):
+            if os.path.isfile(p):
+                with open(p) as fp:
+                    self.parse(fp.read(), os.path.dirname(p), title=False)
+                return
+        self.missing.append(path)
+
+    def _element(self, card):
+        fields = card.split()
+        name = fields[0]
+        kind = name[0].upper()
+        params = dict((k, v) for k, v in _PARAM.findall(card.lower()))
+        words = [w for w in fields[1:] if '=' not in w]
+        if kind in 'RCL':
+            e = Element(name, words[:2], parse_value(words[2]))
+            e.params['noiseless'] = 'noiseless' in (w.lower() for w in words[3:])
+        elif kind in 'VI':
+            e = Element(name, words[:2], 0.0)
+            rest = words[2:]
+            i = 0
+            while i < len(rest):
+                w = rest[i].lower()
+                if w == 'dc':
+                    e.value = parse_value(rest[i + 1])
+                    i += 2
+                elif w == 'ac':
+                    mag, phase = parse_value(rest[i + 1]), 0.0
+                    i += 2
+                    if i < len(rest) and _NUMBER.match(rest[i].lower()):
+                        phase = parse_value(rest[i])
+                        i += 1
+                    e.params['ac'] = mag*np.exp(1j*np.deg2rad(phase))
+                elif _NUMBER.match(w) and i == 0:
+                    e.value = parse_value(w)
+                    i += 1
+                else:
+                    # transient specifications (SINE, PULSE, ...) are ignored
+                    break
+        elif kind in 'EG':
+            e = Element(name, words[:4], parse_value(words[4]))
+        elif kind in 'FH':
+            e = Element(name, words[:2], parse_value(words[3]), {'control': words[2]})
+        elif kind == 'J':
+            e = Element(name, words[:3], None, {'model': words[3].lower()})
+            e.params['area'] = parse_value(words[4]) if len(words) > 4 and _NUMBER.match(words[4].lower()) else 1.0
+        else:
+            raise ValueError('unsupported element ' + card)
+        e.nodes = [n.lower() for n in e.nodes]
+        if 'temp' in params:
+            e.params['temp'] = parse_value(params['temp'])
+        self.elements.append(e)
+
+
+def read_netlist(path):
+    """Parse a netlist file, libraries are looked up next to it."""
+    with open(path) as fp:
+        text = fp.read()
+    return Netlist().parse(text, os.path.dirname(os.path.abspath(path)))
+
+
+class JFET(object):
+
+    """Temperature scaled JFET parameters and the large-signal model of an instance.
+
+    Shichman-Hodges drain current with channel length modulation, gate
+    junction diodes and depletion capacitances, temperature scaled as in
+    SPICE (Is by Eg and Xti, the junction potential by the band gap).
+    """
+
+    def __init__(self, element, model, temp):
+        kind, params = model
+        self.name = element.name
+        p = dict(JFET_DEFAULTS)
+        p.update(params)
+        area = element.params['area']
+        self.sign = -1.0 if kind == 'PJF' else 1.0
+        self.T = temp + 273.15
+        dT = temp - TNOM
+        self.vt = Q.kB*self.T/Q.qE
+        self.beta = p['beta']*area*np.power(1.01, p['betatce']*dT)
+        self.vto = p['vto'] + p['vtotc']*dT
+        self.lam = p['lambda']
+        tnom = TNOM + 273.15
+        ratio = self.T/tnom
+        self.Is = p['is']*area*np.exp((ratio - 1)*p['eg']/(p['n']*self.vt))*np.power(ratio, p['xti']/p['n'])
+        self.n = p['n']
+        self.m = p['m']
+        self.fc = p['fc']
+        self.kf = p['kf']
+        self.af = p['af']
+        self.rd = p['rd']/area
+        self.rs = p['rs']/area
+        self.pb, cjfact = self._gate_potential(p['pb'], tnom, self.T)
+        self.cgs = p['cgs']*area*cjfact
+        self.cgd = p['cgd']*area*cjfact
+
+    @staticmethod
+    def _gate_potential(pb, tnom, T):
+        """Junction potential at T and the capacitance factor (SPICE3 jfettemp)."""
+        def pbfact(t):
+            egfet = 1.16 - (7.02e-4*t*t)/(t + 1108)
+            arg = -egfet/(2*Q.kB*t) + 1.1150877/(Q.kB*2*REFTEMP)
+            return -2*Q.kB*t/Q.qE*(1.5*np.log(t/REFTEMP) + Q.qE*arg)
+        fact1 = tnom/REFTEMP
+        pbo = (pb - pbfact(tnom))/fact1
+        cjfact = 1/(1 + 0.5*(4e-4*(tnom - REFTEMP) - (pb - pbo)/pbo))
+        pb_T = T/REFTEMP*pbo + pbfact(T)
+        cjfact1 = 1 + 0.5*(4e-4*(T - REFTEMP) - (pb_T - pbo)/pbo)
+        return pb_T, cjfact*cjfact1
+
+    def junction(self, v):
+        """Gate diode current and conductance at the (polarity corrected) voltage v."""
+        nvt = self.n*self.vt
+        x = v/nvt
+        # linear continuation beyond exp(40) keeps Newton steps finite
+        e = np.exp(min(x, 40.0))
+        i = self.Is*(e*(1 + max(x - 40.0, 0.0)) - 1) + GMIN*v
+        return i, self.Is*e/nvt + GMIN
+
+    def channel(self, vgs, vds):
+        """Drain current and d/dvgs, d/dvds in normal mode (vds >= 0)."""
+        vgst = vgs - self.vto
+        if vgst <= 0:
+            return 0.0, 0.0, 0.0
+        clm = 1 + self.lam*vds
+        if vds >= vgst:
+            i = self.beta*vgst*vgst
+            return i*clm, 2*self.beta*vgst*clm, self.lam*i
+        i = self.beta*vds*(2*vgst - vds)
+        return i*clm, 2*self.beta*vds*clm, 2*self.beta*(vgst - vds)*clm + self.lam*i
+
+    def currents(self, vd, vg, vs):
+        """Terminal currents and conductances at node voltages vd, vg, vs.
+
+        Returns dict with the drain channel current 'ich' (into d, out of s),
+        its derivatives 'dd', 'dg', 'ds' with respect to vd, vg, vs, 'gm' of
+        the conducting mode, the gate-source and gate-drain junction currents
+        'igs', 'igd' and conductances 'ggs', 'ggd'.
+        """
+        s = self.sign
+        vgs, vgd, vds = s*(vg - vs), s*(vg - vd), s*(vd - vs)
+        if vds >= 0:
+            i, gm, gds = self.channel(vgs, vds)
+            dg, dd, ds = gm, gds, -gm - gds
+        else:
+            # inverse mode, drain and source swap roles
+            i, gm, gds = self.channel(vgd, -vds)
+            i = -i
+            dg, ds, dd = -gm, -gds, gm + gds
+        igs, ggs = self.junction(vgs)
+        igd, ggd = self.junction(vgd)
+        return {'ich': s*i, 'dd': dd, 'dg': dg, 'ds': ds, 'gm': gm,
+                'igs': s*igs, 'ggs': ggs, 'igd': s*igd, 'ggd': ggd}
+
+    def capacitance(self, v, c0):
+        """Depletion capacitance of a gate junction at (polarity corrected) voltage v."""
+        if v < self.fc*self.pb:
+            return c0/np.power(1 - v/self.pb, self.m)
+        return c0/np.power(1 - self.fc, 1 + self.m)*(1 - self.fc*(1 + self.m) + self.m*v/self.pb)
+
+
+class MNA(object):
+
+    """MNA equations of a netlist.
+
+    Unknowns are the node voltages (ground excluded) followed by the
+    branch currents of V, E, H and L elements. JFETs with Rd/Rs get the
+    internal nodes <name>#d, <name>#s.
+    """
+
+    def __init__(self, netlist):
+        self.netlist = netlist
+        self.jfets = {}
+        self.nodes = {}
+        self.branches = {}
+        for e in netlist.elements:
+            if e.kind == 'J':
+                if e.params['model'] not in netlist.models:
+                    raise KeyError('model ' + e.params['model'] + ' of ' + e.name + ' not found'
+                                   + (' (missing ' + ', '.join(netlist.missing) + ')' if netlist.missing else ''))
+                j = JFET(e, netlist.models[e.params['model']], e.params.get('temp', netlist.temp))
+                d, g, s = j.terminals = e.nodes
+                j.nodes = (e.name.lower() + '#d' if j.rd > 0 else d, g, e.name.lower() + '#s' if j.rs > 0 else s)
+                self.jfets[e.name] = j
+                for n in set(e.nodes) | set(j.nodes):
+                    self._node(n)
+            else:
+                for n in e.nodes:
+                    self._node(n)
+        n = len(self.nodes)
+        for e in netlist.elements:
+            if e.kind in 'VEHL':
+                self.branches[e.name.lower()] = n + len(self.branches)
+        self.size = n + len(self.branches)
+        self._linear = self._stamp_linear()
+
+    def _node(self, name):
+        if name not in ('0', 'gnd') and name not in self.nodes:
+            self.nodes[name] = len(self.nodes)
+
+    def index(self, node):
+        """Row of a node, None for ground."""
+        return self.nodes.get(node.lower())
+
+    def branch(self, name):
+        return self.branches[name.lower()]
+
+    @staticmethod
+    def _add(stamps, i, j, v):
+        if i is not None and j is not None:
+            stamps.append((i, j, v))
+
+    def _conductance(self, stamps, a, b, g):
+        self._add(stamps, a, a, g)
+        self._add(stamps, b, b, g)
+        self._add(stamps, a, b, -g)
+        self._add(stamps, b, a, -g)
+
+    def _transconductance(self, stamps, a, b, cp, cn, g):
+        """Current g*(V(cp) - V(cn)) from a through the element to b."""
+        self._add(stamps, a, cp, g)
+        self._add(stamps, a, cn, -g)
+        self._add(stamps, b, cp, -g)
+        self._add(stamps, b, cn, g)
+
+    def _stamp_linear(self):
+        """Triplets of the G and C matrices of the linear elements."""
+        G, C = [], []
+        for e in self.netlist.elements:
+            idx = [self.index(n) for n in e.nodes]
+            k = self.branches.get(e.name.lower())
+            if e.kind == 'R':
+                self._conductance(G, idx[0], idx[1], 1.0/e.value)
+            elif e.kind == 'C':
+                self._conductance(C, idx[0], idx[1], e.value)
+            elif e.kind in 'VELH':
+                self._add(G, idx[0], k, 1.0)
+                self._add(G, idx[1], k, -1.0)
+                self._add(G, k, idx[0], 1.0)
+                self._add(G, k, idx[1], -1.0)
+                if e.kind == 'E':
+                    self._add(G, k, idx[2], -e.value)
+                    self._add(G, k, idx[3], e.value)
+                elif e.kind == 'H':
+                    G.append((k, self.branch(e.params['control']), -e.value))
+                elif e.kind == 'L':
+                    C.append((k, k, -e.value))
+            elif e.kind == 'G':
+                self._transconductance(G, idx[0], idx[1], idx[2], idx[3], e.value)
+            elif e.kind == 'F':
+                c = self.branch(e.params['control'])
+                self._add(G, idx[0], c, e.value)
+                self._add(G, idx[1], c, -e.value)
+        return G, C
+
+    def _matrix(self, stamps):
+        m = np.zeros((self.size, self.size))
+        if stamps:
+            i, j, v = zip(*stamps)
+            np.add.at(m, (np.array(i), np.array(j)), np.array(v))
+        return m
+
+    def _rhs(self, key):
+        """Source vector, key 'dc' or 'ac'."""
+        b = np.zeros(self.size, dtype=complex if key == 'ac' else float)
+        for e in self.netlist.elements:
+            v = e.value if key == 'dc' else e.params.get('ac', 0.0)
+            if e.kind == 'V':
+                b[self.branch(e.name)] += v
+            elif e.kind == 'I':
+                a, c = [self.index(n) for n in e.nodes]
+                if a is not None:
+                    b[a] -= v
+                if c is not None:
+                    b[c] += v
+        return b
+
+    def _jfet_rows(self, j):
+        return [self.index(n) for n in j.nodes]
+
+    def _stamp_jfet(self, stamps, j, op):
+        """Small-signal conductances of a JFET at its operating point op."""
+        d, g, s = self._jfet_rows(j)
+        for col, dv in ((d, op['dd']), (g, op['dg']), (s, op['ds'])):
+            self._add(stamps, d, col, dv)
+            self._add(stamps, s, col, -dv)
+        self._conductance(stamps, g, s, op['ggs'])
+        self._conductance(stamps, g, d, op['ggd'])
+        outer = [self.index(n) for n in j.terminals]
+        if j.rd > 0:
+            self._conductance(stamps, outer[0], d, 1.0/j.rd)
+        if j.rs > 0:
+            self._conductance(stamps, outer[2], s, 1.0/j.rs)
+
+    def _voltages(self, x, nodes):
+        return [0.0 if self.index(n) is None else x[self.index(n)] for n in nodes]
+
+    def operating_point(self, max_iter=200, reltol=1e-9, abstol=1e-12):
+        """DC solution by Newton iteration.
+
+        Returns dict of 'V(node)', 'I(element)' of the branches and
+        'Id(J)', 'Ig(J)', 'Is(J)' (into the terminals) as in an LTspice .op,
+        the solution vector 'x' and the JFET operating points 'jfets'.
+        """
+        G_lin = self._matrix(self._linear[0])
+        b_lin = self._rhs('dc')
+        x = np.zeros(self.size)
+        for it in range(max_iter):
+            stamps = []
+            b = b_lin.copy()
+            for j in self.jfets.values():
+                op = j.currents(*self._voltages(x, j.nodes))
+                self._stamp_jfet(stamps, j, op)
+                d, g, s = self._jfet_rows(j)
+                vd, vg, vs = self._voltages(x, j.nodes)
+                # Newton companion: currents minus their linearization at x
+                ich = op['ich'] - op['dd']*vd - op['dg']*vg - op['ds']*vs
+                igs = op['igs'] - op['ggs']*(vg - vs)
+                igd = op['igd'] - op['ggd']*(vg - vd)
+                for row, i in ((d, -ich + igd), (s, ich + igs), (g, -igs - igd)):
+                    if row is not None:
+                        b[row] += i
+            x_new = np.linalg.solve(G_lin + self._matrix(stamps), b)
+            done = np.all(np.abs(x_new - x) <= reltol*np.maximum(np.abs(x_new), np.abs(x)) + abstol)
+            x = x_new
+            if done and it > 0:
+                break
+        else:
+            raise RuntimeError('operating point did not converge in {0:d} iterations'.format(max_iter))
+
+        res = {'x': x, 'jfets': {}}
+        for name, i in self.nodes.items():
+            if '#' not in name:
+                res['V(' + name + ')'] = x[i]
+        for e in self.netlist.elements:
+            if e.name.lower() in self.branches:
+                res['I(' + e.name + ')'] = x[self.branch(e.name)]
+            elif e.kind == 'R':
+                va, vb = self._voltages(x, e.nodes)
+                res['I(' + e.name + ')'] = (va - vb)/e.value
+        for name, j in self.jfets.items():
+            op = j.currents(*self._voltages(x, j.nodes))
+            res['jfets'][name] = op
+            res['Id(' + name + ')'] = op['ich'] - op['igd']
+            res['Ig(' + name + ')'] = op['igs'] + op['igd']
+            res['Is(' + name + ')'] = -op['ich'] - op['igs']
+        return res
+
+    def matrices(self, op=None):
+        """Small-signal G and C at the operating point (computed if None)."""
+        if op is None:
+            op = self.operating_point()
+        G, C = list(self._linear[0]), list(self._linear[1])
+        for name, j in self.jfets.items():
+            self._stamp_jfet(G, j, op['jfets'][name])
+            d, g, s = self._jfet_rows(j)
+            vd, vg, vs = self._voltages(op['x'], j.nodes)
+            self._conductance(C, g, s, j.capacitance(j.sign*(vg - vs), j.cgs))
+            self._conductance(C, g, d, j.capacitance(j.sign*(vg - vd), j.cgd))
+        return self._matrix(G), self._matrix(C)
+
+    def admittance(self, f, op=None):
+        """Stack Y(f) = G + j 2 pi f C of shape (F, n, n)."""
+        G, C = self.matrices(op)
+        w = 2*np.pi*np.asarray(f, dtype=float)
+        return G[None, :, :] + 1j*w[:, None, None]*C[None, :, :]
+
+    def ac(self, f=None, op=None):
+        """AC solution of the sources' AC values at f (default the .ac card).
+
+        Returns dict of 'V(node)' and 'I(element)' arrays over f.
+        """
+        f = self.netlist.ac if f is None else np.asarray(f, dtype=float)
+        Y = self.admittance(f, op)
+        b = np.broadcast_to(self._rhs('ac'), (len(f), self.size))
+        x = np.linalg.solve(Y, b[:, :, None])[:, :, 0]
+        res = {'frequency': f}
+        for name, i in self.nodes.items():
+            if '#' not in name:
+                res['V(' + name + ')'] = x[:, i]
+        for e in self.netlist.elements:
+            if e.name.lower() in self.branches:
+                res['I(' + e.name + ')'] = x[:, self.branch(e.name)]
+        return res
+
+    def noise_sources(self, op):
+        """List of (label, element, a, b, psd(f)) noise currents from node a to b in A^2/Hz."""
+        T_circuit = self.netlist.temp + 273.15
+        sources = []
+        for e in self.netlist.elements:
+            if e.kind == 'R' and not e.params['noiseless']:
+                T = e.params['temp'] + 273.15 if 'temp' in e.params else T_circuit
+                a, b = [self.index(n) for n in e.nodes]
+                sources.append((e.name.lower(), e.name, a, b, lambda f, g=4*Q.kB*T/e.value: g*np.ones(len(f))))
+        for name, j in self.jfets.items():
+            d, g, s = self._jfet_rows(j)
+            outer = [self.index(n) for n in j.terminals]
+            jop = op['jfets'][name]
+            kT = Q.kB*j.T
+            label = name.lower() + '.'
+            sources.append((label + 'rd', name, outer[0], d, lambda f, v=4*kT/j.rd if j.rd > 0 else 0.0: v*np.ones(len(f))))
+            sources.append((label + 'rs', name, outer[2], s, lambda f, v=4*kT/j.rs if j.rs > 0 else 0.0: v*np.ones(len(f))))
+            sources.append((label + 'sid', name, d, s, lambda f, v=8*kT*abs(jop['gm'])/3: v*np.ones(len(f))))
+            flicker = j.kf*np.power(abs(jop['ich']), j.af)
+            sources.append((label + 'fid', name, d, s, lambda f, v=flicker: v/f))
+        return sources
+
+    def noise(self, f=None, output=None, ref='0', source=None, op=None):
+        """Noise analysis, defaults from the .noise card.
+
+        output, ref: output nodes of V(output, ref)
+        source: name of the input V or I source, for the gain and V(inoise)
+        Returns dict (as the variables of an LTspice noise .raw) of
+        'frequency', 'gain' (|V(out)/input|), 'V(onoise)', 'V(inoise)' and
+        per element the output noise 'V(<element>)' and per JFET noise
+        source 'V(<jfet>.rd|rs|sid|fid)' in V/sqHz.
+        """
+        if self.netlist.noise is not None:
+            card_out, card_ref, card_src, card_f = self.netlist.noise
+            if output is None:
+                output, ref = card_out, card_ref
+            source = card_src if source is None else source
+            f = card_f if f is None else f
+        f = np.asarray(f, dtype=float)
+        if op is None:
+            op = self.operating_point()
+        Y = self.admittance(f, op)
+
+        # adjoint: z_k is the transfer from an injection at row k to the output
+        e_out = np.zeros(self.size)
+        for node, sign in ((output, 1.0), (ref, -1.0)):
+            if self.index(node) is not None:
+                e_out[self.index(node)] += sign
+        z = np.linalg.solve(np.swapaxes(Y, -1, -2), np.broadcast_to(e_out, (len(f), self.size))[:, :, None])[:, :, 0]
+
+        def transfer(a, b):
+            # current from a through the source to b, i.e. injected into b
+            za = 0 if a is None else z[:, a]
+            zb = 0 if b is None else z[:, b]
+            return zb - za
+
+        res = {'frequency': f}
+        onoise = np.zeros(len(f))
+        element_psd = {}
+        for label, element, a, b, psd in self.noise_sources(op):
+            out = np.square(np.abs(transfer(a, b)))*psd(f)
+            res['V(' + label + ')'] = np.sqrt(out)
+            element_psd[element] = element_psd.get(element, 0) + out
+            onoise += out
+        for element, out in element_psd.items():
+            if element in self.jfets:
+                res['V(' + element.lower() + ')'] = np.sqrt(out)
+        res['V(onoise)'] = np.sqrt(onoise)
+
+        if source is not None:
+            src = self.netlist.element(source)
+            if src.kind == 'V':
+                gain = z[:, self.branch(src.name)]
+            else:
+                gain = transfer(*[self.index(n) for n in src.nodes])
+            res['gain'] = np.abs(gain)
+            res['V(inoise)'] = res['V(onoise)']/res['gain']
+        return res
+
+
+def get_args():
+    parser = argparse.ArgumentParser('Operating point and noise of a SPICE netlist by modified nodal analysis.')
+    parser.add_argument('netlist', nargs='?', default='LTspice/hemt-noise-4K.net', help='SPICE netlist with a .noise card.')
+    parser.add_argument('--raw', default=None, help='LTspice noise .raw file to compare with.')
+    parser.add_argument('--op-raw', default=None, help='LTspice operating point .raw file to compare with.')
+    a = parser.parse_args()
+    print(a)
+    return a
+
+
+def compare(res, raw, names=None):
+    """Max relative difference of the variables in both res and the LTspice RawFile raw."""
+    out = {}
+    for name in raw.names() if names is None else names:
+        key = next((k for k in res if k.lower() == name.lower()), None)
+        if key is None or key == 'frequency':
+            continue
+        a = np.asarray(res[key], dtype=float)
+        b = np.asarray(raw[name], dtype=float)
+        scale = np.max(np.abs(b))
+        out[name] = float(np.max(np.abs(a - b))/scale) if scale > 0 else float(np.max(np.abs(a)))
+    return out
+
+
+def main(args):
+    import ltspice_raw
+
+    net = read_netlist(args.netlist)
+    if net.missing:
+        print('libraries not found: ' + ', '.join(net.missing))
+    mna = MNA(net)
+    op = mna.operating_point()
+    for k in sorted(k for k in op if '(' in k):
+        print('{0:12s} {1: .6e}'.format(k, op[k]))
+    if args.op_raw:
+        raw = ltspice_raw.read_raw(args.op_raw)
+        for name, err in sorted(compare(op, raw).items()):
+            print('op {0:12s} max rel diff to LTspice {1:.2e}'.format(name, err))
+
+    if net.noise is None:
+        return op
+    kwargs = {}
+    if args.raw:
+        raw = ltspice_raw.read_raw(args.raw)
+        kwargs['f'] = np.asarray(raw.axis, dtype=float)
+    res = mna.noise(op=op, **kwargs)
+    i = np.searchsorted(res['frequency'], [10, 1e3, 1e5])
+    i = i[i < len(res['frequency'])]
+    print('frequency ' + ' '.join('{0:10.3g}'.format(x) for x in res['frequency'][i]))
+    for k in ('gain', 'V(onoise)', 'V(inoise)'):
+        print('{0:9s} '.format(k) + ' '.join('{0:10.3e}'.format(x) for x in res[k][i]))
+    if args.raw:
+        for name, err in sorted(compare(res, raw).items()):
+            print('{0:12s} max rel diff to LTspice {1:.2e}'.format(name, err))
+    return res
+
+
+if __name__ == '__main__':
+
+    main(get_args())
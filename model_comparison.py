@@ -0,0 +1,121 @@
+"""Comparison of the noise model to measured spectra.
+
+The model is either interpolated in log-log space from a frequency grid
+or evaluated directly at the measured frequencies, in one vectorized
+pass. Residuals are summarized per frequency band.
+
+Example:
+    freq, data = spectrum_data.load_spectra(files, unique=True)
+    cmp = compare(freq, data, freq_model=model['f_arr'], model=model['en_total_output'])
+    cmp.band_rms, cmp.chi2
+"""
+
+import numpy as np
+
+
+def loglog_interp(x, xp, fp):
+    """Interpolate fp(xp) at x linearly in log|fp| vs log xp.
+
+    xp must be positive, fp is taken as abs value. Values outside the
+    range of xp are clamped to the end points, as np.interp does.
+    """
+    xp = np.asarray(xp, dtype=float)
+    fp = np.abs(np.asarray(fp))
+    if np.any(np.diff(xp) < 0):
+        order = np.argsort(xp, kind='stable')
+        xp = xp[order]
+        fp = fp[order]
+    return np.exp(np.interp(np.log(x), np.log(xp), np.log(fp)))
+
+
+def decade_bands(freq):
+    """Band edges at every decade covering freq."""
+    lo = np.floor(np.log10(np.min(freq)))
+    hi = np.ceil(np.log10(np.max(freq)))
+    if hi == lo:
+        hi = lo + 1
+    return np.power(10.0, np.arange(lo, hi + 1))
+
+
+class Comparison(object):
+
+    """Residuals of measured data with respect to the model.
+
+    freq, data, model: measured frequencies and noise, model at freq
+    residual: data - model
+    relative: (data - model)/model
+    in_range: points within the frequency range of the model grid
+    bands: band edges, band_rms: RMS of relative residuals per band,
+    band_count: points per band
+    chi2: sum of squared residuals over sigma (relative residuals if no
+    sigma was given), over the points in range
+    """
+
+    def __init__(self, freq, data, model, sigma=None, bands=None, in_range=None):
+        self.freq = freq
+        self.data = data
+        self.model = model
+        self.residual = data - model
+        self.relative = self.residual/model
+        self.in_range = np.ones(len(freq), dtype=bool) if in_range is None else in_range
+
+        sel = self.in_range
+        if sigma is None:
+            pull = self.relative[sel]
+        else:
+            pull = self.residual[sel]/np.broadcast_to(sigma, np.shape(freq))[sel]
+        self.ndf = int(np.count_nonzero(sel))
+        self.chi2 = float(np.sum(np.square(pull)))
+
+        self.bands = decade_bands(freq) if bands is None else np.asarray(bands, dtype=float)
+        idx = np.searchsorted(self.bands, freq[sel], side='right') - 1
+        ok = (idx >= 0) & (idx < len(self.bands) - 1)
+        nb = len(self.bands) - 1
+        self.band_count = np.bincount(idx[ok], minlength=nb)
+        sum2 = np.bincount(idx[ok], weights=np.square(self.relative[sel][ok]), minlength=nb)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.band_rms = np.sqrt(sum2/self.band_count)
+
+    @property
+    def reduced_chi2(self):
+        return self.chi2/max(self.ndf, 1)
+
+    @property
+    def rms(self):
+        """RMS of the relative residuals over the points in range."""
+        return float(np.sqrt(np.mean(np.square(self.relative[self.in_range]))))
+
+    def summary(self):
+        lines = ['points {0:d}, rms {1:.3g}, chi2/ndf {2:.4g}'.format(self.ndf, self.rms, self.reduced_chi2)]
+        for lo, hi, n, rms in zip(self.bands[:-1], self.bands[1:], self.band_count, self.band_rms):
+            if n:
+                lines.append('  {0:9.3g} - {1:9.3g} Hz: n={2:d} rms={3:.3g}'.format(lo, hi, n, rms))
+        return '\n'.join(lines)
+
+
+def compare(freq, data, freq_model=None, model=None, budget=None, key='en_total_output',
+            sigma=None, bands=None):
+    """Compare measured noise to the model.
+
+    Either give the model on a grid (freq_model, model), which is
+    interpolated in log-log space, or a noise_budget.NoiseBudget engine,
+    which is evaluated at the measured frequencies.
+
+    Arguments:
+    freq, data: measured frequencies and noise
+    key: output of the engine to compare to
+    sigma: absolute uncertainty of data (scalar or per point)
+    bands: band edges for the per-band RMS (default decades)
+    """
+    freq = np.asarray(freq, dtype=float)
+    data = np.asarray(data, dtype=float)
+    if budget is not None:
+        res = budget.evaluate(freq)
+        m = np.abs(getattr(res, key) if hasattr(res, key) else res.noise_sources[key])
+        in_range = None
+    elif freq_model is not None and model is not None:
+        m = loglog_interp(freq, freq_model, model)
+        in_range = (freq >= np.min(freq_model)) & (freq <= np.max(freq_model))
+    else:
+        raise ValueError('need either freq_model and model or a budget')
+    return Comparison(freq, data, m, sigma=sigma, bands=bands, in_range=in_range)
@@ -0,0 +1,263 @@
+"""Monte Carlo component-tolerance analysis of the noise budget.
+
+Draws are split into tasks with their own seed (spawned from one
+SeedSequence) so results do not depend on the number of processes.
+Per-frequency mean, variance and quantiles are accumulated in a
+streaming way and memory does not grow with the number of draws.
+
+Example:
+    tol = component_tolerances(noise_budget.make_circuits(), resistor=0.05, capacitor=0.10)
+    res = monte_carlo(tol, np.logspace(0,6,200), 1000000)
+    res.quantile(0.95, 'en_total_output')
+"""
+
+import multiprocessing
+from math import log
+import numpy as np
+import impedance as Q
+import noise_budget
+import sweep
+
+
+# networks whose resistors and capacitors are perturbed by default
+NETWORKS = ('Z1_MC', 'Z2', 'Z3', 'Z5', 'Z6')
+
+# relative tolerances of the HEMT and LT1677 parameters perturbed by default
+DEVICE = {'hemt.gm': 0.10, 'hemt.Cgs': 0.10, 'hemt.vflat': 0.20, 'opamp.vflat': 0.20}
+
+
+def component_tolerances(circuits, resistor=0.05, capacitor=0.10, networks=NETWORKS, device=DEVICE):
+    """Relative tolerance of every resistor and capacitor in the networks and of the devices.
+
+    Arguments:
+    resistor, capacitor: relative tolerance of all resistors, capacitors
+    networks: names of the circuits to perturb
+    device: dict of HEMT/LT1677 parameters to relative tolerance (default DEVICE),
+            None to perturb the networks only
+    """
+    tol = {}
+    for name in networks:
+        for attr, c in sorted(vars(circuits[name]).items()):
+            if isinstance(c, Q.Resistor):
+                tol[name + '.' + attr] = resistor
+            elif isinstance(c, Q.Capacitor):
+                tol[name + '.' + attr] = capacitor
+    if device:
+        tol.update(device)
+    return tol
+
+
+class RunningStats(object):
+
+    """Streaming per-frequency mean and variance (Welford, batched)."""
+
+    def __init__(self, nfreq):
+        self.n = 0
+        self.mean = np.zeros(nfreq)
+        self.m2 = np.zeros(nfreq)
+
+    def update(self, x):
+        """Add a batch x of shape (n, nfreq)."""
+        x = np.asarray(x, dtype=float)
+        mean = x.mean(axis=0)
+        m2 = np.sum(np.square(x - mean), axis=0)
+        self._combine(x.shape[0], mean, m2)
+
+    def merge(self, other):
+        self._combine(other.n, other.mean, other.m2)
+
+    def _combine(self, n, mean, m2):
+        if n == 0:
+            return
+        tot = self.n + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta*n/tot
+        self.m2 = self.m2 + m2 + np.square(delta)*self.n*n/tot
+        self.n = tot
+
+    @property
+    def var(self):
+        """Sample variance."""
+        return self.m2/max(self.n - 1, 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+
+class QuantileSketch(object):
+
+    """Streaming per-frequency quantiles with relative accuracy alpha.
+
+    Values are counted in logarithmic bins of width log(gamma), with
+    gamma = (1+alpha)/(1-alpha), so any quantile is returned within a
+    relative error alpha. Non-positive values are counted separately.
+    """
+
+    def __init__(self, nfreq, alpha=0.01):
+        self.nfreq = nfreq
+        self.alpha = alpha
+        self.gamma = (1 + alpha)/(1 - alpha)
+        self._lg = log(self.gamma)
+        self.offset = 0
+        self.counts = np.zeros((nfreq, 0), dtype=np.int64)
+        self.zeros = np.zeros(nfreq, dtype=np.int64)
+        self.n = 0
+
+    def _grow(self, lo, hi):
+        """Make room for bin indices lo..hi."""
+        if self.counts.shape[1] == 0:
+            self.offset = lo
+            self.counts = np.zeros((self.nfreq, hi - lo + 1), dtype=np.int64)
+            return
+        old_hi = self.offset + self.counts.shape[1] - 1
+        new_lo = min(lo, self.offset)
+        new_hi = max(hi, old_hi)
+        if new_lo == self.offset and new_hi == old_hi:
+            return
+        counts = np.zeros((self.nfreq, new_hi - new_lo + 1), dtype=np.int64)
+        start = self.offset - new_lo
+        counts[:, start:start + self.counts.shape[1]] = self.counts
+        self.counts = counts
+        self.offset = new_lo
+
+    def update(self, x):
+        """Add a batch x of shape (n, nfreq)."""
+        x = np.asarray(x, dtype=float)
+        self.n += x.shape[0]
+        pos = x > 0
+        self.zeros += np.sum(~pos, axis=0)
+        if not np.any(pos):
+            return
+        idx = np.ceil(np.log(np.where(pos, x, 1.0))/self._lg).astype(np.int64)
+        self._grow(idx[pos].min(), idx[pos].max())
+        nbins = self.counts.shape[1]
+        flat = np.arange(self.nfreq)*nbins + (idx - self.offset)
+        self.counts += np.bincount(flat[pos], minlength=self.nfreq*nbins).reshape(self.nfreq, nbins)
+
+    def merge(self, other):
+        self.n += other.n
+        self.zeros += other.zeros
+        if other.counts.shape[1] == 0:
+            return
+        self._grow(other.offset, other.offset + other.counts.shape[1] - 1)
+        start = other.offset - self.offset
+        self.counts[:, start:start + other.counts.shape[1]] += other.counts
+
+    def quantile(self, q):
+        """Quantile q (0..1) for each frequency."""
+        rank = q*(self.n - 1)
+        cum = np.cumsum(self.counts, axis=1) + self.zeros[:, np.newaxis]
+        i = np.argmax(cum > rank, axis=1)
+        val = 2*np.power(self.gamma, i + self.offset)/(self.gamma + 1)
+        return np.where(self.zeros > rank, 0.0, val)
+
+
+class MonteCarloResult(object):
+
+    """Streaming statistics of a Monte Carlo run for each tracked output."""
+
+    def __init__(self, f_arr, tolerances, stats, sketches):
+        self.f_arr = f_arr
+        self.tolerances = tolerances
+        self.stats = stats
+        self.sketches = sketches
+
+    @property
+    def n(self):
+        return next(iter(self.stats.values())).n
+
+    def mean(self, key='en_total_output'):
+        return self.stats[key].mean
+
+    def std(self, key='en_total_output'):
+        return self.stats[key].std
+
+    def quantile(self, q, key='en_total_output'):
+        return self.sketches[key].quantile(q)
+
+
+def _draw(rng, n, tol, distribution):
+    if distribution == 'uniform':
+        return 1 + tol*rng.uniform(-1.0, 1.0, size=(n, 1))
+    elif distribution == 'normal':
+        return 1 + tol*rng.standard_normal(size=(n, 1))
+    raise ValueError('unknown distribution ' + str(distribution))
+
+
+def _run_task(task):
+    """Evaluate one task of draws and return its statistics."""
+    (seed, n_draws, tolerances, circuits, f_arr, keys, distribution,
+     batch_size, alpha, kwargs) = task
+    rng = np.random.default_rng(seed)
+    nominal = {p: noise_budget.get_param(circuits, p) for p in tolerances}
+    plan = noise_budget.charge_circuit(circuits).compile()
+    stats = {k: RunningStats(len(f_arr)) for k in keys}
+    sketches = {k: QuantileSketch(len(f_arr), alpha) for k in keys}
+    try:
+        for start in range(0, n_draws, batch_size):
+            n = min(batch_size, n_draws - start)
+            for p, tol in tolerances.items():
+                noise_budget.set_param(circuits, p, nominal[p]*_draw(rng, n, tol, distribution))
+            budget = noise_budget.evaluate(f_arr, circuits, plan=plan, **kwargs)
+            for k in keys:
+                val = np.broadcast_to(np.abs(sweep.lookup(budget, k)), (n, len(f_arr)))
+                stats[k].update(val)
+                sketches[k].update(val)
+    finally:
+        for p in tolerances:
+            noise_budget.set_param(circuits, p, nominal[p])
+    return stats, sketches
+
+
+def monte_carlo(tolerances, f_arr, n_draws, circuits=None, keys=('en_total_output',),
+                distribution='uniform', seed=None, processes=None, task_size=10000,
+                batch_size=1000, alpha=0.01, T_4K=4.0, T_300K=300.0, closed_loop='Atotal_closed'):
+    """Monte Carlo of the noise budget over component tolerances.
+
+    Arguments:
+    tolerances: dict of parameter ('Z2.Rfb', 'hemt.gm', ...) to relative tolerance,
+                see component_tolerances
+    f_arr: frequencies
+    n_draws: number of draws
+    circuits: nominal circuits (default noise_budget.make_circuits(T_4K, T_300K))
+    keys: outputs to track (abs value), names of gains, noise sources or totals
+    distribution: 'uniform' (within +-tolerance) or 'normal' (tolerance is sigma)
+    seed: seed of the SeedSequence every task seed is spawned from
+    processes: size of the process pool (default cpu count, 1 runs serially)
+    task_size: draws per task, each task has its own seed
+    batch_size: draws evaluated at once within a task
+    alpha: relative accuracy of the quantiles
+    """
+    if circuits is None:
+        circuits = noise_budget.make_circuits(T_4K, T_300K)
+    f_arr = np.asarray(f_arr, dtype=float)
+    keys = list(keys)
+    kwargs = {'T_4K': T_4K, 'T_300K': T_300K, 'closed_loop': closed_loop}
+
+    sizes = [min(task_size, n_draws - s) for s in range(0, n_draws, task_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(s, n, tolerances, circuits, f_arr, keys, distribution, batch_size, alpha, kwargs)
+             for s, n in zip(seeds, sizes)]
+
+    stats = {k: RunningStats(len(f_arr)) for k in keys}
+    sketches = {k: QuantileSketch(len(f_arr), alpha) for k in keys}
+
+    if processes == 1 or len(tasks) <= 1:
+        results = map(_run_task, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap(_run_task, tasks)
+    try:
+        # merge in task order so the result is reproducible
+        for task_stats, task_sketches in results:
+            for k in keys:
+                stats[k].merge(task_stats[k])
+                sketches[k].merge(task_sketches[k])
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return MonteCarloResult(f_arr, tolerances, stats, sketches)
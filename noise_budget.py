@@ -0,0 +1,545 @@
+"""Noise budget of the HEMT charge readout chain.
+
+Gain and noise calculation shared by noise_model.py, sweeps and fits.
+"""
+
+import warnings
+import numpy as np
+import impedance as Q
+import profiling
+import source_registry
+
+
+# outputs that depend on the component values, kept by sweeps by default
+SWEEP_KEYS = ('Atotal_open', 'Atotal_closed', 'Atotal_closed_det', 'en_total_input', 'en_total_output')
+
+# relative error of a single precision evaluation above which a warning is given
+SINGLE_RTOL = 1e-4
+
+
+# stage each circuit sits on, its resistors are at the stage temperature
+STAGES = {'Z1_MC': 'MC', 'Z2': '4K', 'hemt': '4K', 'Z3': '300K', 'Z4': '300K', 'Z5': '300K', 'Z6': '300K'}
+
+# temperature (K) of the mixing chamber stage
+T_MC = 0.05
+
+
+def stage_temperatures(T_4K=4.0, T_300K=300.0, T_mc=T_MC):
+    """Dict of circuit name to the temperature of its stage (STAGES)."""
+    T = {'MC': T_mc, '4K': T_4K, '300K': T_300K}
+    return dict((name, T[stage]) for name, stage in STAGES.items())
+
+
+def make_circuits(T_4K=4.0, T_300K=300.0, T_mc=T_MC):
+    """Return dict of the circuits of the readout chain with nominal values.
+
+    The resistors are at the temperature of their stage, see stage_temperatures.
+    """
+    circuits = {}
+    circuits['Z1_MC'] = Q.Z1_MC('Z1_MC', Cdet=200e-12, Rbias=100e6, Rbleed=100e6, Cc=10e-9)
+    circuits['Z1_g'] = Q.Z1_g('Z1_g', Ccg=10e-9)
+    circuits['Z2'] = Q.Z2('Z2', Cfb=0.25e-12, Rfb=400e6)
+    circuits['Z3'] = Q.Z3('Z3')
+    circuits['Z4'] = Q.Z4('Z4')
+    circuits['Z5'] = Q.Z5('Z5')
+    circuits['Z6'] = Q.Z6('Z6')
+    circuits['opamp'] = Q.LT1677('opamp', flat=135.0, poles=(0.5, 80e3))
+    circuits['bjt'] = Q.BJT('bjt')
+    circuits['hemt'] = Q.HEMT('HEMT', Rg=1e12, Cgs=100e-12, gm=35, fc=1.2e3, vflat=0.24e-9)
+    for name, T in stage_temperatures(T_4K, T_300K, T_mc).items():
+        circuits[name].set_temperature(T)
+    return circuits
+
+
+def get_param(circuits, path):
+    """Value of a parameter given as 'circuit.attribute', e.g. 'Z2.Rfb'.
+
+    Component attributes resolve to the component value, others (like
+    'hemt.gm' in S) to the attribute itself.
+    """
+    obj, attr = _resolve(circuits, path)
+    a = getattr(obj, attr)
+    return a.value if isinstance(a, Q.Component) else a
+
+
+def set_param(circuits, path, value):
+    """Set a parameter given as 'circuit.attribute', see get_param."""
+    obj, attr = _resolve(circuits, path)
+    a = getattr(obj, attr)
+    if isinstance(a, Q.Component):
+        a.value = value
+    else:
+        setattr(obj, attr, value)
+
+
+def _resolve(circuits, path):
+    name, attr = path.split('.', 1)
+    obj = circuits[name]
+    while '.' in attr:
+        sub, attr = attr.split('.', 1)
+        obj = getattr(obj, sub)
+    if not hasattr(obj, attr):
+        raise AttributeError(path + ' is not a parameter of the readout chain')
+    return obj, attr
+
+
+def charge_circuit(circuits):
+    """Build the readout chain from a dict of circuits (see make_circuits).
+
+    Both the topology without detector (4K stage only) and with the MC
+    stage are defined on the same graph so that shared quantities like
+    Z_Z2, Z_HEMT and Atotal_open are computed once.
+    """
+
+    Z1_MC = circuits['Z1_MC']
+    Z1_g = circuits['Z1_g']
+    Z2 = circuits['Z2']
+    Z3 = circuits['Z3']
+    Z5 = circuits['Z5']
+    Z6 = circuits['Z6']
+    opamp = circuits['opamp']
+    bjt = circuits['bjt']
+    hemt = circuits['hemt']
+
+    chain = Q.ChargeCircuit('readout')
+    for c in circuits.values():
+        chain.addCircuit(c)
+
+    ## Calculate opamp gain
+    chain.begin_stage('opamp gain')
+    chain.define('Aopen_gary', Q.Response(opamp.Aopen_gary, flat=2e7, pole1=0.5, pole2=80e3))
+    Aopen = chain.define('Aopen', chain.node('Aopen_gary'))
+
+    # feedback fraction for opamp
+    # no damping as it's non-inverting
+    chain.begin_stage('feedback fraction')
+    Z_Z5 = chain.define('Z_Z5', Q.Impedance(Z5))
+    Z_Z6 = chain.define('Z_Z6', Q.Impedance(Z6))
+    B = chain.define('B', Q.Divider(Z_Z5, Z_Z6))
+
+    # closed loop gain
+    Aclosed = chain.define('Aclosed', Q.Feedback(Aopen, B))
+
+
+    ## voltage gain of HEMT
+    chain.begin_stage('HEMT gain')
+    # gain given by gm times load impedance
+
+    # load impedance
+    Z_Z3 = chain.define('Z_Z3', Q.Impedance(Z3))
+
+    # take into account any load impedance from current mirror in series 
+    Z_load = chain.define('Z_load', Q.Series(Z_Z3, Q.Impedance(bjt)))
+
+    # any impedance from mirror would split voltage gain at opamp input
+    Aopen_HEMT = chain.define('Aopen_HEMT', Q.Value(hemt, 'gm')*(Z_load*(Z_Z3/Z_load)))
+
+    ## total voltage gain
+
+    # total open loop gain is product of closed opamp gain and open HEMT gain
+    Atotal_open = chain.define('Atotal_open', Aclosed*Aopen_HEMT)
+
+    ## feedback for inverting amplifier
+    chain.begin_stage('input impedance')
+
+    # HEMT input impedance: input capacitance and input resistor are parallel to ground
+    Z_HEMT = chain.define('Z_HEMT', Q.Impedance(hemt))
+
+    # impedance of gate coupling capacitor to the HEMT gate input
+    Z_Z1_g = chain.define('Z_Z1_g', Q.Impedance(Z1_g))
+
+    # feedback impedance
+    Z_Z2 = chain.define('Z_Z2', Q.Impedance(Z2))
+
+    # The gate coupling capacitor is in series with an open connection
+    Ropen = Q.Resistor(1e19,'Ropen')
+    Z_Z1_open = chain.define('Z_Z1_open', Q.Series(Z_Z1_g, Q.Impedance(Ropen)))
+
+    ### Include circuitry at MC stage
+    chain.begin_stage('MC stage impedance')
+    # the MC stage contribution is connected in series with 4K stage through coupling capacitor
+    Z_Z1_MC = chain.define('Z_Z1_MC', Q.Impedance(Z1_MC))
+    Z_Z1_MC_g = chain.define('Z_Z1_MC_g', Q.Series(Z_Z1_g, Z_Z1_MC))
+
+    # same feedback network w/o (4K) and w/ (det) the MC stage
+    chain.begin_stage('closed loop gain')
+    for suffix, Z_in_name, Z_gate in (('', 'Z_input_4K', Z_Z1_open), ('_det', 'Z_input', Z_Z1_MC_g)):
+
+        # The feedback signal are split between the HEMT input and gate coupling capactor
+        Z_in = chain.define(Z_in_name, Q.Parallel(Z_HEMT, Z_gate))
+
+        # feedback fraction: H_fb
+        H_fb = chain.define('H_fb' + suffix, Q.Divider(Z_in, Z_Z2))
+
+        # input damping: H_in
+        H_in = chain.define('H_in' + suffix, -Q.Divider(Z_Z2, Z_in))
+
+        # total closed loop voltage gain
+        chain.define('Atotal_closed' + suffix, H_in*Q.Feedback(Atotal_open, H_fb))
+
+    # cross-check: total closed loop voltage gain w/o input damping term
+    chain.define('Atotal_closed_no_H_in', Q.Feedback(Atotal_open, chain.node('H_fb')))
+    chain.define('Atotal_closed_no_H_fb', chain.node('H_in')*Q.Feedback(Atotal_open, Q.Constant(1)))
+
+    return chain
+
+
+def _gain_stage(label):
+    return profiling.stage('gain.' + label)
+
+
+def _gain_stages():
+    """stage hook of CircuitPlan.evaluate: a profiling stage per group of gains, None if not profiling."""
+    return _gain_stage if profiling.enabled() else None
+
+
+def noise_sources(f_arr, gains, circuits, T_4K=4.0, T_300K=300.0, closed_loop='Atotal_closed', sources=None):
+    """Noise spectral densities in V/sqHz.
+
+    sources: source_registry.SourceRegistry (default the sources of the original model)
+
+    Returns (noise, sources): the raw noise densities of the circuits and
+    the noise sources referred to the HEMT gate input.
+    """
+    if sources is None:
+        sources = source_registry.default_sources()
+    ctx = source_registry.SourceContext(f_arr, gains, circuits, T_4K, T_300K, closed_loop)
+
+    noise = {}
+    referred = {}
+    for src in sources:
+        with profiling.stage('noise.' + src.name):
+            raw = src.density(ctx)
+            if src.noise_name is not None:
+                noise[src.noise_name] = raw
+            referred[src.name] = src.referred(ctx, raw)
+
+    return noise, referred
+
+
+def evaluate(f_arr, circuits=None, T_4K=4.0, T_300K=300.0, closed_loop='Atotal_closed', plan=None,
+             sources=None):
+    """Gains and noise of the readout chain at frequencies f_arr.
+
+    Component values may be arrays broadcasting against f_arr, e.g. of
+    shape (n, 1), to evaluate several design points at once.
+
+    Returns dict with 'gains', 'noise', 'noise_sources' (abs value,
+    referred to the HEMT input), 'en_total_input', 'en_total_output' and
+    'quadrature' (source_registry.QuadratureSum of the sources).
+    """
+    if circuits is None:
+        circuits = make_circuits(T_4K, T_300K)
+    if plan is None:
+        plan = charge_circuit(circuits).compile()
+
+    gains = plan.evaluate(f_arr, stage=_gain_stages())
+    noise, sources = noise_sources(f_arr, gains, circuits, T_4K, T_300K, closed_loop, sources)
+
+    # add up noise contributions in quadrature
+    with profiling.stage('summation'):
+        quadrature = source_registry.QuadratureSum()
+        for src in sources:
+            sources[src] = np.abs(sources[src])
+            quadrature.set(src, sources[src])
+        en_total_input = quadrature.total()
+        en_total_output = np.abs(en_total_input*gains[closed_loop])
+
+    return {'gains': gains, 'noise': noise, 'noise_sources': sources,
+            'en_total_input': en_total_input, 'en_total_output': en_total_output,
+            'quadrature': quadrature}
+
+
+class NoiseBudgetConfig(object):
+
+    """Configuration of a noise budget evaluation."""
+
+    def __init__(self, f_arr=None, fmin=1.0, fmax=1e6, num=20, T_4K=4.0, T_300K=300.0,
+                 drainI=0.001, closed_loop='Atotal_closed', circuits=None, params=None, sources=None,
+                 precision='double', check_points=32):
+        """ Arguments:
+        f_arr: frequencies, default num log spaced points from fmin to fmax
+        T_4K: temperature at the 4K stage
+        T_300K: temperature for nominal room temperature circuits
+        drainI: HEMT drain current
+        closed_loop: gain used to refer noise to the output,
+                     'Atotal_closed' (w/o detector) or 'Atotal_closed_det' (with detector)
+        circuits: circuits of the readout chain (default make_circuits(T_4K, T_300K))
+        params: dict of component values to override, e.g. {'Z2.Rfb': 1e9}
+        sources: source_registry.SourceRegistry of the noise sources (default the original ones)
+        precision: 'double', or 'single' to evaluate in complex64/float32 keeping only
+                   the gains the noise sources need (see NoiseBudget)
+        check_points: number of frequencies of the float64 spot-check of 'single'
+        """
+        if precision not in ('double', 'single'):
+            raise ValueError('precision must be double or single, not ' + str(precision))
+        self.fmin = fmin
+        self.fmax = fmax
+        self.num = int(num)
+        self.f_arr = f_arr
+        self.T_4K = T_4K
+        self.T_300K = T_300K
+        self.drainI = drainI
+        self.closed_loop = closed_loop
+        self.circuits = make_circuits(T_4K, T_300K) if circuits is None else circuits
+        for path, value in (params or {}).items():
+            set_param(self.circuits, path, value)
+        self.sources = source_registry.default_sources() if sources is None else sources
+        self.precision = precision
+        self.check_points = check_points
+
+    @property
+    def f_arr(self):
+        # the default grid is only made when used, streaming.stream_budget never makes it
+        if self._f_arr is None:
+            self._f_arr = np.logspace(np.log10(self.fmin), np.log10(self.fmax), num=self.num)
+        return self._f_arr
+
+    @f_arr.setter
+    def f_arr(self, f_arr):
+        self._f_arr = None if f_arr is None else np.asarray(f_arr, dtype=float)
+
+
+class NoiseBudgetResult(object):
+
+    """Gains and noise of the readout chain.
+
+    gains: dict of impedances, feedback fractions and gains (complex)
+    noise: dict of raw noise densities of the circuits
+    noise_sources: dict of noise sources referred to the HEMT input (abs value)
+    en_total_input, en_total_output: total noise in V/sqHz
+    quadrature: source_registry.QuadratureSum of the noise sources
+    precision_error: in single precision, dict of the max relative error of
+                     the totals and sources against the float64 spot-check
+    """
+
+    def __init__(self, f_arr, gains, noise, noise_sources, en_total_input, en_total_output,
+                 quadrature=None, precision_error=None):
+        self.f_arr = f_arr
+        self.gains = gains
+        self.noise = noise
+        self.noise_sources = noise_sources
+        self.en_total_input = en_total_input
+        self.en_total_output = en_total_output
+        self.quadrature = quadrature
+        self.precision_error = precision_error
+
+    def to_dict(self):
+        """Frequencies, noise sources and totals as saved by noise_model.py."""
+        d = {'f_arr': self.f_arr}
+        d.update(self.noise_sources)
+        d['en_total_input'] = self.en_total_input
+        d['en_total_output'] = self.en_total_output
+        return d
+
+
+class _Cache(object):
+
+    """Intermediate results of the last NoiseBudget evaluation.
+
+    values: values of the plan steps at f_arr
+    sources_key: temperatures, closed loop gain and registry the noise
+    sources were computed with; reads: per source the gains and circuits
+    it read.
+    """
+
+    def __init__(self, f_arr):
+        self.f_arr = f_arr
+        self.values = None
+        self.reset_sources(None)
+
+    def reset_sources(self, key):
+        self.sources_key = key
+        self.noise = {}
+        self.sources = {}
+        self.reads = {}
+        self.quadrature = source_registry.QuadratureSum()
+
+
+def _same_freq(a, b):
+    return a is b or (np.shape(a) == np.shape(b) and np.array_equal(a, b))
+
+
+class NoiseBudget(object):
+
+    """Noise budget engine without plotting or I/O.
+
+    Intermediate arrays of the last evaluation are cached. After set()
+    only the quantities depending on the changed parameter (and the noise
+    sources reading them) are recomputed at the same frequencies. Call
+    invalidate() after changing the circuits other than with set(). With
+    cache=False nothing is kept between evaluations (saves memory on
+    large one-off grids).
+
+    With config.precision 'single' the chain is evaluated in
+    complex64/float32 with CircuitPlan.evaluate_lean, keeping only the
+    gains the noise sources read (found by a float64 evaluation at
+    check_points of the frequencies, which also gives the error estimate
+    precision_error of the result). Nothing is cached in this mode.
+
+    Example:
+        nb = NoiseBudget(NoiseBudgetConfig(num=1000, params={'Z2.Rfb': 1e9}))
+        res = nb.evaluate()
+        res.en_total_output
+        nb.set('Z2.Rfb', 2e9)
+        nb.evaluate()      # recomputes Z_Z2, H_fb, H_in, closed loop gains and en_Z2
+    """
+
+    def __init__(self, config=None, cache=True):
+        self.config = NoiseBudgetConfig() if config is None else config
+        self.plan = charge_circuit(self.config.circuits).compile()
+        self.cache = cache
+        self.invalidate()
+
+    @property
+    def circuits(self):
+        return self.config.circuits
+
+    def get(self, path):
+        return get_param(self.circuits, path)
+
+    def set(self, path, value):
+        set_param(self.circuits, path, value)
+        self._dirty.add(path)
+
+    def set_temperature(self, name, T):
+        """Set the temperature of all resistors of circuit name, e.g. a sweep axis of shape (n, 1)."""
+        for attr in self.circuits[name].resistors():
+            self.set(name + '.' + attr + '.T', T)
+
+    def invalidate(self):
+        """Drop the cached intermediate results."""
+        self._cache = None
+        self._dirty = set()
+
+    def evaluate(self, f_arr=None):
+        """Return NoiseBudgetResult at f_arr (default config frequencies)."""
+        c = self.config
+        if f_arr is None:
+            f_arr = c.f_arr
+        if c.precision == 'single':
+            return self._evaluate_single(f_arr)
+
+        # the cache is only kept if the evaluation completes
+        cache, self._cache = self._cache, None
+        dirty, self._dirty = self._dirty, set()
+        if cache is None or not _same_freq(cache.f_arr, f_arr):
+            cache = _Cache(f_arr)
+        dirty_steps = set()
+        dirty_circuits = set()
+        for path in dirty:
+            obj, attr = _resolve(c.circuits, path)
+            dirty_steps.update(self.plan.depending_on(obj, attr))
+            dirty_circuits.add(path.split('.', 1)[0])
+
+        cache.values, changed = self.plan.evaluate_steps(f_arr, cache.values, dirty_steps, _gain_stages())
+        gains = self.plan.output_values(cache.values)
+        changed = set(changed)
+        changed_gains = set(n for n, i in self.plan.outputs.items() if i in changed)
+
+        key = (c.T_4K, c.T_300K, c.closed_loop, tuple((s.name, id(s)) for s in c.sources))
+        if cache.sources_key != key:
+            cache.reset_sources(key)
+        for src in c.sources:
+            reads = cache.reads.get(src.name)
+            if reads is not None and not (reads[0] & changed_gains) and not (reads[1] & dirty_circuits):
+                continue
+            with profiling.stage('noise.' + src.name):
+                ctx = source_registry.SourceContext(f_arr, source_registry.TrackedMapping(gains),
+                                                    source_registry.TrackedMapping(c.circuits),
+                                                    c.T_4K, c.T_300K, c.closed_loop)
+                raw = src.density(ctx)
+                if src.noise_name is not None:
+                    cache.noise[src.noise_name] = raw
+                value = np.abs(src.referred(ctx, raw))
+            cache.reads[src.name] = (ctx.gains.read, ctx.circuits.read)
+            cache.sources[src.name] = value
+            cache.quadrature.set(src.name, value)
+
+        with profiling.stage('summation'):
+            en_total_input = cache.quadrature.total()
+            en_total_output = np.abs(en_total_input*gains[c.closed_loop])
+
+        if self.cache:
+            self._cache = cache
+        return NoiseBudgetResult(f_arr, gains, dict(cache.noise), dict(cache.sources),
+                                 en_total_input, en_total_output, cache.quadrature.copy())
+
+    def _evaluate_single(self, f_arr):
+        c = self.config
+        f_arr = np.asarray(f_arr, dtype=float)
+        idx = np.unique(np.linspace(0, len(f_arr) - 1, min(len(f_arr), c.check_points)).astype(int))
+
+        # float64 spot-check, also records the gains the sources read
+        with profiling.stage('spot-check', num=len(idx)):
+            gains = source_registry.TrackedMapping(self.plan.evaluate(f_arr[idx], stage=_gain_stages()))
+            ref = evaluate(f_arr[idx], c.circuits, c.T_4K, c.T_300K, c.closed_loop, plan=self.plan,
+                           sources=c.sources)
+            noise_sources(f_arr[idx], gains, c.circuits, c.T_4K, c.T_300K, c.closed_loop, c.sources)
+        keep = (gains.read | set([c.closed_loop]) | set(SWEEP_KEYS)) & set(self.plan.outputs)
+
+        with profiling.stage('lean gains', num=len(f_arr)):
+            gains = self.plan.evaluate_lean(f_arr, keep, dtype=np.complex64)
+        f32 = f_arr.astype(np.float32)
+        noise, sources = noise_sources(f32, gains, c.circuits, c.T_4K, c.T_300K, c.closed_loop, c.sources)
+        with profiling.stage('summation'):
+            quadrature = source_registry.QuadratureSum()
+            for name in sources:
+                sources[name] = np.abs(sources[name])
+                quadrature.set(name, sources[name])
+            en_total_input = quadrature.total()
+            en_total_output = np.abs(en_total_input*gains[c.closed_loop])
+
+        def rel_error(value, reference):
+            value = np.broadcast_to(value, np.broadcast_shapes(np.shape(value), f_arr.shape))[..., idx]
+            return float(np.max(np.abs(value - reference)/np.maximum(np.abs(reference), np.finfo(float).tiny)))
+
+        errors = {'en_total_input': rel_error(en_total_input, ref['en_total_input']),
+                  'en_total_output': rel_error(en_total_output, ref['en_total_output'])}
+        for name, value in sources.items():
+            errors[name] = rel_error(value, ref['noise_sources'][name])
+        worst = max(errors, key=errors.get)
+        if errors[worst] > SINGLE_RTOL:
+            warnings.warn('single precision error of {0:s} is {1:.1e} (> {2:.0e})'.format(
+                worst, errors[worst], SINGLE_RTOL), RuntimeWarning)
+        return NoiseBudgetResult(f_arr, gains, noise, sources, en_total_input, en_total_output,
+                                 quadrature, errors)
+
+    @property
+    def sources(self):
+        return self.config.sources
+
+    def add_source(self, source, result=None, replace=False):
+        """Register a noise source and, if given, add it to result in O(N)."""
+        self.sources.add(source, replace)
+        if result is not None:
+            self.update_source(result, source.name)
+        return source
+
+    def remove_source(self, name, result=None):
+        """Unregister a noise source and, if given, take it out of result."""
+        self.sources.remove(name)
+        if result is not None:
+            del result.noise_sources[name]
+            result.quadrature.remove(name)
+            self._update_totals(result)
+
+    def update_source(self, result, name):
+        """Recompute one noise source of result (e.g. after changing its
+        parameters) and update the totals without the other sources."""
+        c = self.config
+        src = self.sources[name]
+        ctx = source_registry.SourceContext(result.f_arr, result.gains, c.circuits, c.T_4K, c.T_300K,
+                                            c.closed_loop)
+        raw = src.density(ctx)
+        if src.noise_name is not None:
+            result.noise[src.noise_name] = raw
+        value = np.abs(src.referred(ctx, raw))
+        result.noise_sources[name] = value
+        result.quadrature.set(name, value)
+        self._update_totals(result)
+        return value
+
+    def _update_totals(self, result):
+        result.en_total_input = result.quadrature.total()
+        result.en_total_output = np.abs(result.en_total_input*result.gains[self.config.closed_loop])
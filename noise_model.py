@@ -4,9 +4,9 @@ import sys
 import argparse
 import cmath
 import numpy as np
-import matplotlib.pyplot as plt
 import impedance as Q
-import plot_util
+import noise_budget
+import profiling
 
 # setup Latex and font
 #rc('font',**{'family':'sans-serif','sans-serif':['Helvetica']})
@@ -21,10 +21,20 @@ def get_args():
     parser.add_argument('--debug',action='store_true',help='debug toggle')
     parser.add_argument('--show',action='store_true',help='Make and show plots.')
     parser.add_argument('--logy',action='store_true',help='Log y axis.')
-    parser.add_argument('--drainI', default=0.001, help='Drain current.')
-    parser.add_argument('--T_4K', default=4.0, help='Temperature at the 4K stage.')
-    parser.add_argument('--T_300K', default=300.0, help='Temperature for nominal room temperature circuits.')
-    parser.add_argument('--num', default=20, help='Number of points to calculate wihtin the bandwidth.')
+    parser.add_argument('--drainI', default=0.001, type=float, help='Drain current.')
+    parser.add_argument('--T_4K', default=4.0, type=float, help='Temperature at the 4K stage.')
+    parser.add_argument('--T_300K', default=300.0, type=float, help='Temperature for nominal room temperature circuits.')
+    parser.add_argument('--num', default=20, type=int, help='Number of points to calculate wihtin the bandwidth.')
+    parser.add_argument('--adaptive',action='store_true',help='Refine the frequency grid around poles, knees and resonances.')
+    parser.add_argument('--tol', default=0.01, type=float, help='Relative tolerance of the adaptive grid.')
+    parser.add_argument('--jobs', default=None, type=int, help='Number of processes rendering plots (default cpu count).')
+    parser.add_argument('--report', default=None, type=str, help='Write all plots to this multi-page PDF instead of image files.')
+    parser.add_argument('--uncompressed',action='store_true',help='Save the result uncompressed so it can be memory-mapped.')
+    parser.add_argument('--savegains',action='store_true',help='Also save the gains to the result file.')
+    parser.add_argument('--single',action='store_true',help='Evaluate in single precision keeping only the needed gains (less memory), checked against double precision.')
+    parser.add_argument('--chunk', default=None, type=int, help='Evaluate this many frequencies at a time and write them to --savename as they are done (grids too large for memory).')
+    parser.add_argument('--profile', default=None, type=str, help='Print per-stage timing and memory and save the records as JSON to this file.')
+    parser.add_argument('--trace', default=None, type=str, help='Save per-stage timing and memory as a Chrome trace to this file.')
     a = parser.parse_args()
     print(a)
     return a
@@ -33,396 +43,179 @@ def get_args():
 
 
 
-def main():
+def main(args):
+    """Evaluate the noise budget for the command line arguments."""
 
-    plot_util.setup_plt()
-    #plt.rcParams['axes.grid'] = True
+    if args.single and args.makeplots:
+        raise ValueError('the diagnostic plots need all gains, which --single does not keep')
+    if args.chunk and (args.makeplots or args.show or args.adaptive):
+        raise ValueError('--chunk does not keep the result in memory for plots or --adaptive')
+    if args.chunk and not args.savename:
+        raise ValueError('--chunk writes the result to --savename, give a file name')
+    if args.adaptive and args.num < 2:
+        raise ValueError('--adaptive refines a grid of at least 2 points, --num is {0:d}'.format(args.num))
 
-    # prepare output
-    outfile_dict = {}
-    
-    # freqency vector
-    f_arr = np.logspace(0,6, num=args.num)
-    outfile_dict['f_arr'] = f_arr
+    config = noise_budget.NoiseBudgetConfig(num=args.num, T_4K=args.T_4K, T_300K=args.T_300K,
+                                            drainI=args.drainI, precision='single' if args.single else 'double')
 
-    # setup components of the circuits
-    Z1_MC = Q.Z1_MC('Z1_MC', Cdet=200e-12, Rbias=100e6, Rbleed=100e6, Cc=10e-9)
-    Z1_g = Q.Z1_g('Z1_g', Ccg=10e-9)
-    Z2 = Q.Z2('Z2', Cfb=0.25e-12, Rfb=400e6)
-    Z3 = Q.Z3('Z3')
-    Z4 = Q.Z4('Z4')
-    Z5 = Q.Z5('Z5')
-    Z6 = Q.Z6('Z6')
-    opamp = Q.LT1677('opamp', flat=135.0, poles=(0.5, 80e3))
-    bjt = Q.BJT('bjt')
-    hemt = Q.HEMT('HEMT', Rg=1e12, Cgs=100e-12, gm=35)
-    
+    if args.profile or args.trace:
+        profiling.enable()
 
+    with profiling.stage('compile'):
+        # one-off evaluation, no intermediate results are kept for re-evaluation
+        budget = noise_budget.NoiseBudget(config, cache=False)
 
+    if args.adaptive:
+        import adaptive_grid
+        with profiling.stage('adaptive grid'):
+            config.f_arr = adaptive_grid.budget_grid(budget, config.fmin, config.fmax, num=args.num, tol=args.tol)
+        print('adaptive grid with {0:d} points'.format(len(config.f_arr)))
 
-    
     print('--Impedance and gain calculation --')
-
-   
-    ## Calculate opamp gain
-    Aopen = Q.to_np_array(opamp.Aopen, f_arr)
-    Aopen_gary = np.array([opamp.Aopen_gary(a,flat=2e7,pole1=0.5, pole2=80e3) for a in f_arr])
-    Aopen = Aopen_gary
-
-    #print("Aopen")
-    #print(Aopen)
-    #print(Aopen_gary)
-    
-    # feedback fraction for opamp
-    # no damping as it's non-inverting
-    Z_Z5 = Q.to_np_array(Z5.Z_tot,f_arr)
-    Z_Z6 = Q.to_np_array(Z6.Z_tot,f_arr)
-    B = Z_Z5/(Z_Z5 +Z_Z6)
-
-    # closed loop gain
-    Aclosed = Aopen/(1 + Aopen*B)
-
-
-    ## voltage gain of HEMT
-    # gain given by gm times load impedance
-
-    # load impedance
-    Z_Z3 = Q.to_np_array(Z3.Z_tot, f_arr)
-
-    # take into account any load impedance from current mirror in series 
-    Z_BJT = Q.to_np_array(bjt.Z_tot, f_arr)
-    Z_load = Z_Z3 + Z_BJT
-    
-    # any impedance from mirror would split voltage gain at opamp input
-    Aopen_HEMT = hemt.gm*Z_load*(Z_Z3/Z_load)
-
-    ## total voltage gain
-
-    # total open loop gain is product of closed opamp gain and open HEMT gain
-    Atotal_open = Aclosed*Aopen_HEMT
-
-    ## feedback for inverting amplifier
-
-    # HEMT input impedance: input capacitance and input resistor are parallel to ground
-    Z_HEMT = Q.to_np_array(hemt.Z_tot, f_arr) 
-
-
-    # impedance of gate coupling capacitor to the HEMT gate input
-    Z_Z1_g = Q.to_np_array(Z1_g.Z_tot, f_arr) 
-
-    # The gate coupling capacitor is in series with an open connection
-    Ropen = Q.Resistor(1e19,'Ropen')
-    Z_Z1_open = Q.series(Z_Z1_g, Ropen.Z(f_arr))
-
-    # The feedback signal are split between the HEMT input and gate coupling capactor
-    Z_input_4K = Q.parallel(Z_HEMT, Z_Z1_open)
-
-    # feedback impedance
-    Z_Z2 = Q.to_np_array(Z2.Z_tot, f_arr) 
-
-    # feedback fraction: H_fb
-    H_fb = Z_input_4K/(Z_input_4K + Z_Z2)
-
-    # input damping: H_in
-    H_in = -1*Z_Z2/(Z_input_4K + Z_Z2)
-
-    # total closed loop voltage gain
-    #Atotal_closed = np.abs(H_in*Atotal_open/(1+Atotal_open*H_fb))
-    Atotal_closed = H_in*Atotal_open/(1+Atotal_open*H_fb)
-
-    # cross-check: total closed loop voltage gain w/o input damping term
-    Atotal_closed_no_H_in = Atotal_open/(1+Atotal_open*H_fb)
-    Atotal_closed_no_H_fb = H_in*Atotal_open/(1+Atotal_open)
-
-    
-    ### Include circuitry at MC stage
-
-    #calculate impedance contribution from  circuitry at the MC stage
-    Z_Z1_MC = Q.to_np_array(Z1_MC.Z_tot,f_arr)
-
-    
-    # the MC stage contribution is connected in series with 4K stage through coupling capacitor
-    Z_Z1_MC_g = Q.series(Z_Z1_g, Z_Z1_MC)
-
-    # The feedback signal are split between the HEMT input and gate coupling capactor
-    Z_input = Q.parallel(Z_HEMT, Z_Z1_MC_g)
-
-    # feedback fraction
-    H_fb_det = Z_input/(Z_input + Z_Z2)
-
-    # input damping
-    H_in_det = -1*Z_Z2/(Z_input + Z_Z2)
-
-    # total closed loop voltage gain
-    Atotal_closed_det = H_in_det*Atotal_open/(1+Atotal_open*H_fb_det)
-
-    
-    
-    
-    
     print('--Noise calculation --')
-
-
-    # decide what closed loop gain to use
-
-    # w/o detector:
-    closed_loop_gain = Atotal_closed
-    # with detector:
-    #closed_loop_gain = Atotal_closed_det
-
-
-    # dict to keep track of all noise sources
-    noise_sources = {}
-
-    
-    # noise from feedback Circuit
-    en_Z2 = np.sqrt(4*args.T_4K*Q.kB*Z_Z2.real)
-    
-    
-    en_Z2_input = en_Z2/closed_loop_gain
-    
-
-    noise_sources['en_Z2'] = en_Z2_input
-    
-    # noise from HEMT
-    en_HEMT_input = hemt.voltageNoise(f_arr, fc=1.2e3, vflat=0.24e-9)
-
-
-    noise_sources['en_HEMT'] = en_HEMT_input
-
-    # noise from Z3
-    en_Z3 = np.sqrt(4*args.T_300K*Q.kB*Z_Z3.real)
-
-    # refer voltage noise from Z3 to the input of the HEMT gate
-    # BJT is 
-    en_Z3_input = en_Z3/Aopen_HEMT
-    
-    noise_sources['en_Z3'] = en_Z3_input
-
-    # noise from BJT
-    #in_BJT = np.ones(len(f_arr))*bjt.currentNoise(args.drainI)
-    in_BJT = 1e-19*np.ones(len(f_arr))
-
-    # voltage noise from BJT as referred to the input of HEMT (scale by gm)
-    en_BJT_input = in_BJT/hemt.gm
-
-
-    noise_sources['en_BJT-fix'] = en_BJT_input
-
-    # noise from opamp
-    en_opamp = opamp.voltage_noise(f_arr)
-    #en_opamp_gary = opamp.voltage_noise_gary(f_arr)
-        
-    # noise from opamp referred to HEMT gate input
-    # divide by HEMT open loop gain 
-    en_opamp_input = en_opamp/Aopen_HEMT
-    # plot some info I inherited from Tsuguo, Dave and/or Gary
-    en_opamp_gary_input = en_opamp_input/Aopen_HEMT
-
-    noise_sources['en_opamp'] = en_opamp_input
-
-
-
-
-
-    
-    # Calculate sum of noise contributions
-    
-    fig_input_noise, ax1 = plt.subplots(figsize=(18,12))
-
-
-    # loop over all noise sources and add up
-    en_total_input = None    
-    for src, val in noise_sources.items():
-        # take abs value
-        val = np.abs(val)
-        #print("src " + src + " val " + str(val))
-        if en_total_input is None:
-            en_total_input = np.power(val,2)
-        else:
-            en_total_input += np.power(val,2)
-
-        # plot noise sources
-        if args.makeplots:
-            plot_util.noise_plot(f_arr, val, legend=src, fig_ax=(fig_input_noise,(ax1,)))
-
-        # add to output file as well
-        outfile_dict[src] = val
-    
-
-    # take the square root of the total noise
-    en_total_input = np.sqrt(np.abs(en_total_input))
-    #print("en_total_input ")
-    #print(en_total_input)
-    #print ("closed_loop_gain")
-    #print(closed_loop_gain)
-    en_total_output = np.abs(en_total_input*closed_loop_gain)
-
-    #print(en_total_output)
-
-    # add total to output file
-    outfile_dict['en_total_input'] = en_total_input
-    outfile_dict['en_total_output'] = en_total_output
-
-    
-    # plot total noise
-    if args.makeplots:
-        plot_util.noise_plot(f_arr, en_total_input, legend='en_total', 
-                             name='en_total_input', ylabel=r'$V/\sqrt{Hz}$', 
-                             note=r'Total voltage noise (input)',
-                             fig_ax=(fig_input_noise,(ax1,)))
-        
-        plot_util.noise_plot(f_arr, en_total_output, legend='en_total_output', name='en_total_output', ylabel=r'$V/\sqrt{Hz}$', note=r'Total voltage noise (output)')
-    
-    plt.show()
-    a = input("what")
-    #print("f_arr")
-    #print(f_arr)
-    #print("en_total_output")
-    #print(en_total_output)
-
-
-
-
-
-    # make plots
-
-    if args.makeplots:
-        print("Make impedance plots")
-
-        plot_util.impedance_plot(f_arr, Z_Z5, 'Z_Z5.png', note='Z5')
-        
-        plot_util.impedance_plot(f_arr, Z_Z6, 'Z_Z6.png', note=r'Z6')
-        
-        plot_util.impedance_plot(f_arr, B, 'B.png',ylabel='Feedback fraction B',note='Feedback fraction B')
-        
-        plot_util.impedance_plot(f_arr, Aopen, 'Aopen_opamp.png', ylabel='Aopen opamp', note='Aopen opamp')
-        plot_util.impedance_plot(f_arr, Aopen, 'Aopen_opamp.png', ylabel='Aopen opamp', note='Aopen opamp')
-        
-        plot_util.impedance_plot(f_arr, Aopen_gary, None, ylabel='Aopen opamp', legend='Gary')
-        plot_util.impedance_plot(f_arr, Aopen, 'Aopen_opamp_gary.png', ylabel='Aopen opamp', note='Aopen opamp', legend='Pelle')
-        
-        plot_util.impedance_plot(f_arr, Aclosed, 'Aclosed_opamp.png', ylabel='Aclosed opamp', note='Aclosed opamp')
-        
-        plot_util.impedance_plot(f_arr, Z_Z3, 'Z3.png', note='Z3')
-        
-        plot_util.impedance_plot(f_arr, Z_load, 'Z_load.png', note='Z_load')
-        
-        plot_util.impedance_plot(f_arr, Aopen_HEMT, 'Aopen_HEMT.png', ylabel='Aopen HEMT', note='Aopen HEMT gm={0:.1f}mS'.format(hemt.gm*1e3))
-        
-        plot_util.impedance_plot(f_arr, Atotal_open, 'Atotal_open.png', ylabel='Atotal openT', note='Atotal open')
-        
-        plot_util.impedance_plot(f_arr, Z_HEMT, 'Z_HEMT.png', note='Z_HEMT')
-        
-        plot_util.impedance_plot(f_arr, Z_Z1_g, 'Z1_g.png', note='Z1_g')
-        
-        plot_util.impedance_plot(f_arr, Z_Z1_open, 'Z1_open.png', note='Z1_open')
-        
-        plot_util.impedance_plot(f_arr, Z_input_4K, 'Z_input_4K.png', note='Z_input_4K')
-        
-        plot_util.impedance_plot(f_arr, Z_Z2, 'Z2.png', note='Z2')
-        
-        plot_util.impedance_plot(f_arr, H_fb, legend='H_fb')
-        plot_util.impedance_plot(f_arr, H_in, 'H_in.png', legend='H_in', ylabel='Feedback fraction & damping')
-        
-        plot_util.impedance_plot(f_arr, Atotal_closed, 'Atotal_closed.png', ylabel='Atotal closed', note='Atotal closed')
-        
-
-
-        plot_util.impedance_plot(f_arr, Atotal_closed,legend='Atotal_closed')
-        plot_util.impedance_plot(f_arr, Atotal_closed_no_H_in, legend='no H_in')
-        plot_util.impedance_plot(f_arr, Atotal_closed_no_H_fb, ylabel='Atotal_closed', legend='no H_fb',note='Compare FB/damping effect.', name='Atotal_closed_cmp.png')
-        
-
-        plot_util.impedance_plot(f_arr, Z_Z1_MC, note='Z_Z1_MC', name='Z1_MC.png')
-        
-
-        plot_util.impedance_plot(f_arr, Z_Z1_MC, legend='Z_Z1_MC')
-        
-
-        plot_util.impedance_plot(f_arr, Z_Z1_MC_g, note='Z_Z1_MC_g', name='Z1_MC_g.png')
-        
-
-        plot_util.impedance_plot(f_arr, Z_Z1_MC, legend='Z_Z1_MC')
-        plot_util.impedance_plot(f_arr, Z_Z1_g, legend='Z_Z1_g')
-        plot_util.impedance_plot(f_arr, Z_Z1_MC_g, legend='Z_Z1_MC_g', name='Z1_MC_cmp.png')
-        
-
-        plot_util.impedance_plot(f_arr, Z_input, note='Z_input', name='Z_input.png')
-        
-
-        # compare w/ and w/o MC stage
-        plot_util.impedance_plot(f_arr, Z_input, legend='Z_input')
-        plot_util.impedance_plot(f_arr, Z_input_4K, legend='Z_input_4K')
-        plot_util.impedance_plot(f_arr, Z_Z1_MC_g, legend='Z1_MC',name='Z_input_cmp.png')
-        
-
-        plot_util.impedance_plot(f_arr, H_fb_det, 'H_fb_det.png', note='H_fb_det')
-        
-
-        plot_util.impedance_plot(f_arr, H_in_det, 'H_in_det.png', note='H_in_det')
-        
-
-        plot_util.impedance_plot(f_arr, Atotal_closed_det, 'Atotal_closed_det.png', ylabel='Atotal closed det', note='Atotal_closed_det')
-        
+    if args.chunk:
+        # streamed to an uncompressed (memory-mappable) file, only the reductions are kept
+        import streaming
+        with profiling.stage('stream', num=config.num):
+            result = streaming.stream_budget(budget, args.savename, args.chunk, gains=args.savegains)
+        print(result.summary())
+    else:
+        with profiling.stage('evaluate', num=len(config.f_arr)):
+            result = budget.evaluate()
+    if result.precision_error is not None:
+        print('single precision max relative error {0:.1e}'.format(max(result.precision_error.values())))
+
+    # save output file
+    if args.savename and not args.chunk:
+        import result_io
+        with profiling.stage('save'):
+            result_io.save_result(args.savename, result_io.result_arrays(result, gains=args.savegains),
+                                  compressed=not args.uncompressed)
+
+    # plotting modules are only imported when a plot is requested
+    if args.makeplots or args.show:
+        with profiling.stage('plot'):
+            import plot_render
+            specs = total_noise_plots(result)
+            if args.makeplots:
+                specs += diagnostic_plots(result, config.circuits)
+
+            if args.show:
+                import matplotlib.pyplot as plt
+                import plot_util
+                plot_util.setup_plt()
+                plot_render.render_serial(specs)
+                plt.show()
+            else:
+                # headless: Agg figures rendered in parallel and not kept open
+                plot_render.render_batch(specs, processes=args.jobs, report=args.report)
+
+    if profiling.enabled():
+        print(profiling.summary())
+        if args.profile:
+            profiling.save_json(args.profile)
+        if args.trace:
+            profiling.save_chrome_trace(args.trace)
+        profiling.disable()
+
+    return result
+
+
+
+def total_noise_plots(result):
+    """Plots of each noise source and the total noise."""
+    from plot_render import PlotSpec
+
+    f_arr = result.f_arr
+
+    # noise sources and total noise
+    p = PlotSpec('noise', 'en_total_input', ylabel=r'$V/\sqrt{Hz}$', note=r'Total voltage noise (input)')
+    for src, val in result.noise_sources.items():
+        p.add(f_arr, val, src)
+    p.add(f_arr, result.en_total_input, 'en_total')
+
+    return [p,
+            PlotSpec('noise', 'en_total_output', ylabel=r'$V/\sqrt{Hz}$', note=r'Total voltage noise (output)').add(
+                f_arr, result.en_total_output, 'en_total_output')]
+
+
+
+def diagnostic_plots(result, circuits):
+    """Plots of impedances, gains and noise of each stage."""
+    from plot_render import PlotSpec
+
+    f_arr = result.f_arr
+    g = result.gains
+    n = result.noise
+    src = result.noise_sources
+    hemt = circuits['hemt']
+
+    def Z(name, key, note=None, ylabel='Impedance', legend=None):
+        return PlotSpec('impedance', name, ylabel=ylabel, note=note).add(f_arr, g[key], legend)
+
+    def cmp(name, curves, ylabel='Impedance', note=None):
+        p = PlotSpec('impedance', name, ylabel=ylabel, note=note)
+        for key, legend in curves:
+            p.add(f_arr, g[key], legend)
+        return p
+
+    def noise(name, y, ylabel='V/sqHz', note=None, legend=None):
+        return PlotSpec('noise', name, ylabel=ylabel, note=note).add(f_arr, y, legend)
+
+    specs = [
+        Z('Z_Z5.png', 'Z_Z5', note='Z5'),
+        Z('Z_Z6.png', 'Z_Z6', note=r'Z6'),
+        Z('B.png', 'B', ylabel='Feedback fraction B', note='Feedback fraction B'),
+        Z('Aopen_opamp.png', 'Aopen', ylabel='Aopen opamp', note='Aopen opamp'),
+        cmp('Aopen_opamp_gary.png', [('Aopen_gary', 'Gary'), ('Aopen', 'Pelle')], ylabel='Aopen opamp', note='Aopen opamp'),
+        Z('Aclosed_opamp.png', 'Aclosed', ylabel='Aclosed opamp', note='Aclosed opamp'),
+        Z('Z3.png', 'Z_Z3', note='Z3'),
+        Z('Z_load.png', 'Z_load', note='Z_load'),
+        Z('Aopen_HEMT.png', 'Aopen_HEMT', ylabel='Aopen HEMT', note='Aopen HEMT gm={0:.1f}mS'.format(hemt.gm*1e3)),
+        Z('Atotal_open.png', 'Atotal_open', ylabel='Atotal openT', note='Atotal open'),
+        Z('Z_HEMT.png', 'Z_HEMT', note='Z_HEMT'),
+        Z('Z1_g.png', 'Z_Z1_g', note='Z1_g'),
+        Z('Z1_open.png', 'Z_Z1_open', note='Z1_open'),
+        Z('Z_input_4K.png', 'Z_input_4K', note='Z_input_4K'),
+        Z('Z2.png', 'Z_Z2', note='Z2'),
+        cmp('H_in.png', [('H_fb', 'H_fb'), ('H_in', 'H_in')], ylabel='Feedback fraction & damping'),
+        Z('Atotal_closed.png', 'Atotal_closed', ylabel='Atotal closed', note='Atotal closed'),
+        cmp('Atotal_closed_cmp.png', [('Atotal_closed', 'Atotal_closed'), ('Atotal_closed_no_H_in', 'no H_in'),
+                                      ('Atotal_closed_no_H_fb', 'no H_fb')],
+            ylabel='Atotal_closed', note='Compare FB/damping effect.'),
+        Z('Z1_MC.png', 'Z_Z1_MC', note='Z_Z1_MC'),
+        Z('Z1_MC_g.png', 'Z_Z1_MC_g', note='Z_Z1_MC_g'),
+        cmp('Z1_MC_cmp.png', [('Z_Z1_MC', 'Z_Z1_MC'), ('Z_Z1_g', 'Z_Z1_g'), ('Z_Z1_MC_g', 'Z_Z1_MC_g')]),
+        Z('Z_input.png', 'Z_input', note='Z_input'),
 
         # compare w/ and w/o MC stage
-        plot_util.impedance_plot(f_arr, Atotal_closed_det, legend='Atotal_closed_det')
-        plot_util.impedance_plot(f_arr, Atotal_closed, legend='Atotal_closed',name='Atotal_closed_det_cmp.png',ylabel='total closed loop gain')
-        
-
-
-        
-
-        print("Make noise plots")
-
-        
-        plot_util.noise_plot(f_arr, en_Z2, name='en_Z2', legend='T=4K', ylabel='V/sqHz', note='FB cap and R network.')
-        
-        plot_util.noise_plot(f_arr, en_Z2_input, name='en_Z2_input', ylabel='V/sqHz', note='FB cap and R network refered to input (/A_closed_total)')
-        
-        plot_util.noise_plot(f_arr, en_HEMT_input,  name='en_HEMT_input', ylabel='V/sqHz')
-        
-        plot_util.noise_plot(f_arr, en_Z3, name='en_Z3', ylabel='V/sqHz', legend=r'en Z_3')
-        
-        plot_util.noise_plot(f_arr, en_Z3_input,  name='en_Z3_input', ylabel=r'V/\sqrt{Hz}', legend=r'en Z_3 (input)')
-        
-        plot_util.noise_plot(f_arr, in_BJT, name='in_BJT', ylabel=r'A/\sqrt{Hz}', note='BJT shot noise')
-        
-        plot_util.noise_plot(f_arr, en_BJT_input, name='en_BJT', ylabel=r'V/\sqrt{Hz}', note=r'BJT shot noise (input, gm={0:.1f}mS)'.format(hemt.gm*1e3))
-        #plot_util.impedance_plot(f_arr, Aopen_HEMT, 'Aopen_HEMT.png', ylabel='Aopen HEMT', note='Aopen HEMT gm={0:.1f}mS'.format(hemt.gm*1e3))
-        
-        plot_util.noise_plot(f_arr, en_opamp, name='en_opamp', ylabel=r'V/\sqrt{Hz}', note=r'Opamp voltage noise')
-        
-        plot_util.noise_plot(f_arr, en_opamp_gary_input, ylabel=r'$V/\sqrt{Hz}$', note=r'Opamp voltage noise (input)')
-        plot_util.noise_plot(f_arr, en_opamp_input, name='en_opamp_input', ylabel=r'$V/\sqrt{Hz}$', legend='Gary')
-
-        
-    
-
-
-
-    # close output file
-    if outfile_dict and args.savename:
-        np.savez_compressed(args.savename, outfile_dict)
-    
-    
-    if args.show:
-        plt.show()
-    
-                 
-
-
-
-    
+        cmp('Z_input_cmp.png', [('Z_input', 'Z_input'), ('Z_input_4K', 'Z_input_4K'), ('Z_Z1_MC_g', 'Z1_MC')]),
+        Z('H_fb_det.png', 'H_fb_det', note='H_fb_det'),
+        Z('H_in_det.png', 'H_in_det', note='H_in_det'),
+        Z('Atotal_closed_det.png', 'Atotal_closed_det', ylabel='Atotal closed det', note='Atotal_closed_det'),
+        cmp('Atotal_closed_det_cmp.png', [('Atotal_closed_det', 'Atotal_closed_det'), ('Atotal_closed', 'Atotal_closed')],
+            ylabel='total closed loop gain'),
+
+        # noise
+        noise('en_Z2', n['en_Z2'], legend='T=4K', note='FB cap and R network.'),
+        noise('en_Z2_input', src['en_Z2'], note='FB cap and R network refered to input (/A_closed_total)'),
+        noise('en_HEMT_input', src['en_HEMT']),
+        noise('en_Z3', n['en_Z3'], legend=r'en Z_3'),
+        noise('en_Z3_input', src['en_Z3'], ylabel=r'V/\sqrt{Hz}', legend=r'en Z_3 (input)'),
+        noise('in_BJT', n['in_BJT'], ylabel=r'A/\sqrt{Hz}', note='BJT shot noise'),
+        noise('en_BJT', src['en_BJT-fix'], ylabel=r'V/\sqrt{Hz}', note=r'BJT shot noise (input, gm={0:.1f}mS)'.format(hemt.gm*1e3)),
+        noise('en_opamp', n['en_opamp'], ylabel=r'V/\sqrt{Hz}', note=r'Opamp voltage noise'),
+
+        # plot some info I inherited from Tsuguo, Dave and/or Gary
+        PlotSpec('noise', 'en_opamp_input', ylabel=r'$V/\sqrt{Hz}$', note=r'Opamp voltage noise (input)').add(
+            f_arr, src['en_opamp']/np.abs(g['Aopen_HEMT'])).add(f_arr, src['en_opamp'], 'Gary'),
+    ]
+    return specs
 
-                 
 
 
 if __name__ == '__main__':
 
     print('Just GO')
 
-    args = get_args()
-    
-    main()
+    main(get_args())
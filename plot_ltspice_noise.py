@@ -0,0 +1,55 @@
+import sys
+import argparse
+import numpy as np
+import matplotlib.pyplot as plt
+import impedance as Q
+import plot_util
+import ltspice_raw
+
+
+
+def get_args():
+    parser = argparse.ArgumentParser('Compare LTspice noise simulation to the HEMT noise model.')
+    parser.add_argument('raw', nargs='?', default='LTspice/hemt-noise-4K.raw', help='LTspice binary .raw file.')
+    parser.add_argument('--var', default='V(inoise)', help='Noise variable to compare.')
+    parser.add_argument('--fc', default=1.2e3, type=float, help='HEMT noise knee frequency.')
+    parser.add_argument('--vflat', default=0.24e-9, type=float, help='HEMT white noise level.')
+    parser.add_argument('--name', default=None, help='File name to save the plot.')
+    a = parser.parse_args()
+    print(a)
+    return a
+
+
+
+args = get_args()
+
+plot_util.setup_plt()
+
+raw = ltspice_raw.read_raw(args.raw)
+print('variables: ' + ', '.join(raw.names()))
+
+hemt = Q.HEMT('HEMT', fc=args.fc, vflat=args.vflat)
+
+fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(18,12))
+plot_util.setup_plt(fig)
+
+for i, sl in enumerate(raw.steps()):
+    f = raw.axis[sl]
+    en_spice = raw[args.var][sl]
+    en_model = hemt.voltageNoise(f)
+    ax1.plot(f, en_spice, label='LTspice ' + args.var + (' step {0:d}'.format(i) if i else ''))
+    ax2.plot(f, en_spice/en_model)
+
+ax1.plot(f, en_model, 'k--', label='HEMT model')
+ax1.set_ylabel(r'$V/\sqrt{Hz}$')
+ax1.set_xscale(u'log')
+ax1.set_yscale(u'log')
+ax1.legend()
+ax2.set_ylabel('LTspice/model')
+ax2.set_xlabel('Frequency (Hz)')
+ax2.set_xscale(u'log')
+
+if args.name:
+    fig.savefig(args.name, bbox_inches='tight')
+
+plt.show()
@@ -1,23 +1,13 @@
 import sys
 import numpy as np
 import matplotlib.pyplot as plt
+import spectrum_data
 
 
 
 def get_noise_data(files):
-    f = None
-    n = None
     print(files)
-    for file in files:
-        a = np.genfromtxt(file)
-        if f is None:
-            f = a[:,0]
-            n = a[:,1]
-        else:
-            f = np.concatenate((f,a[:,0]), axis=0)
-            n = np.concatenate((n,a[:,1]), axis=0)
-
-    return (f,n)
+    return spectrum_data.load_spectra(files)
 
 
 data = get_noise_data(sys.argv[1:len(sys.argv)])
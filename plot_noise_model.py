@@ -3,6 +3,9 @@ import argparse
 import numpy as np
 import matplotlib.pyplot as plt
 import plot_util
+import spectrum_data
+import model_comparison
+import result_io
 
 
 
@@ -19,24 +22,7 @@ def get_args():
 
 
 def get_noise_data(files, unique=False):
-    f = None
-    n = None
-    for file in files:
-        a = np.genfromtxt(file)
-        if f is None:
-            f = a[:,0]
-            n = a[:,1]
-        else:
-            if not unique:
-                f = np.concatenate((f,a[:,0]), axis=0)
-                n = np.concatenate((n,a[:,1]), axis=0)
-            else:
-                # increasing frequencies only!
-                f_max = np.max(f)
-                f = np.concatenate((f, a[:,0][ a[:,0] > f_max] ))
-                n = np.concatenate((n, a[:,1][ a[:,0] > f_max] ))
-    
-    return (f,n)
+    return spectrum_data.load_spectra(files, unique=unique)
 
 
     
@@ -46,11 +32,8 @@ def get_model_noise_data(filepath):
 
     print("Getting data from: " + filepath)
 
-    # get container
-    c = np.load(filepath)
-    print(c)
-    # recover dict of data 
-    return c['arr_0'].item()
+    # lazy container, arrays are read (or memory-mapped) on access
+    return result_io.load_result(filepath)
 
 
 
@@ -108,20 +91,19 @@ if args.data:
 
     #plot difference
     print("len of data {:d}, len of model {:d}".format(len(freq_data), len(freq_model[ind])))
+    cmp = model_comparison.compare(freq_data, data, freq_model=freq_model, model=raw_data_model['en_total_output'])
+    print(cmp.summary())
+
     fig2, (ax21,ax22) = plt.subplots(2,1,figsize=(18,12))
-    freq_model_idx = []
-    for freq in freq_data:
-        freq_model_idx.append(np.argmin(np.abs(freq_model-freq)))
-    #ax22.plot(freq_data,freq_model[freq_model_idx])
 
-    ax21.plot(freq_data, data-raw_data_model['en_total_output'][ind][freq_model_idx])
+    ax21.plot(freq_data, cmp.residual)
     ax21.text(0.1, 0.9, "Difference b/w data and model", transform=ax21.transAxes)
     ax21.set_ylabel(r'data-model [$V/\sqrt{Hz}$]')
     ax21.set_xlabel("Frequency (Hz)")
     #ax21.set_yscale(u'log') 
     ax21.set_xscale(u'log') 
     
-    ax22.plot(freq_data, (data-raw_data_model['en_total_output'][ind][freq_model_idx])/raw_data_model['en_total_output'][ind][freq_model_idx])
+    ax22.plot(freq_data, cmp.relative)
     ax22.text(0.1, 0.9, "Relative difference", transform=ax22.transAxes)
     ax22.set_ylabel("(data-model)/model [arb. units]")
     ax22.set_xlabel("Frequency (Hz)")
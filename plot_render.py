@@ -0,0 +1,137 @@
+"""Rendering of sets of impedance and noise plots.
+
+A plot is described by a PlotSpec (curves, labels, file name) so the
+same set can be drawn interactively with plot_util, or headless in
+batch: Agg canvases without pyplot, one reused figure per worker of a
+process pool, or a single multi-page PDF report.
+"""
+
+import numpy as np
+from impedance import radToDeg
+
+
+class PlotSpec(object):
+
+    """Description of one figure.
+
+    kind: 'impedance' (magnitude and phase) or 'noise' (magnitude)
+    name: file name to save to, None to only show it
+    """
+
+    def __init__(self, kind, name=None, ylabel=None, xlabel='Frequency', note=None, logy=True):
+        self.kind = kind
+        self.name = name
+        self.ylabel = ylabel if ylabel is not None else ('Impedance' if kind == 'impedance' else 'Noise')
+        self.xlabel = xlabel
+        self.note = note
+        self.logy = logy
+        self.curves = []
+
+    def add(self, f, y, legend=None):
+        """Add a curve, returns self."""
+        self.curves.append((f, y, legend))
+        return self
+
+
+def draw(spec, fig):
+    """Draw spec on a (cleared) matplotlib Figure."""
+    fig.clf()
+    if spec.kind == 'impedance':
+        ax1, ax2 = fig.subplots(2, 1)
+    else:
+        ax1, ax2 = fig.subplots(), None
+
+    legend = False
+    for f, y, label in spec.curves:
+        ax1.plot(f, np.abs(y), label=label)
+        if ax2 is not None:
+            ax2.plot(f, radToDeg(np.angle(y)))
+        legend |= label is not None
+
+    ax1.set_ylabel(spec.ylabel)
+    ax1.set_xlabel(spec.xlabel)
+    if spec.logy:
+        ax1.set_yscale(u'log')
+    ax1.set_xscale(u'log')
+    ax1.grid(True)
+    if spec.note:
+        ax1.text(0.1, 0.9, spec.note, transform = ax1.transAxes)
+    if legend:
+        ax1.legend()
+    if ax2 is not None:
+        ax2.set_ylabel('Phase')
+        ax2.set_xlabel('Frequency')
+        ax2.set_xscale(u'log')
+        ax2.grid(True)
+
+
+def _new_figure():
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=(18,12), facecolor='white')
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _render_chunk(specs):
+    """Draw and save specs reusing one Agg figure."""
+    fig = _new_figure()
+    for spec in specs:
+        draw(spec, fig)
+        print("save " + spec.name)
+        fig.savefig(spec.name, bbox_inches='tight')
+    return len(specs)
+
+
+def render_batch(specs, processes=None, report=None):
+    """Render specs headless.
+
+    Without report every spec with a name is saved to its file, spread
+    over a process pool of size processes (default cpu count, 1 renders
+    in this process). With report all specs are written as pages of one
+    PDF file instead.
+    """
+    if report:
+        from matplotlib.backends.backend_pdf import PdfPages
+        fig = _new_figure()
+        with PdfPages(report) as pdf:
+            for spec in specs:
+                draw(spec, fig)
+                pdf.savefig(fig, bbox_inches='tight')
+        print("save " + report)
+        return
+
+    specs = [s for s in specs if s.name]
+    if processes is None:
+        import os
+        processes = os.cpu_count() or 1
+    processes = max(1, min(processes, len(specs)))
+    if processes == 1:
+        _render_chunk(specs)
+        return
+
+    import multiprocessing
+    chunks = [specs[i::processes] for i in range(processes)]
+    pool = multiprocessing.Pool(processes)
+    try:
+        pool.map(_render_chunk, chunks)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def render_serial(specs):
+    """Render specs as pyplot figures with plot_util, e.g. to show them."""
+    import plot_util
+    for spec in specs:
+        fig_ax = None
+        for i, (f, y, legend) in enumerate(spec.curves):
+            last = i == len(spec.curves) - 1
+            kwargs = dict(ylabel=spec.ylabel, xlabel=spec.xlabel, legend=legend, logy=spec.logy,
+                          note=spec.note if i == 0 else None, fig_ax=fig_ax,
+                          name=spec.name if last else None)
+            if spec.kind == 'impedance':
+                fig_ax = plot_util.impedance_plot(f, y, **kwargs)
+            else:
+                fig, ax = plot_util.noise_plot(f, y, **kwargs)
+                fig_ax = (fig, (ax,))
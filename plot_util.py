@@ -1,9 +1,8 @@
 from math import pi as pi
 from math import sqrt
-import cmath
 import numpy as np
 import matplotlib.pyplot as plt
-from impedance import to_np_array, radToDeg
+from impedance import radToDeg
 
 
 
@@ -151,7 +150,7 @@ def impedance_plot(f, Z, name=None, ylabel='Impedance', xlabel='Frequency', note
         #    plt.legend(handles=[line1])
     
 
-    Z_phase = to_np_array(cmath.phase, Z)
+    Z_phase = np.angle(Z)
 
     
     
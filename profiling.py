@@ -0,0 +1,216 @@
+"""Per-stage timing and memory instrumentation of the noise pipeline.
+
+Stages of the pipeline are wrapped in stage(name). When profiling is
+enabled every stage records wall time, CPU time and the peak memory
+allocated during the stage (traced with tracemalloc, which includes
+NumPy array buffers). When disabled, stage() is a shared no-op context.
+
+Records can be summarized per stage name, saved as JSON or as a Chrome
+trace (chrome://tracing, Perfetto).
+
+Example:
+    profiling.enable()
+    nb.evaluate(np.logspace(0, 6, 10**6))
+    print(profiling.summary())
+    profiling.save_chrome_trace('trace.json')
+"""
+
+import os
+import time
+
+
+class _NullStage(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class StageRecord(object):
+
+    """Measurement of one stage.
+
+    start: wall clock start in s relative to the profiler start
+    wall, cpu: wall and CPU time in s
+    peak: peak memory allocated during the stage in bytes (None if not traced)
+    depth: nesting level
+    """
+
+    def __init__(self, name, start, depth, args):
+        self.name = name
+        self.start = start
+        self.depth = depth
+        self.args = args
+        self.wall = None
+        self.cpu = None
+        self.peak = None
+
+    def to_dict(self):
+        return {'name': self.name, 'start': self.start, 'wall': self.wall, 'cpu': self.cpu,
+                'peak': self.peak, 'depth': self.depth, 'args': self.args}
+
+
+class _Stage(object):
+
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.record = StageRecord(name, 0.0, 0, args)
+        self.mem_start = 0
+        self.child_peak = 0
+
+    def __enter__(self):
+        p = self.profiler
+        r = self.record
+        r.depth = len(p._stack)
+        if p.memory:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            if p._stack:
+                p._stack[-1].child_peak = max(p._stack[-1].child_peak, peak)
+            tracemalloc.reset_peak()
+            self.mem_start = current
+        p._stack.append(self)
+        r.start = time.perf_counter() - p.t0
+        self.cpu0 = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        p = self.profiler
+        r = self.record
+        r.wall = time.perf_counter() - p.t0 - r.start
+        r.cpu = time.process_time() - self.cpu0
+        p._stack.pop()
+        if p.memory:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, self.child_peak)
+            r.peak = peak - self.mem_start
+            # the enclosing stage sees the peak of this one
+            if p._stack:
+                p._stack[-1].child_peak = max(p._stack[-1].child_peak, peak)
+        p.records.append(r)
+        return False
+
+
+class Profiler(object):
+
+    """Collects StageRecords of the stages run while enabled."""
+
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.records = []
+        self._stack = []
+        self._own_tracemalloc = False
+        self.t0 = time.perf_counter()
+
+    def enable(self, memory=True):
+        """Start recording; memory also traces allocations (slower)."""
+        if memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._own_tracemalloc = True
+        self.memory = memory
+        self.enabled = True
+
+    def disable(self):
+        if self._own_tracemalloc:
+            import tracemalloc
+            tracemalloc.stop()
+            self._own_tracemalloc = False
+        self.enabled = False
+        self.memory = False
+
+    def reset(self):
+        self.records = []
+        self.t0 = time.perf_counter()
+
+    def stage(self, name, **args):
+        """Context manager measuring the stage name, args are saved with the record."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, args)
+
+    def summary(self):
+        """Table of total wall, CPU time and max peak memory per stage name."""
+        totals = {}
+        order = []
+        for r in sorted(self.records, key=lambda r: r.start):
+            if r.name not in totals:
+                totals[r.name] = [0, 0.0, 0.0, None, r.depth]
+                order.append(r.name)
+            t = totals[r.name]
+            t[0] += 1
+            t[1] += r.wall
+            t[2] += r.cpu
+            if r.peak is not None:
+                t[3] = r.peak if t[3] is None else max(t[3], r.peak)
+        lines = ['{0:40s} {1:>6s} {2:>10s} {3:>10s} {4:>10s}'.format('stage', 'calls', 'wall ms', 'cpu ms', 'peak MB')]
+        for name in order:
+            n, wall, cpu, peak, depth = totals[name]
+            lines.append('{0:40s} {1:6d} {2:10.3f} {3:10.3f} {4:>10s}'.format(
+                '  '*depth + name, n, wall*1e3, cpu*1e3, '-' if peak is None else '{0:.3f}'.format(peak/1e6)))
+        return '\n'.join(lines)
+
+    def save_json(self, path):
+        """Save the records as a JSON list (times in s, memory in bytes)."""
+        import json
+        with open(path, 'w') as fp:
+            json.dump({'records': [r.to_dict() for r in sorted(self.records, key=lambda r: r.start)]}, fp, indent=1)
+
+    def save_chrome_trace(self, path):
+        """Save the records in Chrome trace event format (complete events, times in us)."""
+        import json
+        pid = os.getpid()
+        events = []
+        for r in sorted(self.records, key=lambda r: r.start):
+            args = dict(r.args)
+            args['cpu_ms'] = r.cpu*1e3
+            if r.peak is not None:
+                args['peak_bytes'] = r.peak
+            events.append({'name': r.name, 'ph': 'X', 'ts': r.start*1e6, 'dur': r.wall*1e6,
+                           'pid': pid, 'tid': 0, 'args': args})
+        with open(path, 'w') as fp:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fp)
+
+
+# profiler used by the pipeline modules
+PROFILER = Profiler()
+
+
+def enable(memory=True):
+    PROFILER.enable(memory)
+
+
+def disable():
+    PROFILER.disable()
+
+
+def enabled():
+    return PROFILER.enabled
+
+
+def reset():
+    PROFILER.reset()
+
+
+def stage(name, **args):
+    return PROFILER.stage(name, **args)
+
+
+def summary():
+    return PROFILER.summary()
+
+
+def save_json(path):
+    PROFILER.save_json(path)
+
+
+def save_chrome_trace(path):
+    PROFILER.save_chrome_trace(path)
@@ -0,0 +1,286 @@
+"""Versioned, pickle-free result files of the noise model.
+
+A result file is a .npz archive with one named array per field
+('f_arr', each noise source 'en_*', 'en_total_input', 'en_total_output',
+optionally the gains as 'gain_<name>') and a 'format_version' entry.
+Nothing is pickled, so files load with allow_pickle=False.
+
+Written uncompressed (compressed=False) every array is stored as is in
+the archive and ResultFile returns it as a read-only memmap. Compressed
+members are read on access only, one at a time. ResultWriter writes
+such a file chunk by chunk through memmaps, for results larger than
+memory (see streaming.py).
+
+Example:
+    save_result('model.npz', result.to_dict(), compressed=False)
+    with ResultFile('model.npz') as r:
+        r['en_total_output']
+"""
+
+import io
+import zlib
+import zipfile
+import numpy as np
+
+
+FORMAT_VERSION = 1
+
+GAIN_PREFIX = 'gain_'
+
+
+def result_arrays(result, gains=False):
+    """Dict of arrays to save for a noise_budget.NoiseBudgetResult."""
+    d = result.to_dict()
+    if gains:
+        for k, v in result.gains.items():
+            d[GAIN_PREFIX + k] = np.broadcast_to(v, np.shape(result.f_arr))
+    return d
+
+
+def sweep_arrays(res):
+    """Dict of arrays to save for a sweep.SweepResult."""
+    d = {'f_arr': res.f_arr, 'sweep_params': np.array(res.params, dtype=str)}
+    for name, values in zip(res.params, res.values):
+        d['sweep_values_' + name] = values
+    d.update(res.data)
+    return d
+
+
+def save_result(path, arrays, compressed=True):
+    """Save a dict of arrays as a result file.
+
+    Arguments:
+    path: file name, '.npz' is appended by NumPy if missing
+    arrays: dict of field name to array, see result_arrays and sweep_arrays
+    compressed: compress the members; uncompressed files can be memory-mapped
+    """
+    arrays = {k: np.asarray(v) for k, v in arrays.items()}
+    for k, v in arrays.items():
+        if v.dtype.hasobject:
+            raise TypeError('field ' + k + ' is not a numeric or string array')
+    arrays['format_version'] = np.array(FORMAT_VERSION)
+    if compressed:
+        np.savez_compressed(path, **arrays)
+    else:
+        np.savez(path, **arrays)
+
+
+def _stored_array(path, info):
+    """Data offset, shape, fortran order and dtype of the .npy of a stored member."""
+    with open(path, 'rb') as f:
+        # local file header: 30 bytes, then file name and extra field
+        f.seek(info.header_offset)
+        header = f.read(30)
+        n_name = int.from_bytes(header[26:28], 'little')
+        n_extra = int.from_bytes(header[28:30], 'little')
+        f.seek(info.header_offset + 30 + n_name + n_extra)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        return f.tell(), shape, fortran, dtype
+
+
+class ResultFile(object):
+
+    """Lazy reader of a result file.
+
+    Fields are read on access. Members stored uncompressed are returned
+    as read-only memmaps of the archive, compressed ones are decompressed.
+    """
+
+    def __init__(self, path, mmap=True):
+        self.path = path
+        self.mmap = mmap
+        self._npz = np.load(path, allow_pickle=False)
+        self._zip = zipfile.ZipFile(path)
+        if 'format_version' not in self._npz.files:
+            if 'arr_0' in self._npz.files:
+                raise ValueError(path + ' is in the old pickled format, convert it with convert_legacy()')
+            raise ValueError(path + ' is not a noise model result file')
+        self.version = int(self._npz['format_version'])
+        if self.version > FORMAT_VERSION:
+            raise ValueError('{0:s} has format version {1:d}, this reader supports up to {2:d}'.format(
+                path, self.version, FORMAT_VERSION))
+
+    def keys(self):
+        return [k for k in self._npz.files if k != 'format_version']
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if self.mmap:
+            a = self._memmap(key)
+            if a is not None:
+                return a
+        return self._npz[key]
+
+    def gains(self):
+        """Names of the saved gains."""
+        return [k[len(GAIN_PREFIX):] for k in self.keys() if k.startswith(GAIN_PREFIX)]
+
+    def _memmap(self, key):
+        """Memmap of an uncompressed member, None if it is compressed."""
+        info = self._zip.getinfo(key + '.npy')
+        if info.compress_type != zipfile.ZIP_STORED:
+            return None
+        offset, shape, fortran, dtype = _stored_array(self.path, info)
+        if dtype.hasobject:
+            return None
+        if int(np.prod(shape)) == 0:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(self.path, dtype=dtype, mode='r', offset=offset, shape=shape,
+                         order='F' if fortran else 'C')
+
+    def close(self):
+        self._npz.close()
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ResultWriter(object):
+
+    """Uncompressed result file filled in chunk by chunk through memmaps.
+
+    The archive is laid out with every field at its final length num
+    (zero filled), then write() copies each chunk into the memmaps of
+    the fields. Chunks are written in order, the CRC-32 of every member
+    is updated on the way and patched into the zip headers by close(),
+    so the file reads with ResultFile and np.load like any other.
+
+    Example:
+        with ResultWriter('big.npz', {'f_arr': float, 'en_total_output': np.float32}, 10**8) as w:
+            for start, f in chunks:
+                w.write(start, {'f_arr': f, 'en_total_output': noise(f)})
+    """
+
+    _BLOCK = 1 << 24
+
+    def __init__(self, path, dtypes, num):
+        """ Arguments:
+        path: file name, '.npz' is appended if missing (as NumPy does)
+        dtypes: dict of field name to dtype
+        num: length of every field
+        """
+        if not path.endswith('.npz'):
+            path = path + '.npz'
+        self.path = path
+        self.num = int(num)
+        self.position = 0
+        dtypes = {k: np.dtype(v) for k, v in dtypes.items()}
+        self._crc = {}
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+            with zf.open('format_version.npy', 'w') as f:
+                np.lib.format.write_array(f, np.array(FORMAT_VERSION))
+            for key, dtype in dtypes.items():
+                if dtype.hasobject:
+                    raise TypeError('field ' + key + ' is not a numeric or string array')
+                header = io.BytesIO()
+                np.lib.format.write_array_header_1_0(header, {'descr': np.lib.format.dtype_to_descr(dtype),
+                                                              'fortran_order': False, 'shape': (self.num,)})
+                header = header.getvalue()
+                self._crc[key] = zlib.crc32(header)
+                with zf.open(key + '.npy', 'w', force_zip64=True) as f:
+                    f.write(header)
+                    size = self.num*dtype.itemsize
+                    zeros = bytes(min(size, self._BLOCK))
+                    while size > 0:
+                        f.write(zeros[:size])
+                        size -= len(zeros)
+        self._maps = {}
+        with zipfile.ZipFile(path) as zf:
+            self._infos = {key: zf.getinfo(key + '.npy') for key in dtypes}
+        for key, info in self._infos.items():
+            offset = _stored_array(path, info)[0]
+            self._maps[key] = np.memmap(path, dtype=dtypes[key], mode='r+', offset=offset, shape=(self.num,))
+
+    def keys(self):
+        return list(self._infos)
+
+    def write(self, start, arrays):
+        """Write arrays (dict with every field, all of the same length) at index start."""
+        if start != self.position:
+            raise ValueError('chunks must be written in order, expected start {0:d}, not {1:d}'.format(
+                self.position, start))
+        if set(arrays) != set(self._maps):
+            raise KeyError('fields to write {0} differ from the fields of the file {1}'.format(
+                sorted(arrays), sorted(self._maps)))
+        n = len(arrays['f_arr']) if 'f_arr' in arrays else len(next(iter(arrays.values())))
+        if start + n > self.num:
+            raise ValueError('chunk ends at {0:d}, past the end of the file ({1:d})'.format(start + n, self.num))
+        for key, m in self._maps.items():
+            value = np.ascontiguousarray(np.broadcast_to(arrays[key], (n,)), dtype=m.dtype)
+            m[start:start + n] = value
+            self._crc[key] = zlib.crc32(value, self._crc[key])
+        self.position = start + n
+
+    def close(self):
+        """Flush the data and patch the CRCs into the zip headers.
+
+        Fields not written to the end are left zero filled.
+        """
+        if self._maps is None:
+            return
+        self._data_end = {key: m.offset + m.nbytes for key, m in self._maps.items()}
+        for key, m in self._maps.items():
+            for i in range(self.position, self.num, self._BLOCK):
+                self._crc[key] = zlib.crc32(m[i:i + self._BLOCK], self._crc[key])
+            m.flush()
+        self._maps = None
+
+        if not self._infos:
+            return
+        # the central directory follows the data of the last member
+        start_dir = max(self._data_end.values())
+        with open(self.path, 'r+b') as f:
+            # local file headers, CRC-32 at byte 14
+            for key, info in self._infos.items():
+                f.seek(info.header_offset + 14)
+                f.write(self._crc[key].to_bytes(4, 'little'))
+            # central directory entries, CRC-32 at byte 16
+            f.seek(0, 2)
+            end = f.tell()
+            f.seek(start_dir)
+            while f.tell() < end:
+                entry = f.read(46)
+                if entry[:4] != b'PK\x01\x02':
+                    break
+                n_name = int.from_bytes(entry[28:30], 'little')
+                n_extra = int.from_bytes(entry[30:32], 'little')
+                n_comment = int.from_bytes(entry[32:34], 'little')
+                name = f.read(n_name).decode()
+                key = name[:-len('.npy')]
+                if key in self._crc and name.endswith('.npy'):
+                    f.seek(-n_name - 46 + 16, 1)
+                    f.write(self._crc[key].to_bytes(4, 'little'))
+                    f.seek(46 - 16 - 4 + n_name, 1)
+                f.seek(n_extra + n_comment, 1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_result(path, mmap=True):
+    """Open a result file, see ResultFile."""
+    return ResultFile(path, mmap)
+
+
+def convert_legacy(path, new_path, compressed=True):
+    """Convert a file saved with np.savez_compressed of a dict (pickled arr_0).
+
+    Only use this on files from a trusted source: loading them unpickles.
+    """
+    c = np.load(path, allow_pickle=True)
+    save_result(new_path, c['arr_0'].item(), compressed)
@@ -0,0 +1,222 @@
+"""Sensitivity of the noise budget to every component value.
+
+Component values are replaced by forward-mode dual numbers carrying the
+derivative with respect to each parameter, so one evaluation of the
+noise budget returns d(output)/d(param) for all parameters at all
+frequencies. Linearized uncertainties follow from a covariance matrix
+of the parameters.
+
+Example:
+    s = sensitivity(noise_budget.NoiseBudget(), f_arr=np.logspace(0,6,200))
+    s.relative('en_total_input')          # d ln(en) / d ln(param), shape (P, N)
+    cov = covariance_from_tolerances(s, {'Z2.Rfb': 0.05, 'Z2.Cfb': 0.1})
+    s.uncertainty(cov, 'en_total_output')
+"""
+
+import numpy as np
+import impedance as Q
+
+
+def _pad(der, ndim):
+    """Derivative array (P, ...) with ones inserted to broadcast against ndim value dims."""
+    return der.reshape(der.shape[:1] + (1,)*(ndim - der.ndim + 1) + der.shape[1:])
+
+
+class Dual(object):
+
+    """Value with derivatives with respect to P parameters.
+
+    val: value (scalar or array), der: derivatives of shape (P,) + shape(val).
+    Supports the arithmetic and NumPy ufuncs used by the noise budget.
+    """
+
+    def __init__(self, val, der):
+        self.val = val
+        self.der = der
+
+    @staticmethod
+    def seed(value, i, n):
+        """Parameter i of n with value."""
+        der = np.zeros(n)
+        der[i] = 1.0
+        return Dual(value, der)
+
+    @property
+    def real(self):
+        return Dual(np.real(self.val), np.real(self.der))
+
+    @property
+    def imag(self):
+        return Dual(np.imag(self.val), np.imag(self.der))
+
+    def conj(self):
+        return Dual(np.conj(self.val), np.conj(self.der))
+
+    @property
+    def shape(self):
+        return np.shape(self.val)
+
+    def __len__(self):
+        return len(self.val)
+
+    def __getitem__(self, idx):
+        idx = idx if isinstance(idx, tuple) else (idx,)
+        return Dual(self.val[idx], self.der[(slice(None),) + idx])
+
+    def _binary(self, other, reflected, ufunc):
+        a, b = (other, self) if reflected else (self, other)
+        return self.__array_ufunc__(ufunc, '__call__', a, b)
+
+    def __add__(self, o): return self._binary(o, False, np.add)
+    def __radd__(self, o): return self._binary(o, True, np.add)
+    def __sub__(self, o): return self._binary(o, False, np.subtract)
+    def __rsub__(self, o): return self._binary(o, True, np.subtract)
+    def __mul__(self, o): return self._binary(o, False, np.multiply)
+    def __rmul__(self, o): return self._binary(o, True, np.multiply)
+    def __truediv__(self, o): return self._binary(o, False, np.true_divide)
+    def __rtruediv__(self, o): return self._binary(o, True, np.true_divide)
+    def __pow__(self, o): return self._binary(o, False, np.power)
+    def __neg__(self): return Dual(-self.val, -self.der)
+    def __abs__(self): return np.abs(self)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method != '__call__' or kwargs:
+            return NotImplemented
+        vals = [x.val if isinstance(x, Dual) else x for x in inputs]
+        ders = [x.der if isinstance(x, Dual) else None for x in inputs]
+        val = ufunc(*vals)
+        ndim = np.ndim(val)
+
+        # partial derivatives of the ufunc with respect to each input
+        if ufunc is np.add:
+            parts = [1.0, 1.0]
+        elif ufunc is np.subtract:
+            parts = [1.0, -1.0]
+        elif ufunc is np.multiply:
+            parts = [vals[1], vals[0]]
+        elif ufunc in (np.true_divide, np.divide):
+            parts = [1.0/vals[1], -val/vals[1]]
+        elif ufunc is np.power:
+            a, b = vals
+            parts = [b*np.power(a, b - 1), val*np.log(a) if ders[1] is not None else None]
+        elif ufunc is np.negative:
+            parts = [-1.0]
+        elif ufunc is np.sqrt:
+            parts = [0.5/val]
+        elif ufunc is np.square:
+            parts = [2*vals[0]]
+        elif ufunc is np.exp:
+            parts = [val]
+        elif ufunc is np.log:
+            parts = [1.0/vals[0]]
+        elif ufunc is np.conjugate:
+            return Dual(val, np.conj(ders[0]))
+        elif ufunc is np.absolute:
+            v = vals[0]
+            if np.iscomplexobj(v) or np.iscomplexobj(ders[0]):
+                # d|z| = Re(conj(z) dz)/|z|
+                return Dual(val, np.real(_pad(ders[0], ndim)*np.conj(v))/val)
+            parts = [np.sign(v)]
+        else:
+            return NotImplemented
+
+        der = 0
+        for d, p in zip(ders, parts):
+            if d is not None:
+                der = der + _pad(d, ndim)*p
+        return Dual(val, np.broadcast_to(der, der.shape[:1] + np.shape(val)))
+
+
+def parameters(circuits):
+    """Paths of all component values and HEMT/opamp parameters of the circuits."""
+    params = []
+    for name, c in circuits.items():
+        for attr, v in sorted(vars(c).items()):
+            if isinstance(v, Q.Component):
+                params.append(name + '.' + attr)
+    for name, c in circuits.items():
+        if isinstance(c, Q.HEMT):
+            params += [name + '.gm', name + '.fc', name + '.vflat']
+        elif isinstance(c, Q.LT1677):
+            params += [name + '.fc', name + '.vflat']
+    return params
+
+
+class SensitivityResult(object):
+
+    """Values and derivatives of the noise budget outputs.
+
+    params: parameter paths, values: nominal parameter values,
+    value[key]: output at f_arr, der[key]: derivatives of shape (P, N).
+    """
+
+    def __init__(self, f_arr, params, values, value, der):
+        self.f_arr = f_arr
+        self.params = params
+        self.values = values
+        self.value = value
+        self.der = der
+
+    def relative(self, key='en_total_input'):
+        """Relative sensitivity d ln(output)/d ln(param), shape (P, N)."""
+        return self.der[key]*self.values[:, np.newaxis]/self.value[key]
+
+    def uncertainty(self, cov, key='en_total_output'):
+        """Linearized standard deviation of the output for parameter covariance cov (P, P)."""
+        J = self.der[key]
+        return np.sqrt(np.abs(np.einsum('pn,pq,qn->n', J, cov, J)))
+
+    def band(self, cov, key='en_total_output', k=1.0):
+        """Lower and upper k sigma band of the output."""
+        s = k*self.uncertainty(cov, key)
+        return self.value[key] - s, self.value[key] + s
+
+    def ranking(self, key='en_total_input', freq=None):
+        """Parameters sorted by largest relative sensitivity (at the frequency closest to freq)."""
+        r = np.abs(self.relative(key))
+        r = r.max(axis=1) if freq is None else r[:, np.argmin(np.abs(self.f_arr - freq))]
+        order = np.argsort(-r)
+        return [(self.params[i], r[i]) for i in order]
+
+
+def covariance_from_tolerances(result, tolerances):
+    """Diagonal covariance from a dict of relative tolerances (1 sigma) per parameter."""
+    sigma = np.array([tolerances.get(p, 0.0) for p in result.params])*result.values
+    return np.diag(np.square(sigma))
+
+
+def sensitivity(budget, params=None, f_arr=None, keys=('en_total_input', 'en_total_output')):
+    """Derivatives of the noise budget outputs with respect to params in one evaluation.
+
+    Arguments:
+    budget: noise_budget.NoiseBudget
+    params: parameter paths (default all, see parameters())
+    f_arr: frequencies (default the budget config frequencies)
+    keys: outputs, totals or noise sources
+    """
+    if params is None:
+        params = parameters(budget.circuits)
+    if f_arr is None:
+        f_arr = budget.config.f_arr
+    f_arr = np.asarray(f_arr, dtype=float)
+    values = np.array([budget.get(p) for p in params], dtype=float)
+
+    try:
+        for i, p in enumerate(params):
+            budget.set(p, Dual.seed(values[i], i, len(params)))
+        res = budget.evaluate(f_arr)
+    finally:
+        for p, v in zip(params, values):
+            budget.set(p, v)
+
+    value = {}
+    der = {}
+    for k in keys:
+        out = getattr(res, k) if hasattr(res, k) else res.noise_sources[k]
+        if isinstance(out, Dual):
+            value[k] = np.broadcast_to(out.val, f_arr.shape)
+            der[k] = np.broadcast_to(np.real(out.der), (len(params),) + f_arr.shape)
+        else:
+            value[k] = np.broadcast_to(out, f_arr.shape)
+            der[k] = np.zeros((len(params),) + f_arr.shape)
+    return SensitivityResult(f_arr, params, values, value, der)
@@ -0,0 +1,347 @@
+"""Registry of the noise sources of the readout chain.
+
+Each noise source is a NoiseSource: a vectorized spectral density and
+the gain from the HEMT gate input to the point where the noise enters,
+so the input referred noise is density/gain. The default registry holds
+the sources of the original model (en_Z2, en_HEMT, en_Z3, en_BJT-fix,
+en_opamp); more can be added, e.g.
+
+    nb.sources.add(hemt_gate_current_noise(1e-12))
+    nb.sources.add(mc_resistor_noise('Rbias', T=0.05))
+
+thermal_sources() replaces the lumped en_Z2, en_Z3 by the thermal noise of
+every resistor of the chain at its own temperature (Resistor.T), e.g. a
+temperature sweep as one batched evaluation:
+
+    config = noise_budget.NoiseBudgetConfig()
+    config.sources = thermal_sources(config.circuits)
+    nb = noise_budget.NoiseBudget(config)
+    nb.set_temperature('Z2', np.array([[1.0], [4.0], [10.0]]))
+    nb.evaluate().en_total_input          # shape (3, N)
+
+QuadratureSum keeps the running sum of squares of the referred sources,
+so replacing, adding or removing one source is O(N).
+"""
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import functools
+import numpy as np
+import impedance as Q
+
+
+class SourceContext(object):
+
+    """What a noise source may depend on: frequencies, gains of the chain, circuits, temperatures."""
+
+    def __init__(self, f_arr, gains, circuits, T_4K=4.0, T_300K=300.0, closed_loop='Atotal_closed'):
+        self.f_arr = f_arr
+        self.gains = gains
+        self.circuits = circuits
+        self.T_4K = T_4K
+        self.T_300K = T_300K
+        self.closed_loop = closed_loop
+
+    @property
+    def detector(self):
+        """True if the noise is referred with the MC stage (detector) connected."""
+        return self.closed_loop.endswith('_det')
+
+
+class TrackedMapping(Mapping):
+
+    """Read-only view of a dict recording the keys read, to find what a noise source depends on."""
+
+    def __init__(self, d):
+        self._d = d
+        self.read = set()
+
+    def __getitem__(self, key):
+        self.read.add(key)
+        return self._d[key]
+
+    def __iter__(self):
+        return iter(self._d)
+
+    def __len__(self):
+        return len(self._d)
+
+
+class NoiseSource(object):
+
+    """One noise source.
+
+    name: key of the source in noise_sources
+    density: density(ctx) returns the spectral density (V/sqHz or A/sqHz)
+    gain: gain(ctx) returns the gain from the HEMT input to the source
+          (V/V for voltage, A/V for current noise), None for a source at the input
+    noise_name: key under which the raw density is kept in noise, None to not keep it
+    """
+
+    def __init__(self, name, density, gain=None, noise_name=None):
+        self.name = name
+        self.density = density
+        self.gain = gain
+        self.noise_name = noise_name
+
+    def referred(self, ctx, raw=None):
+        """Noise referred to the HEMT input (complex if the gain is)."""
+        if raw is None:
+            raw = self.density(ctx)
+        if self.gain is None:
+            return raw
+        return raw/self.gain(ctx)
+
+
+class SourceRegistry(object):
+
+    """Ordered collection of NoiseSources."""
+
+    def __init__(self, sources=()):
+        self._sources = {}
+        for s in sources:
+            self.add(s)
+
+    def add(self, source, replace=False):
+        if source.name in self._sources and not replace:
+            raise ValueError('noise source ' + source.name + ' is already registered')
+        self._sources[source.name] = source
+        return source
+
+    def remove(self, name):
+        return self._sources.pop(name)
+
+    def names(self):
+        return list(self._sources)
+
+    def copy(self):
+        return SourceRegistry(self._sources.values())
+
+    def __contains__(self, name):
+        return name in self._sources
+
+    def __getitem__(self, name):
+        return self._sources[name]
+
+    def __iter__(self):
+        return iter(self._sources.values())
+
+    def __len__(self):
+        return len(self._sources)
+
+
+def _same_kind(a, b):
+    """True if b can be updated in place of a: same type, shape and dtype."""
+    return type(a) is type(b) and np.shape(a) == np.shape(b) and getattr(a, 'dtype', None) == getattr(b, 'dtype', None)
+
+
+class QuadratureSum(object):
+
+    """Running sum of squares of the noise sources.
+
+    power: sum of |source|**2, total(): its square root. Replacing or
+    removing a source subtracts its old square, so updates accumulate
+    rounding; the sum is recomputed (refresh()) every max_updates of them.
+    """
+
+    def __init__(self, max_updates=100):
+        self.squares = {}
+        self.power = 0
+        self.max_updates = max_updates
+        self.updates = 0
+
+    def set(self, name, value):
+        """Add or replace the (abs) value of a source."""
+        sq = np.power(value,2)
+        old = self.squares.get(name)
+        self.squares[name] = sq
+        if old is None:
+            self.power = self.power + sq
+        elif not _same_kind(old, sq):
+            # e.g. a design point axis is dropped, or dual numbers of a
+            # sensitivity replaced by plain arrays: the sum has to follow
+            self.refresh()
+        else:
+            self.power = self.power - old + sq
+            self._updated()
+
+    def remove(self, name):
+        old = self.squares.pop(name)
+        if not _same_kind(old, self.power):
+            self.refresh()
+        else:
+            self.power = self.power - old
+            self._updated()
+
+    def _updated(self):
+        self.updates += 1
+        if self.updates >= self.max_updates:
+            self.refresh()
+
+    def refresh(self):
+        self.power = 0
+        for sq in self.squares.values():
+            self.power = self.power + sq
+        self.updates = 0
+
+    def copy(self):
+        q = QuadratureSum(self.max_updates)
+        q.squares = dict(self.squares)
+        q.power = self.power
+        q.updates = self.updates
+        return q
+
+    def total(self):
+        # abs guards against a rounding below zero after removing the dominant source
+        return np.sqrt(np.abs(self.power))
+
+
+def _feedback_noise(ctx):
+    # noise from feedback Circuit
+    return np.sqrt(4*ctx.T_4K*Q.kB*ctx.gains['Z_Z2'].real)
+
+
+def _load_noise(ctx):
+    # noise from Z3
+    return np.sqrt(4*ctx.T_300K*Q.kB*ctx.gains['Z_Z3'].real)
+
+
+def _bjt_noise(ctx):
+    #in_BJT = np.ones(len(f_arr))*bjt.currentNoise(drainI)
+    return 1e-19*np.ones_like(ctx.f_arr)
+
+
+# gains and densities are module level functions (or partials of them),
+# so registries pickle, e.g. to the process pool of fitting.fit
+
+def _closed_loop_gain(ctx):
+    return ctx.gains[ctx.closed_loop]
+
+
+def _aopen_hemt_gain(ctx):
+    return ctx.gains['Aopen_HEMT']
+
+
+def _gm_gain(ctx):
+    return ctx.circuits['hemt'].gm
+
+
+def _hemt_noise(ctx):
+    return ctx.circuits['hemt'].voltageNoise(ctx.f_arr)
+
+
+def _opamp_noise(ctx):
+    return ctx.circuits['opamp'].voltage_noise(ctx.f_arr)
+
+
+def default_sources():
+    """Registry with the noise sources of the original model."""
+    return SourceRegistry([
+        NoiseSource('en_Z2', _feedback_noise, _closed_loop_gain, 'en_Z2'),
+        NoiseSource('en_HEMT', _hemt_noise),
+        # refer voltage noise from Z3 to the input of the HEMT gate
+        NoiseSource('en_Z3', _load_noise, _aopen_hemt_gain, 'en_Z3'),
+        # voltage noise from BJT as referred to the input of HEMT (scale by gm)
+        NoiseSource('en_BJT-fix', _bjt_noise, _gm_gain, 'in_BJT'),
+        # divide by HEMT open loop gain
+        NoiseSource('en_opamp', _opamp_noise, _aopen_hemt_gain, 'en_opamp'),
+    ])
+
+
+def _shot_noise(Igate, ctx):
+    return np.full_like(ctx.f_arr, np.sqrt(2*Q.qE*Igate))
+
+
+def _input_admittance(ctx):
+    return 1.0/ctx.gains['Z_input' if ctx.detector else 'Z_input_4K']
+
+
+def hemt_gate_current_noise(Igate, name='en_HEMT_gate'):
+    """Shot noise of the HEMT gate leakage current Igate (A) into the input impedance.
+
+    The current develops a voltage across the impedance from the gate to
+    ground, Z_input (with detector) or Z_input_4K.
+    """
+    return NoiseSource(name, functools.partial(_shot_noise, Igate), _input_admittance, 'in_HEMT_gate')
+
+
+def _mc_gain(ctx):
+    return ctx.gains[ctx.closed_loop]/ctx.gains['Atotal_closed_det']
+
+
+def _mc_resistor_density(resistor, T, ctx):
+    return ctx.circuits['Z1_MC'].voltageNoise(ctx.f_arr, T, resistor)
+
+
+def mc_resistor_noise(resistor, T, name=None):
+    """Thermal noise of resistor ('Rbias' or 'Rbleed', None for both) of Z1_MC at temperature T.
+
+    The Thevenin noise of Z1_MC is in series with the detector input, its
+    gain from the HEMT input is Atotal_closed/Atotal_closed_det with
+    respect to the closed loop gain the noise is referred with.
+    """
+    if name is None:
+        name = 'en_Z1_MC' if resistor is None else 'en_' + resistor
+    return NoiseSource(name, functools.partial(_mc_resistor_density, resistor, T), _mc_gain, name)
+
+
+def _gate_gain(ctx):
+    # Norton current of the HEMT input network into the impedance at the gate
+    return ctx.gains['Z_HEMT']/ctx.gains['Z_input' if ctx.detector else 'Z_input_4K']
+
+
+def _divider_ground_gain(ctx):
+    return ctx.gains['Aopen_HEMT']/(1 - ctx.gains['B'])
+
+
+def _divider_feedback_gain(ctx):
+    return ctx.gains['Aopen_HEMT']/ctx.gains['B']
+
+
+# gain from the HEMT input to the Thevenin noise of each circuit
+THERMAL_GAINS = {
+    # in series with the feedback, as en_Z2
+    'Z2': _closed_loop_gain,
+    # at the drain, as en_Z3
+    'Z3': _aopen_hemt_gain,
+    # op-amp feedback divider: at the op-amp input scaled by 1 - B (ground leg) and B (feedback leg)
+    'Z5': _divider_ground_gain,
+    'Z6': _divider_feedback_gain,
+    # in series with the detector input, as mc_resistor_noise
+    'Z1_MC': _mc_gain,
+    'hemt': _gate_gain,
+}
+
+
+def _resistor_density(circuit, resistor, ctx):
+    return ctx.circuits[circuit].thermal_noise(ctx.f_arr, resistor=resistor)
+
+
+def resistor_noise(circuit, resistor, gain=None, name=None):
+    """Thermal noise of a resistor of circuit at its temperature, see impedance.Circuit.thermal_noise.
+
+    gain: gain from the HEMT input, default THERMAL_GAINS[circuit]
+    """
+    if name is None:
+        name = 'en_' + circuit + '.' + resistor
+    return NoiseSource(name, functools.partial(_resistor_density, circuit, resistor),
+                       THERMAL_GAINS[circuit] if gain is None else gain, name)
+
+
+def thermal_sources(circuits, base=None, lumped=('en_Z2', 'en_Z3')):
+    """Registry of base (default the original sources) with the thermal noise of every resistor.
+
+    Each resistor of the circuits in THERMAL_GAINS gets a source
+    'en_<circuit>.<resistor>', the lumped thermal sources are dropped.
+    """
+    registry = (default_sources() if base is None else base).copy()
+    for name in lumped:
+        if name in registry:
+            registry.remove(name)
+    for circuit in sorted(THERMAL_GAINS):
+        if circuit in circuits:
+            for attr in circuits[circuit].resistors():
+                registry.add(resistor_noise(circuit, attr))
+    return registry
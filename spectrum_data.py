@@ -0,0 +1,103 @@
+"""Loader for spectrum analyzer captures (SCRN*.TXT).
+
+The files have two whitespace separated columns, frequency and noise:
+    +1.000000e+000	   +6.803228e-006
+
+Each file is parsed in bulk and cached in a binary sidecar <file>.npy
+next to it. The sidecar is memory-mapped on reload and rebuilt when the
+size or modification time of the capture changes. Its first row holds
+(size, mtime) of the capture, the remaining rows the data.
+"""
+
+import os
+import numpy as np
+
+
+def read_spectrum(path):
+    """Parse a capture file and return an (N, 2) array of frequency and noise."""
+    with open(path, 'rb') as f:
+        text = f.read().decode('latin-1')
+    fields = [len(line.split()) for line in text.splitlines()]
+    if any(n not in (0, 2) for n in fields):
+        raise ValueError(path + ' does not have two columns')
+    a = np.fromstring(text, sep=' ')
+    # the bulk parser stops at the first value it cannot read (silently in older NumPy)
+    if a.size != sum(fields):
+        raise ValueError(path + ' has values that are not numbers')
+    return a.reshape(-1, 2)
+
+
+def cache_path(path, cache_dir=None):
+    """Path of the sidecar cache of a capture file."""
+    if cache_dir is None:
+        return path + '.npy'
+    return os.path.join(cache_dir, os.path.basename(path) + '.npy')
+
+
+def load_spectrum(path, cache=True, cache_dir=None):
+    """Return (N, 2) array of frequency and noise of a capture file.
+
+    With cache the array is a read-only memmap of the sidecar cache,
+    which is written if missing or stale. If the sidecar cannot be
+    written the parsed array is returned.
+    """
+    if not cache:
+        return read_spectrum(path)
+
+    st = os.stat(path)
+    stamp = (float(st.st_size), st.st_mtime)
+    sidecar = cache_path(path, cache_dir)
+
+    if os.path.exists(sidecar):
+        try:
+            c = np.load(sidecar, mmap_mode='r')
+            if c.ndim == 2 and c.shape[1] == 2 and c.shape[0] > 0 and tuple(c[0]) == stamp:
+                return c[1:]
+        except (OSError, ValueError):
+            pass
+
+    a = read_spectrum(path)
+    c = np.empty((a.shape[0] + 1, 2))
+    c[0] = stamp
+    c[1:] = a
+    try:
+        # write to a temporary file first so readers never see a partial cache
+        tmp = sidecar + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.save(f, c)
+        os.replace(tmp, sidecar)
+    except OSError:
+        pass
+    return a
+
+
+def load_spectra(files, unique=False, cache=True, cache_dir=None):
+    """Concatenate captures into (frequency, noise) arrays.
+
+    Arguments:
+    files: capture files
+    unique: keep only frequencies above the maximum of the previous files
+    cache: use the sidecar cache
+    """
+    spectra = [load_spectrum(p, cache, cache_dir) for p in files]
+
+    # select rows first so the output is allocated once
+    rows = []
+    f_max = -np.inf
+    for a in spectra:
+        if unique and rows:
+            # increasing frequencies only!
+            a = a[a[:,0] > f_max]
+        rows.append(a)
+        if len(a):
+            f_max = max(f_max, np.max(a[:,0]))
+
+    n = sum(len(r) for r in rows)
+    f = np.empty(n)
+    noise = np.empty(n)
+    i = 0
+    for r in rows:
+        f[i:i+len(r)] = r[:,0]
+        noise[i:i+len(r)] = r[:,1]
+        i += len(r)
+    return (f, noise)
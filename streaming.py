@@ -0,0 +1,174 @@
+"""Chunked evaluation of the noise budget on grids too large for memory.
+
+The log spaced frequency grid (the same frequencies as np.logspace) is
+made a chunk at a time, each chunk goes through the whole gain and
+noise calculation and is written straight to a memory-mapped result
+file (result_io.ResultWriter). Reductions are updated on the way, so
+the memory used is set by the chunk size, not by the number of points:
+
+- noise power of every source and the totals integrated over the grid
+  (trapezoid rule in f),
+- min and max of every source and total, with their frequencies,
+- noise power of every source per band and the dominant source.
+
+Example:
+    budget = noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(num=10**8), cache=False)
+    res = stream_budget(budget, 'big.npz', chunk=10**6)
+    res.rms('en_total_input')          # RMS from fmin to fmax, in V
+    res.dominant()                     # [(f1, f2, source), ...] per decade
+    with result_io.load_result('big.npz') as r:
+        r['en_total_output'][::1000]
+"""
+
+import numpy as np
+import profiling
+import result_io
+
+
+TOTALS = ('en_total_input', 'en_total_output')
+
+
+def log_chunks(fmin, fmax, num, chunk):
+    """Yield (start index, frequencies) of np.logspace(log10(fmin), log10(fmax), num) in chunks."""
+    start, stop = np.log10(fmin), np.log10(fmax)
+    step = (stop - start)/(num - 1) if num > 1 else 0.0
+    for i in range(0, num, chunk):
+        # as np.linspace: i*step + start, the last point exactly stop
+        y = np.arange(i, min(i + chunk, num), dtype=float)*step + start
+        if i + chunk >= num and num > 1:
+            y[-1] = stop
+        yield i, np.power(10.0, y)
+
+
+def decade_bands(fmin, fmax):
+    """Band edges at the decades between fmin and fmax (inclusive)."""
+    decades = np.power(10.0, np.arange(np.ceil(np.log10(fmin)), np.floor(np.log10(fmax)) + 1))
+    return np.unique(np.concatenate(([fmin], decades, [fmax])))
+
+
+class StreamResult(object):
+
+    """Reductions of a streamed noise budget, updated chunk by chunk.
+
+    path: result file with the full arrays
+    power[key]: noise power in V**2 integrated over the grid
+    minimum[key], maximum[key]: (value, frequency)
+    edges: band edges, band_power[key]: noise power per band
+           (an interval of the grid counts to the band of its lower end)
+    precision_error: in single precision, the max relative error of each
+                     field over the spot-checks of all chunks
+    """
+
+    def __init__(self, path, sources, edges):
+        self.path = path
+        self.sources = list(sources)
+        self.fields = self.sources + list(TOTALS)
+        self.edges = np.asarray(edges, dtype=float)
+        self.power = dict((k, 0.0) for k in self.fields)
+        self.band_power = dict((k, np.zeros(len(self.edges) - 1)) for k in self.fields)
+        self.minimum = {}
+        self.maximum = {}
+        self.precision_error = None
+        self._last = None
+
+    def update(self, arrays, precision_error=None):
+        """Add a chunk (dict of arrays with 'f_arr' and the noise fields)."""
+        f = np.asarray(arrays['f_arr'], dtype=float)
+        for k in self.fields:
+            v = np.broadcast_to(arrays[k], f.shape)
+            i, j = np.argmin(v), np.argmax(v)
+            if k not in self.minimum or v[i] < self.minimum[k][0]:
+                self.minimum[k] = (float(v[i]), float(f[i]))
+            if k not in self.maximum or v[j] > self.maximum[k][0]:
+                self.maximum[k] = (float(v[j]), float(f[j]))
+
+        # the interval between chunks is integrated with the next one
+        psd = dict((k, np.square(np.broadcast_to(arrays[k], f.shape).astype(float))) for k in self.fields)
+        if self._last is not None:
+            f = np.concatenate(([self._last[0]], f))
+            psd = dict((k, np.concatenate(([self._last[1][k]], v))) for k, v in psd.items())
+        self._last = (f[-1], dict((k, v[-1]) for k, v in psd.items()))
+
+        band = np.searchsorted(self.edges, f[:-1], side='right') - 1
+        inside = (band >= 0) & (band < len(self.edges) - 1)
+        df = np.diff(f)
+        for k, v in psd.items():
+            area = 0.5*(v[:-1] + v[1:])*df
+            self.power[k] += float(np.sum(area))
+            self.band_power[k] += np.bincount(band[inside], weights=area[inside], minlength=len(self.edges) - 1)
+
+        if precision_error is not None:
+            if self.precision_error is None:
+                self.precision_error = {}
+            for k, e in precision_error.items():
+                self.precision_error[k] = max(self.precision_error.get(k, 0.0), e)
+
+    def rms(self, key='en_total_input'):
+        """RMS noise in V over the grid."""
+        return np.sqrt(self.power[key])
+
+    def band_rms(self, key='en_total_input'):
+        """RMS noise in V per band."""
+        return np.sqrt(self.band_power[key])
+
+    def dominant(self):
+        """List of (f1, f2, source with the most power) per band, source None if no point is in it."""
+        power = np.array([self.band_power[k] for k in self.sources])
+        bands = []
+        for i in range(len(self.edges) - 1):
+            name = self.sources[np.argmax(power[:, i])] if np.any(power[:, i] > 0) else None
+            bands.append((self.edges[i], self.edges[i + 1], name))
+        return bands
+
+    def summary(self):
+        """Text summary of the integrated noise and the dominant source per band."""
+        lines = ['integrated noise {0:.4g} - {1:.4g} Hz: '.format(self.edges[0], self.edges[-1]) +
+                 ', '.join('{0:s} {1:.3e} V rms'.format(k, self.rms(k)) for k in TOTALS)]
+        total = self.band_power['en_total_input']
+        for i, (f1, f2, name) in enumerate(self.dominant()):
+            if name is not None:
+                lines.append('  {0:.4g} - {1:.4g} Hz: {2:s} ({3:.0f}% of the input noise power)'.format(
+                    f1, f2, name, 100*self.band_power[name][i]/total[i]))
+        return '\n'.join(lines)
+
+
+def stream_budget(budget, path, chunk=10**6, fmin=None, fmax=None, num=None, bands=None, gains=False):
+    """Evaluate a noise budget chunk by chunk into the result file path.
+
+    Use a NoiseBudget with cache=False, the cache would only keep the
+    intermediates of the last chunk. In single precision every chunk is
+    spot-checked (config.check_points frequencies each).
+
+    Arguments:
+    budget: noise_budget.NoiseBudget
+    path: result file, uncompressed so it can be memory-mapped (see result_io)
+    chunk: number of frequencies evaluated at once
+    fmin, fmax, num: log spaced grid (default those of budget.config)
+    bands: band edges of the per band power (default decades, see decade_bands)
+    gains: also save the gains
+
+    Returns StreamResult.
+    """
+    c = budget.config
+    fmin = c.fmin if fmin is None else fmin
+    fmax = c.fmax if fmax is None else fmax
+    num = c.num if num is None else int(num)
+    edges = decade_bands(fmin, fmax) if bands is None else bands
+
+    writer = None
+    stream = None
+    try:
+        for start, f in log_chunks(fmin, fmax, num, int(chunk)):
+            with profiling.stage('chunk', num=len(f)):
+                res = budget.evaluate(f)
+            arrays = result_io.result_arrays(res, gains)
+            if writer is None:
+                writer = result_io.ResultWriter(path, dict((k, np.result_type(v)) for k, v in arrays.items()), num)
+                stream = StreamResult(writer.path, res.noise_sources, edges)
+            with profiling.stage('write', num=len(f)):
+                writer.write(start, arrays)
+            stream.update(arrays, res.precision_error)
+    finally:
+        if writer is not None:
+            writer.close()
+    return stream
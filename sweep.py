@@ -0,0 +1,110 @@
+"""Broadcast parameter sweeps of the noise budget.
+
+Example:
+    res = sweep({'Z1_MC.Cdet': [100e-12, 200e-12], 'Z2.Rfb': np.logspace(8,10,5)},
+                np.logspace(0,6,1000))
+    res['en_total_output'].shape   # (2, 5, 1000)
+"""
+
+import numpy as np
+import noise_budget
+
+
+class SweepResult(object):
+
+    """Result of a parameter sweep.
+
+    Every array has shape (len(values[0]), len(values[1]), ..., len(f_arr)).
+    """
+
+    def __init__(self, params, values, f_arr, data):
+        """ Arguments:
+        params: list of parameter names, one per grid axis
+        values: list of parameter values, one per grid axis
+        f_arr: frequencies
+        data: dict of output name to array
+        """
+        self.params = params
+        self.values = values
+        self.f_arr = f_arr
+        self.data = data
+
+    @property
+    def shape(self):
+        return tuple(len(v) for v in self.values) + (len(self.f_arr),)
+
+    def keys(self):
+        return self.data.keys()
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+
+def lookup(budget, key):
+    """Find key among the totals, noise sources, noise and gains of a budget."""
+    if key in budget:
+        return budget[key]
+    for group in ('noise_sources', 'noise', 'gains'):
+        if key in budget[group]:
+            return budget[group][key]
+    raise KeyError(key)
+
+
+def chunk_size_for(f_arr, n_arrays, max_memory):
+    """Number of grid points per chunk keeping n_arrays complex arrays below max_memory bytes."""
+    per_point = 16*len(f_arr)*n_arrays
+    return max(1, int(max_memory//per_point))
+
+
+def sweep(params, f_arr, circuits=None, keys=None, chunk_size=None, max_memory=256e6,
+          T_4K=4.0, T_300K=300.0, closed_loop='Atotal_closed'):
+    """Evaluate the noise budget on the grid spanned by params.
+
+    The parameter values of a chunk of grid points are set as (n, 1)
+    arrays on the circuits so the whole chain broadcasts against f_arr
+    in one evaluation.
+
+    Arguments:
+    params: dict of parameter ('Z2.Rfb', 'hemt.gm', ...) to 1D values
+    f_arr: frequencies
+    circuits: circuits of the chain (default noise_budget.make_circuits(T_4K, T_300K))
+    keys: outputs to keep, names of gains, noise sources or totals
+          (default SWEEP_KEYS and all noise sources)
+    chunk_size: number of grid points per evaluation (default from max_memory)
+    max_memory: approximate bound in bytes for the intermediates of a chunk
+    """
+    if circuits is None:
+        circuits = noise_budget.make_circuits(T_4K, T_300K)
+    f_arr = np.asarray(f_arr, dtype=float)
+
+    names = list(params)
+    values = [np.atleast_1d(np.asarray(params[n], dtype=float)) for n in names]
+    grid = [g.ravel() for g in np.meshgrid(*values, indexing='ij')]
+    npts = grid[0].size if grid else 1
+
+    plan = noise_budget.charge_circuit(circuits).compile()
+    if chunk_size is None:
+        chunk_size = chunk_size_for(f_arr, len(plan) + 20, max_memory)
+
+    saved = [noise_budget.get_param(circuits, n) for n in names]
+    data = {}
+    try:
+        for start in range(0, npts, chunk_size):
+            stop = min(start + chunk_size, npts)
+            for n, g in zip(names, grid):
+                noise_budget.set_param(circuits, n, g[start:stop, np.newaxis])
+            budget = noise_budget.evaluate(f_arr, circuits, T_4K, T_300K, closed_loop, plan=plan)
+            if keys is None:
+                keys = list(noise_budget.SWEEP_KEYS) + list(budget['noise_sources'])
+            for k in keys:
+                val = lookup(budget, k)
+                if k not in data:
+                    data[k] = np.empty((npts, len(f_arr)), dtype=np.result_type(val))
+                data[k][start:stop] = val
+    finally:
+        for n, v in zip(names, saved):
+            noise_budget.set_param(circuits, n, v)
+
+    shape = tuple(len(v) for v in values) + (len(f_arr),)
+    data = {k: v.reshape(shape) for k, v in data.items()}
+    return SweepResult(names, values, f_arr, data)
@@ -0,0 +1,42 @@
+import argparse
+import numpy as np
+import pytest
+import adaptive_grid
+import noise_budget
+import noise_model
+
+
+def test_refines_within_tolerance():
+    pole = lambda f: 1.0/(1 + 1j*f/1e3)
+    f, v = adaptive_grid.adaptive_grid(pole, 1.0, 1e6, num=7, tol=0.01)
+    assert f[0] == 1.0 and np.isclose(f[-1], 1e6)
+    assert np.all(np.diff(f) > 0)
+    assert len(f) > 7
+    fm = np.sqrt(f[:-1]*f[1:])
+    interp = np.exp(np.interp(np.log(fm), np.log(f), np.log(np.abs(v))))
+    assert np.max(np.abs(interp/np.abs(pole(fm)) - 1)) < 0.01
+
+
+def test_budget_grid_band():
+    budget = noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(fmin=10.0, fmax=1e4))
+    f = adaptive_grid.budget_grid(budget, budget.config.fmin, budget.config.fmax, num=5)
+    assert np.isclose(f[0], 10.0) and np.isclose(f[-1], 1e4)
+
+
+def _args(**kwargs):
+    args = dict(makeplots=False, savename=None, debug=False, show=False, logy=False, drainI=0.001, T_4K=4.0,
+                T_300K=300.0, num=20, adaptive=False, tol=0.01, jobs=None, report=None, uncompressed=False,
+                savegains=False, single=False, chunk=None, profile=None, trace=None)
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+
+def test_cli_rejects_short_grid():
+    with pytest.raises(ValueError):
+        noise_model.main(_args(adaptive=True, num=1))
+
+
+def test_cli_adaptive():
+    res = noise_model.main(_args(adaptive=True, num=5))
+    assert res.f_arr[0] == 1.0 and np.isclose(res.f_arr[-1], 1e6)
+    assert len(res.f_arr) > 5
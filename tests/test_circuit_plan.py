@@ -0,0 +1,52 @@
+import numpy as np
+import impedance as Q
+import noise_budget
+
+F = np.logspace(0, 6, 100)
+
+
+def test_shared_steps_computed_once():
+    chain = Q.ChargeCircuit('chain')
+    r, c = Q.Resistor(1e3, 'R'), Q.Capacitor(1e-9, 'C')
+    a = chain.define('a', Q.Parallel(Q.Impedance(r), Q.Impedance(c)))
+    b = chain.define('b', Q.Parallel(Q.Impedance(c), Q.Impedance(r)))
+    chain.define('ratio', a/b)
+    plan = chain.compile()
+    # R, C, one parallel (commutative) and the quotient
+    assert len(plan) == 4
+    out = plan.evaluate(F)
+    assert np.allclose(out['ratio'], 1.0)
+    assert np.allclose(out['a'], Q.parallel(r.Z(F), c.Z(F)))
+
+
+def test_closed_loop_gain_formula():
+    circuits = noise_budget.make_circuits()
+    g = noise_budget.charge_circuit(circuits).compile().evaluate(F)
+    # the formulas of the original noise_model.py
+    Aopen = circuits['opamp'].Aopen_gary(F, flat=2e7, pole1=0.5, pole2=80e3)
+    Z5, Z6 = circuits['Z5'].Z_tot(F), circuits['Z6'].Z_tot(F)
+    B = Z5/(Z5 + Z6)
+    Z3 = circuits['Z3'].Z_tot(F)
+    Z_load = Z3 + circuits['bjt'].Z_tot(F)
+    Atotal_open = Aopen/(1 + Aopen*B)*circuits['hemt'].gm*Z_load*(Z3/Z_load)
+    Z_input_4K = Q.parallel(circuits['hemt'].Z_tot(F), circuits['Z1_g'].Z_tot(F) + 1e19)
+    Z2 = circuits['Z2'].Z_tot(F)
+    H_fb = Z_input_4K/(Z_input_4K + Z2)
+    H_in = -Z2/(Z_input_4K + Z2)
+    assert np.allclose(g['Atotal_closed'], H_in*Atotal_open/(1 + Atotal_open*H_fb), rtol=1e-12)
+
+
+def test_dirty_steps():
+    circuits = noise_budget.make_circuits()
+    plan = noise_budget.charge_circuit(circuits).compile()
+    values, changed = plan.evaluate_steps(F)
+    assert len(changed) == len(plan)
+    circuits['Z2'].Rfb.value = 1e9
+    dirty = plan.depending_on(circuits['Z2'], 'Rfb')
+    assert dirty == [plan.outputs['Z_Z2']]
+    values, changed = plan.evaluate_steps(F, values, dirty)
+    assert plan.outputs['Aopen'] not in changed
+    assert plan.outputs['Atotal_closed'] in changed
+    full = plan.evaluate(F)
+    for name, i in plan.outputs.items():
+        assert np.array_equal(values[i], full[name])
@@ -0,0 +1,27 @@
+import pickle
+import numpy as np
+import noise_budget
+import source_registry
+import fitting
+
+
+def test_default_config_pickles():
+    config = noise_budget.NoiseBudgetConfig()
+    config.sources = source_registry.thermal_sources(config.circuits)
+    config.sources.add(source_registry.hemt_gate_current_noise(1e-12))
+    config.sources.add(source_registry.mc_resistor_noise('Rbias', T=0.05))
+    copy = pickle.loads(pickle.dumps(config))
+    f = np.logspace(0, 6, 20)
+    a = noise_budget.NoiseBudget(config).evaluate(f)
+    b = noise_budget.NoiseBudget(copy).evaluate(f)
+    assert np.allclose(a.en_total_output, b.en_total_output, rtol=1e-14)
+
+
+def test_fit_multistart_in_pool():
+    f = np.logspace(1, 5, 40)
+    data = noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(f_arr=f)).evaluate().en_total_output
+    res = fitting.fit(f, data, {'hemt.fc': 1e3, 'hemt.vflat': 3e-10}, config=noise_budget.NoiseBudgetConfig(),
+                      n_starts=2, processes=2, seed=0)
+    assert len(res.costs) == 2
+    assert np.isclose(res.params['hemt.fc'], 1.2e3, rtol=1e-4)
+    assert np.isclose(res.params['hemt.vflat'], 0.24e-9, rtol=1e-4)
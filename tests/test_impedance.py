@@ -0,0 +1,39 @@
+import os
+import cmath
+import numpy as np
+import impedance as Q
+import noise_budget
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# values of the original per-element implementation, see benchmarks.make_reference
+REFERENCE = os.path.join(os.path.dirname(HERE), 'benchmark_reference.npz')
+
+
+def test_z_tot_matches_original():
+    f = np.logspace(0, 6, 1000)
+    circuits = noise_budget.make_circuits()
+    with np.load(REFERENCE) as ref:
+        for name, c in circuits.items():
+            if isinstance(c, Q.OpAmp):
+                continue
+            Z = np.broadcast_to(c.Z_tot(f), f.shape)
+            assert np.allclose(Z, ref['Z_tot.' + name], rtol=1e-12, atol=0), name
+        opamp = circuits['opamp']
+        assert np.allclose(opamp.Aopen(f), ref['opamp.Aopen'], rtol=1e-12)
+        assert np.allclose(opamp.Aopen_gary(f), ref['opamp.Aopen_gary'], rtol=1e-12)
+
+
+def test_scalar_and_array_agree():
+    f = np.logspace(0, 6, 11)
+    c = Q.Z1_MC('Z1_MC')
+    Z = c.Z_tot(f)
+    assert Z.shape == f.shape
+    assert np.allclose([c.Z_tot(x) for x in f], Z, rtol=1e-14)
+
+
+def test_to_np_array_falls_back_to_loop():
+    Z = Q.Z2('Z2').Z_tot(np.logspace(0, 6, 7))
+    assert np.allclose(Q.to_np_array(cmath.phase, Z), np.angle(Z))
+    f = np.logspace(0, 6, 7)
+    assert np.array_equal(Q.to_np_array(Q.Z2('Z2').Z_tot, f), Q.Z2('Z2').Z_tot(f))
@@ -0,0 +1,7 @@
+import import_budget
+
+
+def test_compute_path_does_not_import_matplotlib():
+    t_np, t_mod, mpl = import_budget.measure(repeat=1)
+    assert not mpl
+    assert t_mod > 0
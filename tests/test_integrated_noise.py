@@ -0,0 +1,49 @@
+import numpy as np
+import noise_budget
+import integrated_noise
+import source_registry
+
+
+def _trapz(y, x):
+    return np.sum(0.5*(y[1:] + y[:-1])*np.diff(x))
+
+
+def test_closed_forms_match_quadrature():
+    f = np.logspace(0, 5, 200001)
+    psd = np.square((1e3/f + 1)*1e-9)
+    expected = _trapz(psd, f)
+    assert np.isclose(integrated_noise.flicker_white_power(1e3, 1e-9, 1.0, 1e5), expected, rtol=1e-6)
+    assert np.isclose(integrated_noise.white_power(2.0, 10.0, 30.0), 80.0)
+
+
+def test_adaptive_quad_of_a_lorentzian():
+    # integral of 1/(1 + (f/fc)**2) = fc*arctan(f/fc)
+    fc = 1e3
+    edges = np.array([1.0, 1e2, 1e4, 1e6])
+    parts, n_eval = integrated_noise.adaptive_quad(lambda f: {'x': 1.0/(1 + np.square(f/fc))}, edges, rtol=1e-10)
+    expected = np.diff(fc*np.arctan(edges/fc))
+    assert np.allclose(parts['x'], expected, rtol=1e-9)
+    assert n_eval % 15 == 0
+
+
+def test_budget_integral_matches_dense_grid():
+    budget = noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(num=30))
+    res = integrated_noise.integrated_noise(budget, fmin=1.0, fmax=1e5, num=11)
+    assert np.all(np.diff(res.power['en_total_input']) >= 0)
+    f = np.logspace(0, 5, 400001)
+    dense = budget.evaluate(f)
+    for key, v in (('en_total_input', dense.en_total_input), ('en_total_output', dense.en_total_output),
+                   ('en_HEMT', dense.noise_sources['en_HEMT'])):
+        expected = _trapz(np.square(np.abs(v)), f)
+        assert np.isclose(res.power[key][-1], expected, rtol=1e-4), key
+
+    band = integrated_noise.band_noise(budget, 1e2, 1e4)
+    assert np.isclose(band['en_total_input'], res.band('en_total_input', 1e2, 1e4), rtol=1e-5)
+
+
+def test_replaced_source_is_integrated_numerically():
+    # a white en_HEMT replacing the 1/f model must not get the flicker closed form
+    budget = noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(num=30))
+    budget.add_source(source_registry.NoiseSource('en_HEMT', lambda ctx: np.full_like(ctx.f_arr, 1e-9)), replace=True)
+    res = integrated_noise.integrated_noise(budget, np.array([1.0, 1e3, 1e5]))
+    assert np.allclose(res.power['en_HEMT'], [0.0, 1e-18*999, 1e-18*(1e5 - 1)], rtol=1e-9)
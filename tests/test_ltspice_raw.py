@@ -0,0 +1,57 @@
+import os
+import numpy as np
+import ltspice_raw
+
+LTSPICE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'LTspice')
+
+
+def write_raw(path, names, columns, flags, encoding='latin-1'):
+    header = ['Title: test', 'Plotname: AC Analysis', 'Flags: ' + flags,
+              'No. Variables: {0:d}'.format(len(names)), 'No. Points: {0:d}'.format(len(columns[0])), 'Variables:']
+    header += ['\t{0:d}\t{1:s}\tvoltage'.format(i, n) for i, n in enumerate(names)]
+    header.append('Binary:\n')
+    if 'complex' in flags:
+        dtypes = ['<c16']*len(names)
+    elif 'double' in flags:
+        dtypes = ['<f8']*len(names)
+    else:
+        dtypes = ['<f8'] + ['<f4']*(len(names) - 1)
+    with open(path, 'wb') as fp:
+        fp.write('\n'.join(header).encode(encoding))
+        if 'fastaccess' in flags:
+            for c, dt in zip(columns, dtypes):
+                fp.write(np.asarray(c, dtype=dt).tobytes())
+        else:
+            rec = np.empty(len(columns[0]), dtype=list(zip(names, dtypes)))
+            for n, c in zip(names, columns):
+                rec[n] = c
+            fp.write(rec.tobytes())
+
+
+def test_ltspice_noise_file():
+    raw = ltspice_raw.read_raw(os.path.join(LTSPICE, 'hemt-noise-4K.raw'))
+    assert raw.n_points == 501
+    assert raw.names()[0] == 'frequency' and 'V(inoise)' in raw
+    f = raw.axis
+    assert f.dtype == np.float64 and raw['V(inoise)'].dtype == np.float32
+    assert np.isclose(f[0], 10.0) and np.all(np.diff(f) > 0)
+    assert np.all(raw['V(onoise)'] > 0)
+
+
+def test_layouts(tmp_path):
+    f = np.logspace(0, 3, 7)
+    v = np.arange(7)*(1 + 0.5j)
+    for flags, encoding, column in (('real forward log', 'latin-1', v.real), ('real double', 'utf-16-le', v.real),
+                                    ('complex forward', 'latin-1', v), ('complex fastaccess', 'utf-16-le', v)):
+        path = str(tmp_path/'test.raw')
+        write_raw(path, ['frequency', 'V(out)'], [f, column], flags, encoding)
+        raw = ltspice_raw.read_raw(path)
+        assert np.allclose(raw['frequency'], f, rtol=1e-15)
+        assert np.allclose(raw['V(out)'], column, rtol=1e-7)
+
+
+def test_steps(tmp_path):
+    f = np.concatenate((np.logspace(0, 3, 4), np.logspace(0, 3, 4)))
+    path = str(tmp_path/'step.raw')
+    write_raw(path, ['frequency', 'V(out)'], [f, np.ones(8)], 'real forward log stepped')
+    assert ltspice_raw.read_raw(path).steps() == [slice(0, 4), slice(4, 8)]
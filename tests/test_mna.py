@@ -0,0 +1,60 @@
+import os
+import numpy as np
+import pytest
+import impedance as Q
+import ltspice_raw
+import mna
+
+
+LTSPICE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'LTspice')
+
+RC = """RC low pass
+V1 in 0 DC 1 AC 1
+R1 in out 1k temp=-269
+C1 out 0 1u
+R2 out 0 1Meg noiseless
+.noise V(out) V1 dec 10 1 1Meg
+.end
+"""
+
+
+def test_parse_value():
+    assert mna.parse_value('1Meg') == 1e6
+    assert mna.parse_value('-190m') == pytest.approx(-0.19)
+    assert mna.parse_value('92pF') == pytest.approx(92e-12)
+    assert mna.parse_value('2.5') == 2.5
+    with pytest.raises(ValueError):
+        mna.parse_value('abc')
+
+
+def test_rc_noise_and_gain():
+    net = mna.Netlist().parse(RC)
+    assert net.title == 'RC low pass'
+    m = mna.MNA(net)
+    op = m.operating_point()
+    R = 1e3*1e6/(1e3 + 1e6)
+    assert op['V(out)'] == pytest.approx(R/1e3)
+    res = m.noise(op=op)
+    f = res['frequency']
+    assert len(f) == 61 and f[-1] == pytest.approx(1e6)
+    H = R/1e3/(1 + 2j*np.pi*f*R*1e-6)
+    assert np.allclose(res['gain'], np.abs(H), rtol=1e-12)
+    expected = np.sqrt(4*Q.kB*4.15/1e3)*np.abs(H)*1e3
+    assert np.allclose(res['V(r1)'], expected, rtol=1e-9)
+    assert np.allclose(res['V(onoise)'], expected, rtol=1e-9)
+    assert np.allclose(res['V(inoise)'], np.sqrt(4*Q.kB*4.15*1e3), rtol=1e-9)
+
+
+def test_hemt_matches_ltspice():
+    net = mna.read_netlist(os.path.join(LTSPICE, 'hemt-noise-4K.net'))
+    m = mna.MNA(net)
+    op = m.operating_point()
+    op_raw = ltspice_raw.read_raw(os.path.join(LTSPICE, 'hemt-noise-4K.op.raw'))
+    for name, err in mna.compare(op, op_raw).items():
+        assert err < 1e-6, name
+    raw = ltspice_raw.read_raw(os.path.join(LTSPICE, 'hemt-noise-4K.raw'))
+    res = m.noise(f=np.asarray(raw.axis, dtype=float), op=op)
+    diff = mna.compare(res, raw)
+    assert {'gain', 'V(onoise)', 'V(inoise)', 'V(j2.sid)'} <= set(diff)
+    for name, err in diff.items():
+        assert err < 1e-6, name
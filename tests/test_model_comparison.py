@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+import noise_budget
+import model_comparison
+
+
+def test_loglog_interp_is_exact_on_power_laws():
+    xp = np.logspace(0, 4, 5)
+    x = np.array([3.0, 30.0, 3e3])
+    assert np.allclose(model_comparison.loglog_interp(x, xp, 2.0/np.sqrt(xp)), 2.0/np.sqrt(x), rtol=1e-12)
+    # unsorted grid
+    assert np.allclose(model_comparison.loglog_interp(x, xp[::-1], xp[::-1]**2), x**2, rtol=1e-12)
+
+
+def test_residuals_and_bands():
+    freq = np.array([2.0, 5.0, 20.0, 50.0, 500.0])
+    model = np.full(5, 1e-8)
+    data = model*np.array([1.1, 0.9, 1.2, 1.2, 1.0])
+    cmp = model_comparison.compare(freq, data, freq_model=np.array([1.0, 1e3]), model=np.array([1e-8, 1e-8]))
+    assert np.allclose(cmp.relative, [0.1, -0.1, 0.2, 0.2, 0.0])
+    assert np.allclose(cmp.bands, [1.0, 10.0, 100.0, 1000.0])
+    assert np.array_equal(cmp.band_count, [2, 2, 1])
+    assert np.allclose(cmp.band_rms, [0.1, 0.2, 0.0])
+    assert np.isclose(cmp.chi2, 0.01 + 0.01 + 0.04 + 0.04)
+
+
+def test_budget_at_measured_frequencies():
+    freq = np.logspace(1, 5, 30)
+    budget = noise_budget.NoiseBudget()
+    data = budget.evaluate(freq).en_total_output
+    cmp = model_comparison.compare(freq, data, budget=budget)
+    assert cmp.rms < 1e-14
+    with pytest.raises(ValueError):
+        model_comparison.compare(freq, data)
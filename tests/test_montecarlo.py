@@ -0,0 +1,53 @@
+import numpy as np
+import noise_budget
+import montecarlo
+
+F = np.logspace(0, 6, 20)
+
+
+def test_running_stats_match_numpy():
+    x = np.random.default_rng(1).normal(size=(1000, 5))
+    stats = montecarlo.RunningStats(5)
+    for i in range(0, 1000, 300):
+        stats.update(x[i:i + 300])
+    assert stats.n == 1000
+    assert np.allclose(stats.mean, x.mean(axis=0), rtol=1e-12)
+    assert np.allclose(stats.var, x.var(axis=0, ddof=1), rtol=1e-12)
+
+
+def test_quantile_sketch_accuracy():
+    x = np.random.default_rng(2).lognormal(size=(20001, 3))
+    sketch = montecarlo.QuantileSketch(3, alpha=0.01)
+    sketch.update(x[:10000])
+    other = montecarlo.QuantileSketch(3, alpha=0.01)
+    other.update(x[10000:])
+    sketch.merge(other)
+    for q in (0.05, 0.5, 0.95):
+        exact = np.quantile(x, q, axis=0, method='lower')
+        assert np.all(np.abs(sketch.quantile(q)/exact - 1) <= 0.0101)
+
+
+def test_reproducible_across_processes():
+    tol = montecarlo.component_tolerances(noise_budget.make_circuits(), resistor=0.05, capacitor=0.10)
+    kwargs = dict(n_draws=200, seed=3, task_size=50, batch_size=25)
+    serial = montecarlo.monte_carlo(tol, F, processes=1, **kwargs)
+    pooled = montecarlo.monte_carlo(tol, F, processes=2, **kwargs)
+    assert serial.n == 200
+    assert np.array_equal(serial.mean(), pooled.mean())
+    assert np.array_equal(serial.quantile(0.9), pooled.quantile(0.9))
+    nominal = noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(f_arr=F)).evaluate().en_total_output
+    assert np.all(np.abs(serial.mean()/nominal - 1) < 0.2)
+
+
+def test_device_parameters_are_perturbed():
+    circuits = noise_budget.make_circuits()
+    tol = montecarlo.component_tolerances(circuits)
+    for p, t in montecarlo.DEVICE.items():
+        assert tol[p] == t
+    assert 'hemt.gm' not in montecarlo.component_tolerances(circuits, device=None)
+
+    gm = noise_budget.get_param(circuits, 'hemt.gm')
+    res = montecarlo.monte_carlo({'hemt.gm': 0.1}, F, 100, circuits=circuits, seed=4, processes=1,
+                                 keys=('Aopen_HEMT',), batch_size=50)
+    assert noise_budget.get_param(circuits, 'hemt.gm') == gm
+    assert np.all(res.std('Aopen_HEMT') > 0.01*res.mean('Aopen_HEMT'))
@@ -0,0 +1,62 @@
+import os
+import numpy as np
+import pytest
+import noise_budget
+import sensitivity
+
+REFERENCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmark_reference.npz')
+
+
+def make_budget(num=50):
+    return noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(num=num))
+
+
+def test_matches_original_model():
+    with np.load(REFERENCE) as z:
+        ref = dict((k[len('budget.20.'):], z[k]) for k in z.files if k.startswith('budget.20.'))
+    res = noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(num=20)).evaluate()
+    d = res.to_dict()
+    assert sorted(d) == sorted(ref)
+    for k, v in d.items():
+        assert np.allclose(v, ref[k], rtol=1e-12, atol=0), k
+
+
+def test_config_params():
+    config = noise_budget.NoiseBudgetConfig(num=10, params={'Z2.Rfb': 1e9, 'hemt.gm': 20})
+    assert config.circuits['Z2'].Rfb.value == 1e9
+    assert noise_budget.get_param(config.circuits, 'hemt.gm') == 20
+    nb = noise_budget.NoiseBudget(config)
+    assert nb.get('Z2.Rfb') == 1e9
+    assert nb.evaluate().en_total_output.shape == (10,)
+
+
+def test_detector_closed_loop():
+    f = np.logspace(0, 6, 10)
+    res = noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(f_arr=f, closed_loop='Atotal_closed_det')).evaluate()
+    assert np.allclose(res.en_total_output, res.en_total_input*np.abs(res.gains['Atotal_closed_det']), rtol=1e-14)
+
+
+@pytest.mark.parametrize('path', ['Z2.Rfb', 'Z2.Rfb.value', 'Z2.Cfb.value'])
+def test_incremental_matches_fresh(path):
+    nb = make_budget()
+    nb.evaluate()
+    value = 3*nb.get(path)
+    nb.set(path, value)
+    res = nb.evaluate()
+    fresh = noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(num=50, params={path: value})).evaluate()
+    assert np.allclose(res.en_total_output, fresh.en_total_output, rtol=1e-12)
+    for k, v in fresh.noise_sources.items():
+        assert np.allclose(res.noise_sources[k], v, rtol=1e-12)
+
+
+def test_evaluate_after_sensitivity():
+    nb = make_budget()
+    nb.evaluate()
+    sensitivity.sensitivity(nb)
+    res = nb.evaluate()
+    fresh = make_budget().evaluate()
+    for k in ('en_total_input', 'en_total_output'):
+        assert type(getattr(res, k)) is np.ndarray
+        assert np.allclose(getattr(res, k), getattr(fresh, k), rtol=1e-12)
+    for k, v in res.noise_sources.items():
+        assert type(v) is np.ndarray
@@ -0,0 +1,31 @@
+import os
+import numpy as np
+import pytest
+import plot_render
+
+pytest.importorskip('matplotlib')
+
+
+def _specs(path):
+    f = np.logspace(0, 6, 50)
+    z = 1e6/(1 + 1j*f/1e3)
+    return [plot_render.PlotSpec('impedance', str(path / 'z.png'), note='Z').add(f, z, 'Z'),
+            plot_render.PlotSpec('noise', str(path / 'en.png')).add(f, np.abs(z)*1e-15).add(f, 1e-9 + 0*f, 'flat'),
+            plot_render.PlotSpec('noise', None).add(f, np.abs(z))]
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_render_batch_saves_named_specs(tmp_path, processes):
+    plot_render.render_batch(_specs(tmp_path), processes=processes)
+    assert sorted(os.listdir(tmp_path)) == ['en.png', 'z.png']
+    for name in ('en.png', 'z.png'):
+        with open(str(tmp_path / name), 'rb') as fp:
+            assert fp.read(8) == b'\x89PNG\r\n\x1a\n'
+
+
+def test_report_has_a_page_per_spec(tmp_path):
+    report = str(tmp_path / 'report.pdf')
+    plot_render.render_batch(_specs(tmp_path), report=report)
+    assert os.listdir(tmp_path) == ['report.pdf']
+    with open(report, 'rb') as fp:
+        assert b'/Count 3' in fp.read()
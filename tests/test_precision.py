@@ -0,0 +1,42 @@
+import warnings
+import numpy as np
+import pytest
+import noise_budget
+
+
+F = np.logspace(0, 6, 500)
+
+
+def test_lean_evaluation_matches_full():
+    plan = noise_budget.charge_circuit(noise_budget.make_circuits()).compile()
+    full = plan.evaluate(F)
+    lean = plan.evaluate_lean(F, dtype=np.complex128)
+    assert sorted(lean) == sorted(full)
+    for k in full:
+        assert np.allclose(lean[k], full[k], rtol=1e-14, atol=0), k
+    keep = ['Aopen_HEMT', 'Atotal_closed']
+    lean = plan.evaluate_lean(F, keep)
+    assert sorted(lean) == keep
+    for k in keep:
+        assert lean[k].dtype in (np.complex64, np.float32)
+        assert np.allclose(lean[k], full[k], rtol=1e-4), k
+
+
+def test_single_precision_budget():
+    double = noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(f_arr=F)).evaluate()
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        res = noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(f_arr=F, precision='single')).evaluate()
+    assert res.en_total_input.dtype == np.float32
+    assert res.en_total_output.dtype == np.float32
+    assert max(res.precision_error.values()) < noise_budget.SINGLE_RTOL
+    for k in ('en_total_input', 'en_total_output'):
+        err = np.max(np.abs(getattr(res, k)/getattr(double, k) - 1))
+        assert err < noise_budget.SINGLE_RTOL, k
+        assert res.precision_error[k] <= err
+    assert double.precision_error is None
+
+
+def test_invalid_precision():
+    with pytest.raises(ValueError):
+        noise_budget.NoiseBudgetConfig(precision='half')
@@ -0,0 +1,64 @@
+import json
+import numpy as np
+import noise_budget
+import profiling
+
+
+def test_disabled_stage_is_shared_noop():
+    p = profiling.Profiler()
+    with p.stage('a'):
+        pass
+    assert p.stage('a') is p.stage('b')
+    assert p.records == []
+
+
+def test_nested_stages_and_memory():
+    p = profiling.Profiler()
+    p.enable()
+    try:
+        with p.stage('outer', num=3):
+            with p.stage('inner'):
+                a = np.ones(10**6)
+            del a
+        with p.stage('inner'):
+            pass
+    finally:
+        p.disable()
+    outer = [r for r in p.records if r.name == 'outer'][0]
+    inner = [r for r in p.records if r.name == 'inner']
+    assert outer.depth == 0 and inner[0].depth == 1
+    assert outer.args == {'num': 3}
+    assert inner[0].peak >= 8*10**6
+    assert outer.peak >= inner[0].peak
+    assert outer.wall >= inner[0].wall
+    lines = p.summary().splitlines()
+    assert lines[1].split()[:2] == ['outer', '1']
+    assert lines[2].split()[:2] == ['inner', '2']
+
+
+def test_pipeline_stages_and_trace(tmp_path):
+    profiling.reset()
+    profiling.enable(memory=False)
+    try:
+        noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(num=50)).evaluate()
+    finally:
+        profiling.disable()
+    names = set(r.name for r in profiling.PROFILER.records)
+    profiling.reset()
+    assert 'summation' in names and 'noise.en_HEMT' in names
+    assert any(n.startswith('gain.') for n in names)
+
+    p = profiling.Profiler()
+    p.enable(memory=False)
+    with p.stage('a', num=2):
+        pass
+    p.disable()
+    path = str(tmp_path / 'trace.json')
+    p.save_chrome_trace(path)
+    with open(path) as fp:
+        event, = json.load(fp)['traceEvents']
+    assert event['name'] == 'a' and event['ph'] == 'X' and event['args']['num'] == 2
+    assert 'peak_bytes' not in event['args']
+    p.save_json(path)
+    with open(path) as fp:
+        assert json.load(fp)['records'][0]['peak'] is None
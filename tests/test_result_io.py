@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+import noise_budget
+import result_io
+
+
+def _result():
+    return noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(num=50)).evaluate()
+
+
+@pytest.mark.parametrize('compressed', [True, False])
+def test_round_trip(tmp_path, compressed):
+    res = _result()
+    arrays = result_io.result_arrays(res, gains=True)
+    path = str(tmp_path / 'model.npz')
+    result_io.save_result(path, arrays, compressed=compressed)
+    with result_io.load_result(path) as r:
+        assert r.version == result_io.FORMAT_VERSION
+        assert sorted(r.keys()) == sorted(arrays)
+        assert sorted(r.gains()) == sorted(res.gains)
+        for k, v in arrays.items():
+            assert np.array_equal(r[k], v), k
+        assert isinstance(r['en_total_output'], np.memmap) != compressed
+        with pytest.raises(KeyError):
+            r['format_version']
+    # loads without unpickling
+    with np.load(path, allow_pickle=False) as npz:
+        assert np.array_equal(npz['f_arr'], res.f_arr)
+
+
+def test_object_arrays_are_rejected(tmp_path):
+    with pytest.raises(TypeError):
+        result_io.save_result(str(tmp_path / 'bad.npz'), {'f_arr': np.array([1.0, None])})
+
+
+def test_legacy_files(tmp_path):
+    legacy = str(tmp_path / 'legacy.npz')
+    d = _result().to_dict()
+    np.savez_compressed(legacy, d)
+    with pytest.raises(ValueError, match='convert_legacy'):
+        result_io.load_result(legacy)
+    new = str(tmp_path / 'new.npz')
+    result_io.convert_legacy(legacy, new)
+    with result_io.load_result(new) as r:
+        for k, v in d.items():
+            assert np.array_equal(r[k], v)
+
+
+def test_newer_format_is_rejected(tmp_path):
+    path = str(tmp_path / 'future.npz')
+    np.savez(path, f_arr=np.ones(3), format_version=np.array(result_io.FORMAT_VERSION + 1))
+    with pytest.raises(ValueError, match='format version'):
+        result_io.load_result(path)
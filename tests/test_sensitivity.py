@@ -0,0 +1,43 @@
+import numpy as np
+import noise_budget
+import sensitivity
+
+
+F = np.logspace(0, 6, 40)
+PARAMS = ['Z2.Rfb', 'Z2.Cfb', 'Z1_MC.Cdet', 'hemt.gm', 'Z3.R113']
+
+
+def test_derivatives_match_finite_differences():
+    budget = noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(num=40))
+    s = sensitivity.sensitivity(budget, PARAMS, F)
+    for i, p in enumerate(PARAMS):
+        v = budget.get(p)
+        h = 1e-6*v
+        out = []
+        for x in (v + h, v - h):
+            budget.set(p, x)
+            out.append(budget.evaluate(F).en_total_output)
+        budget.set(p, v)
+        fd = (out[0] - out[1])/(2*h)
+        scale = np.max(np.abs(fd))
+        assert np.allclose(s.der['en_total_output'][i], fd, rtol=1e-5, atol=1e-6*scale), p
+
+
+def test_parameters_are_restored():
+    budget = noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(num=40))
+    before = budget.evaluate(F).en_total_input.copy()
+    s = sensitivity.sensitivity(budget, f_arr=F)
+    assert set(PARAMS) <= set(s.params)
+    assert np.allclose(s.value['en_total_input'], before, rtol=1e-12)
+    assert np.array_equal(budget.evaluate(F).en_total_input, before)
+
+
+def test_uncertainty_of_one_parameter():
+    budget = noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(num=40))
+    s = sensitivity.sensitivity(budget, PARAMS, F)
+    cov = sensitivity.covariance_from_tolerances(s, {'Z2.Rfb': 0.05})
+    expected = np.abs(s.der['en_total_output'][0])*0.05*s.values[0]
+    assert np.allclose(s.uncertainty(cov), expected, rtol=1e-12)
+    lo, hi = s.band(cov, k=2.0)
+    assert np.allclose(hi - lo, 4*expected, rtol=1e-9)
+    assert s.ranking()[0][1] >= s.ranking()[-1][1]
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+import impedance as Q
+import noise_budget
+import source_registry
+
+
+def test_registry_add_replace_remove():
+    reg = source_registry.default_sources()
+    assert reg.names() == ['en_Z2', 'en_HEMT', 'en_Z3', 'en_BJT-fix', 'en_opamp']
+    src = source_registry.hemt_gate_current_noise(1e-12)
+    reg.add(src)
+    with pytest.raises(ValueError):
+        reg.add(source_registry.hemt_gate_current_noise(2e-12))
+    other = reg.copy()
+    reg.add(source_registry.hemt_gate_current_noise(2e-12), replace=True)
+    assert other['en_HEMT_gate'] is src and reg['en_HEMT_gate'] is not src
+    reg.remove('en_HEMT_gate')
+    assert 'en_HEMT_gate' not in reg and len(reg) == 5 and len(other) == 6
+
+
+def test_quadrature_sum_updates():
+    rng = np.random.default_rng(1)
+    values = dict((k, rng.random(20)) for k in 'abcd')
+    q = source_registry.QuadratureSum(max_updates=1000)
+    for k, v in values.items():
+        q.set(k, v)
+    values['b'] = rng.random(20)
+    q.set('b', values['b'])
+    q.remove('c')
+    del values['c']
+    expected = np.sqrt(sum(np.square(v) for v in values.values()))
+    assert np.allclose(q.total(), expected, rtol=1e-12)
+    assert q.updates == 2
+    q.refresh()
+    assert q.updates == 0 and np.allclose(q.total(), expected, rtol=1e-14)
+    # a value of another shape recomputes the sum
+    q.set('a', np.ones((3, 1)))
+    assert q.total().shape == (3, 20)
+
+
+def test_sources_added_in_quadrature():
+    f = np.logspace(0, 6, 50)
+    base = noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(num=50)).evaluate(f)
+    config = noise_budget.NoiseBudgetConfig(num=50)
+    config.sources.add(source_registry.hemt_gate_current_noise(1e-12))
+    config.sources.add(source_registry.NoiseSource('en_flat', lambda ctx: np.full_like(ctx.f_arr, 1e-9)))
+    res = noise_budget.NoiseBudget(config).evaluate(f)
+    gate = res.noise_sources['en_HEMT_gate']
+    assert np.allclose(np.abs(gate), np.sqrt(2*Q.qE*1e-12)*np.abs(res.gains['Z_input_4K']), rtol=1e-12)
+    expected = np.sqrt(np.square(base.en_total_input) + np.square(np.abs(gate)) + 1e-18)
+    assert np.allclose(res.en_total_input, expected, rtol=1e-12)
@@ -0,0 +1,55 @@
+import os
+import glob
+import numpy as np
+import pytest
+import spectrum_data
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'noise_data')
+
+
+def write_capture(path, f, noise):
+    with open(path, 'w') as fp:
+        for a, b in zip(f, noise):
+            fp.write('{0:+e}\t   {1:+e}\n'.format(a, b))
+
+
+def test_capture_matches_loadtxt(tmp_path):
+    path = sorted(glob.glob(os.path.join(DATA, 'SCRN*.TXT')))[0]
+    a = spectrum_data.load_spectrum(path, cache_dir=str(tmp_path))
+    assert np.array_equal(a, np.loadtxt(path))
+
+
+def test_sidecar_cache(tmp_path):
+    path = str(tmp_path/'SCRN0001.TXT')
+    write_capture(path, [1.0, 2.0, 3.0], [1e-6, 2e-6, 3e-6])
+    a = spectrum_data.load_spectrum(path)
+    assert os.path.exists(spectrum_data.cache_path(path))
+    b = spectrum_data.load_spectrum(path)
+    assert isinstance(b, np.memmap)
+    assert np.array_equal(a, b)
+    # a changed capture rebuilds the cache
+    write_capture(path, [1.0, 2.0, 3.0, 4.0], [1e-6, 2e-6, 3e-6, 4e-6])
+    os.utime(path, (0, 12345))
+    assert spectrum_data.load_spectrum(path).shape == (4, 2)
+
+
+def test_load_spectra_unique(tmp_path):
+    p1, p2 = str(tmp_path/'a.TXT'), str(tmp_path/'b.TXT')
+    write_capture(p1, [1.0, 2.0, 3.0], [1.0, 1.0, 1.0])
+    write_capture(p2, [2.5, 3.5, 4.5], [2.0, 2.0, 2.0])
+    f, noise = spectrum_data.load_spectra([p1, p2], unique=True, cache=False)
+    assert np.array_equal(f, [1.0, 2.0, 3.0, 3.5, 4.5])
+    assert np.array_equal(noise, [1.0, 1.0, 1.0, 2.0, 2.0])
+
+
+def test_malformed_capture(tmp_path):
+    for name, text in (('bad', '1.0 2.0\n3.0 abc\n5.0 6.0\n7.0 8.0\n'), ('cols', '1 2\n3 4 5\n6\n')):
+        path = str(tmp_path/name)
+        with open(path, 'w') as fp:
+            fp.write(text)
+        with pytest.raises(ValueError):
+            spectrum_data.read_spectrum(path)
+    path = str(tmp_path/'blank')
+    with open(path, 'w') as fp:
+        fp.write('1 2\n\n3 4\n\n')
+    assert np.array_equal(spectrum_data.read_spectrum(path), [[1, 2], [3, 4]])
@@ -0,0 +1,56 @@
+import zipfile
+import numpy as np
+import pytest
+import noise_budget
+import result_io
+import streaming
+
+
+def test_log_chunks_equal_logspace():
+    for num, chunk in ((1000, 64), (1000, 1000), (7, 3), (1, 4)):
+        f = np.concatenate([c for i, c in streaming.log_chunks(1.0, 1e6, num, chunk)])
+        assert np.array_equal(f, np.logspace(0, 6, num)), (num, chunk)
+
+
+def test_stream_matches_evaluate(tmp_path):
+    num = 1000
+    config = noise_budget.NoiseBudgetConfig(num=num)
+    res = noise_budget.NoiseBudget(config).evaluate()
+    path = str(tmp_path / 'big.npz')
+    stream = streaming.stream_budget(noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(num=num), cache=False),
+                                     path, chunk=300, gains=True)
+    assert stream.path == path
+    with zipfile.ZipFile(path) as zf:
+        assert zf.testzip() is None
+    expected = result_io.result_arrays(res, gains=True)
+    with np.load(path, allow_pickle=False) as npz:
+        for k, v in expected.items():
+            assert np.array_equal(npz[k], v), k
+    with result_io.load_result(path) as r:
+        assert isinstance(r['en_total_output'], np.memmap)
+
+    f = res.f_arr
+    for k in ('en_total_input', 'en_Z2'):
+        v = res.en_total_input if k == 'en_total_input' else res.noise_sources[k]
+        power = np.sum(0.5*(v[1:]**2 + v[:-1]**2)*np.diff(f))
+        assert np.isclose(stream.power[k], power, rtol=1e-12), k
+        assert stream.maximum[k] == (v.max(), f[np.argmax(v)])
+    assert np.isclose(np.sum(stream.band_power['en_total_input']), stream.power['en_total_input'], rtol=1e-12)
+    assert len(stream.dominant()) == 6
+    assert 'integrated noise' in stream.summary()
+
+
+def test_writer_leaves_unwritten_points_zero(tmp_path):
+    path = str(tmp_path / 'part')
+    with result_io.ResultWriter(path, {'f_arr': float, 'x': np.float32}, 10) as w:
+        w.write(0, {'f_arr': np.arange(4.0), 'x': np.ones(4)})
+        with pytest.raises(ValueError):
+            w.write(5, {'f_arr': np.arange(2.0), 'x': np.ones(2)})
+        with pytest.raises(KeyError):
+            w.write(4, {'f_arr': np.arange(2.0)})
+    with zipfile.ZipFile(path + '.npz') as zf:
+        assert zf.testzip() is None
+    with result_io.load_result(path + '.npz') as r:
+        assert r['x'].dtype == np.float32
+        assert np.array_equal(r['x'], [1, 1, 1, 1, 0, 0, 0, 0, 0, 0])
+        assert np.array_equal(r['f_arr'][:4], np.arange(4.0))
@@ -0,0 +1,24 @@
+import numpy as np
+import noise_budget
+import sweep
+
+F = np.logspace(0, 6, 50)
+
+
+def test_sweep_matches_single_evaluations():
+    params = {'Z1_MC.Cdet': [100e-12, 200e-12], 'Z2.Rfb': [2e8, 4e8, 1e9]}
+    res = sweep.sweep(params, F, chunk_size=4)
+    assert res.shape == (2, 3, len(F))
+    assert res['en_total_output'].shape == res.shape
+    for i, Cdet in enumerate(params['Z1_MC.Cdet']):
+        for j, Rfb in enumerate(params['Z2.Rfb']):
+            config = noise_budget.NoiseBudgetConfig(f_arr=F, params={'Z1_MC.Cdet': Cdet, 'Z2.Rfb': Rfb})
+            ref = noise_budget.NoiseBudget(config).evaluate()
+            assert np.allclose(res['en_total_output'][i, j], ref.en_total_output, rtol=1e-12)
+            assert np.allclose(res['en_Z2'][i, j], ref.noise_sources['en_Z2'], rtol=1e-12)
+
+
+def test_sweep_restores_circuits():
+    circuits = noise_budget.make_circuits()
+    sweep.sweep({'Z2.Rfb': [1e8, 1e9]}, F, circuits=circuits)
+    assert noise_budget.get_param(circuits, 'Z2.Rfb') == 400e6
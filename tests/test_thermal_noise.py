@@ -0,0 +1,42 @@
+import numpy as np
+import impedance as Q
+import noise_budget
+import source_registry
+
+
+F = np.logspace(0, 6, 200)
+
+
+def test_derivative_matches_analytic():
+    # Rfb || Cfb: Z = R/(1 + jwRC), dZ/dR = 1/(1 + jwRC)**2
+    z2 = Q.Z2('Z2', Cfb=0.25e-12, Rfb=400e6)
+    T = 4.0
+    x = 1 + 2j*np.pi*F*400e6*0.25e-12
+    expected = np.sqrt(4*Q.kB*T*400e6*np.abs(1.0/x**2))
+    assert np.allclose(z2.thermal_noise(F, T, 'Rfb'), expected, rtol=1e-12)
+
+
+def test_sum_is_real_part_of_impedance():
+    for c in (Q.Z1_MC('Z1_MC', Cdet=200e-12, Rbias=100e6, Rbleed=100e6, Cc=10e-9), Q.Z3('Z3'), Q.Z5('Z5')):
+        noise = c.thermal_noise(F, T=300.0)
+        power = sum(np.square(v) for v in noise.values())
+        assert np.allclose(power, 4*Q.kB*300.0*c.Z_tot(F).real, rtol=1e-9)
+
+
+def test_single_precision_has_no_nan():
+    z6 = Q.Z6('Z6')
+    en = z6.thermal_noise(F.astype(np.float32), T=300.0)
+    for v in en.values():
+        assert v.dtype == np.float32
+        assert np.all(np.isfinite(v))
+
+
+def test_stage_temperatures_follow_config():
+    config = noise_budget.NoiseBudgetConfig(num=30, T_4K=2.0, T_300K=290.0)
+    assert config.circuits['Z2'].Rfb.T == 2.0
+    assert config.circuits['Z3'].R113.T == 290.0
+    assert config.circuits['Z1_MC'].Rbias.T == noise_budget.T_MC
+    lumped = noise_budget.NoiseBudget(config).evaluate().noise_sources['en_Z2']
+    config.sources = source_registry.thermal_sources(config.circuits)
+    res = noise_budget.NoiseBudget(config).evaluate()
+    assert np.allclose(res.noise_sources['en_Z2.Rfb'], lumped, rtol=1e-12)
@@ -0,0 +1,39 @@
+import argparse
+import numpy as np
+import pytest
+import noise_budget
+import tune_noise_model
+
+pytest.importorskip('matplotlib')
+
+
+def _view(params=tune_noise_model.PARAMS):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    budget = noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(num=200))
+    view = tune_noise_model.TuningView(budget, params, fig=fig)
+    fig.canvas.draw()
+    return view
+
+
+def test_slider_updates_curves():
+    view = _view()
+    view.sliders['Z2.Rfb'].set_val(np.log10(view.nominal['Z2.Rfb']) + 0.5)
+    fresh = noise_budget.NoiseBudgetConfig(num=200)
+    fresh.circuits['Z2'].Rfb.value = view.nominal['Z2.Rfb']*np.sqrt(10.0)
+    res = noise_budget.NoiseBudget(fresh).evaluate()
+    assert np.allclose(view.budget.get('Z2.Rfb'), view.nominal['Z2.Rfb']*np.sqrt(10.0), rtol=1e-12)
+    assert np.allclose(view.lines['en_total_output'].get_ydata(), res.en_total_output, rtol=1e-12)
+    assert np.allclose(view.lines['en_Z2'].get_ydata(), res.noise_sources['en_Z2'], rtol=1e-12)
+
+    view.reset()
+    assert view.budget.get('Z2.Rfb') == pytest.approx(view.nominal['Z2.Rfb'], rel=1e-12)
+
+
+def test_headless_benchmark(capsys):
+    args = argparse.Namespace(params=['Z2.Cfb', 'hemt.gm'], num=200, fmin=1.0, fmax=1e6, data=None, benchmark=4)
+    view = tune_noise_model.main(args)
+    assert 'redraw per slider move' in capsys.readouterr().out
+    assert view.params == ['Z2.Cfb', 'hemt.gm']
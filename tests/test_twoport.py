@@ -0,0 +1,37 @@
+import numpy as np
+import impedance as Q
+import noise_budget
+import twoport
+
+
+F = np.logspace(0, 6, 50)
+
+
+def test_chain_matches_noise_budget():
+    budget = noise_budget.NoiseBudget(noise_budget.NoiseBudgetConfig(num=50))
+    res = budget.evaluate(F)
+    gains = twoport.chain_gains(budget.circuits, F)
+    for k in ('Aclosed', 'Aopen_HEMT', 'Atotal_open', 'Atotal_closed', 'Atotal_closed_det'):
+        assert np.allclose(gains[k], res.gains[k], rtol=1e-12, atol=0), k
+    amp = np.sqrt(sum(np.square(np.abs(res.noise_sources[k])) for k in ('en_HEMT', 'en_Z3', 'en_BJT-fix', 'en_opamp')))
+    assert np.allclose(gains['en_amp_input'], amp, rtol=1e-12)
+
+
+def test_resistive_divider():
+    # R1 in series, R2 to ground: gain R2/(R1 + R2), open circuit noise 4kT(R1 || R2) at the output
+    R1, R2, T = 1e3, 3e3, 300.0
+    port = twoport.cascade(twoport.series(R1, T), twoport.shunt(R2, T))
+    gain = port.voltage_gain()
+    assert np.isclose(gain, R2/(R1 + R2))
+    assert np.isclose(port.input_impedance(), R1 + R2)
+    assert np.isclose(port.input_impedance(1e3), R1 + R2*1e3/(R2 + 1e3))
+    out_noise = port.input_noise()*np.square(np.abs(gain))
+    assert np.isclose(out_noise, 4*Q.kB*T*R1*R2/(R1 + R2), rtol=1e-12)
+
+
+def test_cascade_broadcasts_design_points():
+    gm = np.array([[0.01], [0.02]])
+    forward = twoport.cascade(twoport.transconductor(gm), twoport.shunt(np.full(F.shape, 1e3)))
+    assert forward.abcd.shape == (2, len(F), 2, 2)
+    assert np.allclose(forward.voltage_gain(), gm*1e3*np.ones(F.shape))
+    assert np.all(forward.input_noise() == 0)
@@ -0,0 +1,209 @@
+"""Interactive tuning of the noise model.
+
+Sliders (log scale, a decade either side of the nominal value) set
+component parameters of the readout chain. The noise budget is
+re-evaluated incrementally (only what depends on the parameter) and the
+existing line artists are updated with set_ydata and blitted over a
+cached background, so nothing is re-plotted. Measured SCRN spectra can
+be overlaid on the output noise.
+
+Usage: python tune_noise_model.py [--num 10000] [--data noise_data/SCRN*.TXT] [--benchmark 50]
+"""
+
+import time
+import argparse
+import numpy as np
+import noise_budget
+
+
+PARAMS = ('hemt.gm', 'hemt.Cgs', 'Z2.Cfb', 'Z2.Rfb', 'Z1_MC.Cdet')
+
+GAINS = ('Atotal_closed', 'Atotal_closed_det')
+
+
+def get_args():
+    parser = argparse.ArgumentParser('Tune the noise model with sliders.')
+    parser.add_argument('--params', nargs='+', default=list(PARAMS), help='Parameters to tune.')
+    parser.add_argument('--num', default=10000, type=int, help='Number of frequencies.')
+    parser.add_argument('--fmin', default=1.0, type=float, help='Lowest frequency.')
+    parser.add_argument('--fmax', default=1e6, type=float, help='Highest frequency.')
+    parser.add_argument('--data', '-d', nargs='+', default=None, help='SCRN captures to overlay on the output noise.')
+    parser.add_argument('--benchmark', default=0, type=int, help='Time this many slider moves headless instead of showing.')
+    a = parser.parse_args()
+    print(a)
+    return a
+
+
+class TuningView(object):
+
+    """Figure with noise and gain curves and a slider per parameter.
+
+    budget: noise_budget.NoiseBudget, evaluated at its config frequencies
+    params: parameter paths, see noise_budget.get_param
+    data: optional (freq, noise) of a measurement, drawn with the output noise
+    """
+
+    def __init__(self, budget, params=PARAMS, data=None, fig=None):
+        from matplotlib.widgets import Slider, Button
+        import matplotlib.pyplot as plt
+
+        self.budget = budget
+        self.params = list(params)
+        self.nominal = {p: float(budget.get(p)) for p in self.params}
+        res = budget.evaluate()
+        f = res.f_arr
+
+        self.fig = plt.figure(figsize=(18,12)) if fig is None else fig
+        self.fig.set_facecolor('white')
+        n = len(self.params)
+        bottom = 0.11 + 0.04*n
+        gs = self.fig.add_gridspec(3, 1, left=0.08, right=0.97, top=0.97, bottom=bottom, hspace=0.3)
+        ax_in, ax_out, ax_gain = [self.fig.add_subplot(gs[i]) for i in range(3)]
+        self.axes = (ax_in, ax_out, ax_gain)
+
+        # animated lines are left out of full draws and blitted over the background
+        self.lines = {}
+        for src, val in res.noise_sources.items():
+            self.lines[src] = ax_in.plot(f, np.broadcast_to(val, f.shape), label=src, animated=True)[0]
+        self.lines['en_total_input'] = ax_in.plot(f, res.en_total_input, 'k', label='en_total', animated=True)[0]
+        self.lines['en_total_output'] = ax_out.plot(f, res.en_total_output, 'k', label='model', animated=True)[0]
+        for g in GAINS:
+            self.lines[g] = ax_gain.plot(f, np.abs(res.gains[g]), label=g, animated=True)[0]
+        if data is not None:
+            ax_out.plot(data[0], data[1], color='0.6', zorder=0, label='data')
+
+        ax_in.set_ylabel(r'input noise $V/\sqrt{Hz}$')
+        ax_out.set_ylabel(r'output noise $V/\sqrt{Hz}$')
+        ax_gain.set_ylabel('|gain|')
+        ax_gain.set_xlabel('Frequency (Hz)')
+        for ax in self.axes:
+            ax.set_xscale(u'log')
+            ax.set_yscale(u'log')
+            ax.grid(True)
+            ax.legend(loc='upper right', fontsize='small')
+
+        self.sliders = {}
+        for i, p in enumerate(self.params):
+            ax = self.fig.add_axes([0.15, 0.04*(n - i) + 0.02, 0.6, 0.025])
+            v = np.log10(self.nominal[p])
+            s = Slider(ax, p, v - 1, v + 1, valinit=v)
+            # the slider is redrawn with the curves, not by a full canvas draw
+            s.drawon = False
+            s.on_changed(lambda val, p=p: self.set_value(p, np.power(10.0, val)))
+            s.valtext.set_text('{0:.4g}'.format(self.nominal[p]))
+            # sliders are not part of the background: each is kept as an
+            # image of its strip of the figure, redrawn only when moved
+            ax.set_animated(True)
+            s.valtext.set_animated(True)
+            self.sliders[p] = s
+
+        self.reset_button = Button(self.fig.add_axes([0.85, 0.06, 0.1, 0.04]), 'Reset')
+        self.reset_button.on_clicked(lambda event: self.reset())
+        self.rescale_button = Button(self.fig.add_axes([0.85, 0.01, 0.1, 0.04]), 'Rescale')
+        self.rescale_button.on_clicked(lambda event: self.rescale())
+
+        self.background = None
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _on_draw(self, event):
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self._slider_images = {}
+        for p in self.sliders:
+            self._draw_slider(p)
+        self._draw_animated()
+
+    def _draw_slider(self, path):
+        from matplotlib.transforms import Bbox
+        ax = self.sliders[path].ax
+        self.fig.draw_artist(ax)
+        (x0, y0), (x1, y1) = self.fig.transFigure.inverted().transform(ax.bbox.get_points())
+        strip = Bbox.from_extents(0, y0 - 0.0075, 1, y1 + 0.0075).transformed(self.fig.transFigure)
+        self._slider_images[path] = self.fig.canvas.copy_from_bbox(strip)
+
+    def _draw_animated(self):
+        for line in self.lines.values():
+            line.axes.draw_artist(line)
+        for s in self.sliders.values():
+            s.ax.draw_artist(s.valtext)
+
+    def set_value(self, path, value):
+        """Set a parameter and update the curves, returns the time taken in s."""
+        t0 = time.perf_counter()
+        self.budget.set(path, value)
+        res = self.budget.evaluate()
+        shape = res.f_arr.shape
+        for src, val in res.noise_sources.items():
+            if src in self.lines:
+                self.lines[src].set_ydata(np.broadcast_to(val, shape))
+        self.lines['en_total_input'].set_ydata(res.en_total_input)
+        self.lines['en_total_output'].set_ydata(res.en_total_output)
+        for g in GAINS:
+            self.lines[g].set_ydata(np.abs(res.gains[g]))
+        self.sliders[path].valtext.set_text('{0:.4g}'.format(value))
+        self.blit(path)
+        return time.perf_counter() - t0
+
+    def blit(self, path=None):
+        """Redraw the curves (and the slider of path) over the background."""
+        canvas = self.fig.canvas
+        if self.background is None:
+            canvas.draw()
+            return
+        canvas.restore_region(self.background)
+        for p, img in self._slider_images.items():
+            if p != path:
+                canvas.restore_region(img)
+        if path is not None:
+            self._draw_slider(path)
+        self._draw_animated()
+        canvas.blit(self.fig.bbox)
+
+    def reset(self):
+        for p, s in self.sliders.items():
+            s.set_val(np.log10(self.nominal[p]))
+
+    def rescale(self):
+        """Fit the axis limits to the current curves (full redraw)."""
+        for ax in self.axes:
+            ax.relim()
+            ax.autoscale_view()
+        self.fig.canvas.draw_idle()
+
+
+def main(args):
+    config = noise_budget.NoiseBudgetConfig(fmin=args.fmin, fmax=args.fmax, num=args.num)
+    budget = noise_budget.NoiseBudget(config)
+
+    data = None
+    if args.data:
+        import spectrum_data
+        data = spectrum_data.load_spectra(args.data, unique=True)
+
+    if args.benchmark:
+        import matplotlib
+        matplotlib.use('Agg')
+
+    import matplotlib.pyplot as plt
+    view = TuningView(budget, args.params, data)
+
+    if args.benchmark:
+        # headless: time slider moves after one full draw
+        view.fig.canvas.draw()
+        times = []
+        for i in range(args.benchmark):
+            p = view.params[i % len(view.params)]
+            v = np.log10(view.nominal[p]) + 0.5*np.sin(i)
+            t0 = time.perf_counter()
+            view.sliders[p].set_val(v)
+            times.append(time.perf_counter() - t0)
+        print('redraw per slider move: median {0:.1f} ms, max {1:.1f} ms ({2:d} points)'.format(
+            1e3*np.median(times), 1e3*np.max(times), len(config.f_arr)))
+        return view
+
+    plt.show()
+    return view
+
+
+if __name__ == '__main__':
+
+    main(get_args())
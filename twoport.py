@@ -0,0 +1,240 @@
+"""Two-port (ABCD) description of the readout chain, batched over frequency.
+
+Every block is a TwoPort: a stack of 2x2 chain (ABCD) matrices of shape
+(..., N, 2, 2) and, if it is noisy, the stack of its noise correlation
+matrices in chain form (input referred voltage and current noise,
+[[en^2, en in*], [in en*, in^2]] per Hz). Blocks are cascaded with one
+batched matmul per pair:
+
+    T = T1 T2,    C = C1 + T1 C2 T1^H
+
+so chains of any length evaluate in a few array operations. Leading
+axes broadcast, e.g. component values of shape (n, 1) give n design
+points at once, as in noise_budget.
+
+Example:
+    f = np.logspace(0, 6, 1000)
+    forward = cascade(transconductor(gm), shunt(Z_load, T=300), voltage_amplifier(A))
+    forward.voltage_gain()                     # open loop gain
+    inverting_feedback_gain(forward, Zs, Zf)   # with shunt feedback Zf
+    np.sqrt(forward.input_noise())             # input referred voltage noise
+"""
+
+from functools import reduce
+import numpy as np
+import impedance as Q
+
+
+def _matrix(a, b, c, d):
+    """Stack of 2x2 matrices [[a, b], [c, d]] broadcast over the element shapes."""
+    a, b, c, d = np.broadcast_arrays(*[np.asarray(x, dtype=complex) for x in (a, b, c, d)])
+    m = np.empty(a.shape + (2, 2), dtype=complex)
+    m[..., 0, 0] = a
+    m[..., 0, 1] = b
+    m[..., 1, 0] = c
+    m[..., 1, 1] = d
+    return m
+
+
+def _hermitian(m):
+    return np.conj(np.swapaxes(m, -1, -2))
+
+
+class TwoPort(object):
+
+    """Chain matrices and noise correlation matrices of a linear two-port.
+
+    [V1, I1] = abcd [V2, I2] with I2 flowing out of port 2.
+    abcd: (..., 2, 2) complex
+    noise: (..., 2, 2) chain noise correlation in V^2/Hz, A^2/Hz (None if noiseless)
+    """
+
+    def __init__(self, abcd, noise=None):
+        self.abcd = abcd
+        self.noise = noise
+
+    @property
+    def A(self):
+        return self.abcd[..., 0, 0]
+
+    @property
+    def B(self):
+        return self.abcd[..., 0, 1]
+
+    @property
+    def C(self):
+        return self.abcd[..., 1, 0]
+
+    @property
+    def D(self):
+        return self.abcd[..., 1, 1]
+
+    def __matmul__(self, other):
+        return cascade(self, other)
+
+    def voltage_gain(self, ZL=None):
+        """V2/V1 into the load ZL (default open output)."""
+        if ZL is None:
+            return 1.0/self.A
+        return ZL/(self.A*ZL + self.B)
+
+    def input_impedance(self, ZL=None):
+        """V1/I1 with the load ZL (default open output)."""
+        if ZL is None:
+            return self.A/self.C
+        return (self.A*ZL + self.B)/(self.C*ZL + self.D)
+
+    def input_noise(self, Zs=0):
+        """Equivalent input voltage noise PSD (V^2/Hz) for a source impedance Zs."""
+        if self.noise is None:
+            return np.zeros(self.abcd.shape[:-2])
+        C = self.noise
+        Zs = np.asarray(Zs)
+        return np.real(C[..., 0, 0] + 2*np.real(np.conj(Zs)*C[..., 0, 1]) + np.square(np.abs(Zs))*C[..., 1, 1])
+
+
+def cascade(*ports):
+    """Cascade two-ports from input to output."""
+    def pair(p1, p2):
+        abcd = np.matmul(p1.abcd, p2.abcd)
+        if p2.noise is None:
+            noise = p1.noise
+        else:
+            # noise of the second port referred through the first
+            noise = np.matmul(np.matmul(p1.abcd, p2.noise), _hermitian(p1.abcd))
+            if p1.noise is not None:
+                noise = p1.noise + noise
+        return TwoPort(abcd, noise)
+    return reduce(pair, ports)
+
+
+def _thermal(psd_v, psd_i):
+    zero = np.zeros_like(psd_v)
+    return _matrix(psd_v, zero, zero, psd_i)
+
+
+def series(Z, T=None):
+    """Series impedance Z, with its thermal noise at temperature T."""
+    Z = np.asarray(Z, dtype=complex)
+    noise = None if T is None else _thermal(4*Q.kB*T*Z.real, np.zeros(Z.shape))
+    return TwoPort(_matrix(1, Z, 0, 1), noise)
+
+
+def shunt(Z, T=None, in_=None):
+    """Shunt impedance Z to ground, with thermal noise at T and an extra current noise in_ (A/sqHz)."""
+    Z = np.asarray(Z, dtype=complex)
+    Y = 1.0/Z
+    noise = None
+    if T is not None or in_ is not None:
+        psd_i = 0
+        if T is not None:
+            psd_i = psd_i + 4*Q.kB*T*Y.real
+        if in_ is not None:
+            psd_i = psd_i + np.square(np.abs(in_))
+        psd_i = np.broadcast_to(psd_i, np.broadcast(Y, psd_i).shape)
+        noise = _thermal(np.zeros(psd_i.shape), psd_i)
+    return TwoPort(_matrix(1, 0, Y, 1), noise)
+
+
+def with_noise(port, en=None, in_=None, corr=0):
+    """Add input referred noise en (V/sqHz), in_ (A/sqHz) with correlation coefficient corr to port."""
+    en = 0 if en is None else np.asarray(en)
+    in_ = 0 if in_ is None else np.asarray(in_)
+    c = corr*np.abs(en)*np.abs(in_)
+    noise = _matrix(np.square(np.abs(en)), c, np.conj(c), np.square(np.abs(in_)))
+    if port.noise is not None:
+        noise = noise + port.noise
+    return TwoPort(port.abcd, noise)
+
+
+def voltage_amplifier(A, en=None, in_=None):
+    """Ideal voltage amplifier V2 = A*V1 (infinite input, zero output impedance)."""
+    A = np.asarray(A, dtype=complex)
+    port = TwoPort(_matrix(1.0/A, 0, 0, 0))
+    return port if en is None and in_ is None else with_noise(port, en, in_)
+
+
+def transconductor(gm, en=None, in_=None):
+    """Ideal transconductance stage, current gm*V1 out of port 2.
+
+    The inversion of a common-source stage is not included, it is taken
+    into account by the feedback as in noise_budget.
+    """
+    port = TwoPort(_matrix(0, 1.0/np.asarray(gm, dtype=complex), 0, 0))
+    return port if en is None and in_ is None else with_noise(port, en, in_)
+
+
+def noninverting_amplifier(Aopen, Z_ground, Z_fb, en=None):
+    """Op-amp with feedback divider Z_ground/(Z_ground + Z_fb) as a voltage amplifier.
+
+    Closed loop gain Aopen/(1 + Aopen*B); en is the op-amp input voltage noise.
+    """
+    B = Z_ground/(Z_ground + Z_fb)
+    return voltage_amplifier(Aopen/(1 + Aopen*B), en)
+
+
+def inverting_feedback_gain(forward, Zs, Zf):
+    """Closed loop gain of an inverting amplifier with shunt feedback.
+
+    The forward two-port (with open output) is driven from a voltage
+    source through Zs, Zf connects its output back to its input:
+
+        V2/Vs = -(1/Zs)/(A (1/Zs + 1/Zf) + C + 1/Zf)
+
+    For an ideal amplifier (C = 0, A = 1/Aopen) this is
+    H_in*Aopen/(1 + Aopen*H_fb) with H_fb = Zs/(Zs + Zf), H_in = -Zf/(Zs + Zf).
+    """
+    Ys = 1.0/Zs
+    Yf = 1.0/Zf
+    return -Ys/(forward.A*(Ys + Yf) + forward.C + Yf)
+
+
+def readout_chain(circuits, f_arr, T_300K=300.0):
+    """Two-ports of the readout chain of noise_budget.make_circuits() at f_arr.
+
+    Returns dict of TwoPorts:
+    'hemt': transconductance gm with the HEMT voltage noise
+    'load': load Z3 (+ current mirror) at the drain, thermal noise at
+            T_300K and the BJT current noise
+    'opamp': op-amp with the Z5/Z6 feedback divider and its voltage noise
+    'forward': the three cascaded
+    """
+    hemt = circuits['hemt']
+    opamp = circuits['opamp']
+    Z3 = circuits['Z3'].Z_tot(f_arr)
+    Z_load = Q.series(Z3, circuits['bjt'].Z_tot(f_arr))
+
+    ports = {}
+    ports['hemt'] = transconductor(hemt.gm, en=hemt.voltageNoise(f_arr))
+    # thermal noise of Z3 as a current into the load, plus the BJT current noise
+    ports['load'] = with_noise(shunt(Z_load), in_=np.sqrt(4*T_300K*Q.kB*np.real(1.0/Z3) + np.square(1e-19)))
+    ports['opamp'] = noninverting_amplifier(opamp.Aopen_gary(f_arr, flat=2e7, pole1=0.5, pole2=80e3),
+                                            circuits['Z5'].Z_tot(f_arr), circuits['Z6'].Z_tot(f_arr),
+                                            en=opamp.voltage_noise(f_arr))
+    ports['forward'] = cascade(ports['hemt'], ports['load'], ports['opamp'])
+    return ports
+
+
+def chain_gains(circuits, f_arr, T_300K=300.0):
+    """Gains and input referred noise of the readout chain from the two-ports.
+
+    Returns dict with 'Aclosed', 'Aopen_HEMT', 'Atotal_open',
+    'Atotal_closed', 'Atotal_closed_det' as in noise_budget.charge_circuit
+    (which refers the input through Z_input_4K / Z_input) and
+    'en_amp_input', the input referred noise of the amplifier chain
+    (HEMT, Z3, BJT and op-amp) in V/sqHz.
+    """
+    ports = readout_chain(circuits, f_arr, T_300K)
+    forward = ports['forward']
+    Z_HEMT = circuits['hemt'].Z_tot(f_arr)
+    Z_g = circuits['Z1_g'].Z_tot(f_arr)
+    Z2 = circuits['Z2'].Z_tot(f_arr)
+    Z_open = Q.series(Z_g, 1e19)
+    Z_det = Q.series(Z_g, circuits['Z1_MC'].Z_tot(f_arr))
+
+    return {'Aclosed': ports['opamp'].voltage_gain(),
+            'Aopen_HEMT': cascade(ports['hemt'], ports['load']).voltage_gain(),
+            'Atotal_open': forward.voltage_gain(),
+            'Atotal_closed': inverting_feedback_gain(forward, Q.parallel(Z_HEMT, Z_open), Z2),
+            'Atotal_closed_det': inverting_feedback_gain(forward, Q.parallel(Z_HEMT, Z_det), Z2),
+            'en_amp_input': np.sqrt(forward.input_noise())}